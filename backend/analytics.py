@@ -0,0 +1,234 @@
+"""Hourly and daily rollups over symptom checks, audit logs and feedback.
+
+One document per period holds every counter for that period:
+
+    {'_id': 'day:2026-10-17', 'granularity': 'day', 'period': '2026-10-17', 'start': <datetime>,
+     'counts': {'symptom_checks': 12, 'risk_level': {'Low': 7, 'Moderate': 4, 'High': 1},
+                'ai_audit_logs': 12, 'emergency_triggered': {'true': 1, 'false': 11},
+                'feedback': 2, 'feedback_type': {'AdverseEffect': 1, 'Error': 1}}}
+
+Counters are bumped with ``$inc`` upserts as records are written, one
+update per period per batch, so reading a range never touches the source
+collections. A failed rollup update is logged and not retried, so a
+period can under-count until the backfill recounts it. The backfill also
+counts records written before the rollups existed, and can be rerun
+safely:
+
+    python analytics.py backfill
+"""
+import argparse
+import asyncio
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+ROLLUP_COLLECTION = 'analytics_rollups'
+ANALYTICS_MAX_PERIODS = int(os.environ.get('ANALYTICS_MAX_PERIODS', '744'))
+
+GRANULARITIES = {
+    'hour': ('%Y-%m-%dT%H', timedelta(hours=1)),
+    'day': ('%Y-%m-%d', timedelta(days=1)),
+}
+DEFAULT_RANGE = {'hour': timedelta(hours=48), 'day': timedelta(days=30)}
+
+# Label values are fixed so client-supplied strings never become field names
+RISK_LEVELS = ('Low', 'Moderate', 'High')
+FEEDBACK_TYPES = ('Feedback', 'Error', 'AdverseEffect')
+OTHER = 'Other'
+
+
+def _label(value, allowed: Tuple[str, ...]) -> str:
+    return value if value in allowed else OTHER
+
+
+def _symptom_check_counts(document: dict) -> Dict[str, int]:
+    return {'symptom_checks': 1, f"risk_level.{_label(document.get('risk_level'), RISK_LEVELS)}": 1}
+
+
+def _audit_log_counts(document: dict) -> Dict[str, int]:
+    triggered = 'true' if document.get('emergency_triggered') else 'false'
+    return {'ai_audit_logs': 1, f"emergency_triggered.{triggered}": 1}
+
+
+def _feedback_counts(document: dict) -> Dict[str, int]:
+    return {'feedback': 1, f"feedback_type.{_label(document.get('type'), FEEDBACK_TYPES)}": 1}
+
+
+ROLLUP_SOURCES = {
+    'symptom_checks': _symptom_check_counts,
+    'ai_audit_logs': _audit_log_counts,
+    'feedback': _feedback_counts,
+}
+
+
+def as_utc(when: datetime) -> datetime:
+    # BSON dates come back naive, in UTC
+    if when.tzinfo is None:
+        return when.replace(tzinfo=timezone.utc)
+    return when.astimezone(timezone.utc)
+
+
+def event_time(document: dict) -> Optional[datetime]:
+    """When a record was written: the BSON ``recorded_at``, else the ISO ``created_at``"""
+    when = document.get('recorded_at')
+    if not isinstance(when, datetime):
+        try:
+            when = datetime.fromisoformat(document['created_at'])
+        except (KeyError, TypeError, ValueError):
+            return None
+    return as_utc(when)
+
+
+def period_start(when: datetime, granularity: str) -> datetime:
+    if granularity == 'hour':
+        return when.replace(minute=0, second=0, microsecond=0)
+    return when.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def period_key(start: datetime, granularity: str) -> str:
+    return start.strftime(GRANULARITIES[granularity][0])
+
+
+def tally(collection: str, documents: Iterable[dict]) -> Dict[Tuple[str, datetime], Counter]:
+    """Counter increments per (granularity, period start) for records of one source collection"""
+    counts_for = ROLLUP_SOURCES[collection]
+    totals: Dict[Tuple[str, datetime], Counter] = defaultdict(Counter)
+    for document in documents:
+        when = event_time(document)
+        if when is None:
+            continue
+        counts = counts_for(document)
+        for granularity in GRANULARITIES:
+            totals[(granularity, period_start(when, granularity))].update(counts)
+    return totals
+
+
+def _update(granularity: str, start: datetime, operator: str, counts: Counter) -> UpdateOne:
+    period = period_key(start, granularity)
+    return UpdateOne(
+        {'_id': f"{granularity}:{period}"},
+        {
+            operator: {f"counts.{field}": value for field, value in counts.items()},
+            '$setOnInsert': {'granularity': granularity, 'period': period, 'start': start},
+        },
+        upsert=True,
+    )
+
+
+async def record_rollups(db, collection: str, documents: List[dict]):
+    """Count freshly inserted records; collections without rollups are ignored"""
+    if collection not in ROLLUP_SOURCES or not documents:
+        return
+    updates = [_update(granularity, start, '$inc', counts)
+               for (granularity, start), counts in tally(collection, documents).items()]
+    if updates:
+        await db[ROLLUP_COLLECTION].bulk_write(updates, ordered=False)
+
+
+def empty_counts() -> dict:
+    return {
+        'symptom_checks': 0, 'risk_level': {level: 0 for level in RISK_LEVELS},
+        'ai_audit_logs': 0, 'emergency_triggered': {'true': 0, 'false': 0},
+        'feedback': 0, 'feedback_type': {kind: 0 for kind in FEEDBACK_TYPES},
+    }
+
+
+def _merge(into: dict, counts: dict):
+    for field, value in counts.items():
+        if isinstance(value, dict):
+            _merge(into.setdefault(field, {}), value)
+        else:
+            into[field] = value
+
+
+async def read_rollups(db, granularity: str, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> dict:
+    """Every period from ``start`` to ``end`` inclusive, zero-filled, in one indexed range read"""
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(GRANULARITIES)}")
+    end = period_start(as_utc(end or datetime.now(timezone.utc)), granularity)
+    start = period_start(as_utc(start or end - DEFAULT_RANGE[granularity]), granularity)
+    step = GRANULARITIES[granularity][1]
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start) // step + 1 > ANALYTICS_MAX_PERIODS:
+        raise HTTPException(status_code=400, detail=f"At most {ANALYTICS_MAX_PERIODS} periods per request")
+
+    stored = {}
+    cursor = db[ROLLUP_COLLECTION].find(
+        {'_id': {'$gte': f"{granularity}:{period_key(start, granularity)}",
+                 '$lte': f"{granularity}:{period_key(end, granularity)}"}},
+        {'period': 1, 'counts': 1},
+    )
+    async for document in cursor:
+        stored[document['period']] = document.get('counts', {})
+
+    periods = []
+    current = start
+    while current <= end:
+        period = period_key(current, granularity)
+        counts = empty_counts()
+        _merge(counts, stored.get(period, {}))
+        periods.append({'period': period, 'start': current.isoformat(), **counts})
+        current += step
+    return {'granularity': granularity, 'periods': periods}
+
+
+def _accumulate(totals: Dict[Tuple[str, datetime], Counter], counts: Dict[Tuple[str, datetime], Counter]):
+    for key, value in counts.items():
+        totals[key].update(value)
+
+
+async def backfill_rollups(db, collections: Iterable[str] = tuple(ROLLUP_SOURCES),
+                           batch_size: int = 1000) -> Dict[str, int]:
+    """Recount rollups from the source collections.
+
+    Counts are applied with ``$max``, so a rerun never double counts and
+    never lowers a period whose records have since expired. Records that
+    arrive in a period while it is being recounted can be missed; rerun
+    once that period has closed.
+    """
+    scanned = {}
+    projection = {'_id': 0, 'recorded_at': 1, 'created_at': 1, 'risk_level': 1, 'emergency_triggered': 1, 'type': 1}
+    for collection in collections:
+        totals: Dict[Tuple[str, datetime], Counter] = defaultdict(Counter)
+        batch = []
+        scanned[collection] = 0
+        async for document in db[collection].find({}, projection, batch_size=batch_size):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                _accumulate(totals, tally(collection, batch))
+                scanned[collection] += len(batch)
+                batch = []
+        _accumulate(totals, tally(collection, batch))
+        scanned[collection] += len(batch)
+
+        updates = [_update(granularity, start, '$max', counts) for (granularity, start), counts in totals.items()]
+        for i in range(0, len(updates), batch_size):
+            await db[ROLLUP_COLLECTION].bulk_write(updates[i:i + batch_size], ordered=False)
+    return scanned
+
+
+async def _main(args):
+    # Deferred so the server's env loading and Mongo settings are reused
+    from server import mongo
+
+    mongo.connect()
+    db = mongo.database
+    try:
+        for collection, count in (await backfill_rollups(db, args.collection or ROLLUP_SOURCES)).items():
+            print(f"{collection}: scanned {count} records")
+    finally:
+        mongo.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build analytics rollups from existing history')
+    parser.add_argument('command', choices=['backfill'])
+    parser.add_argument('--collection', action='append', choices=sorted(ROLLUP_SOURCES),
+                        help='Source collection to recount; repeatable, defaults to all')
+    asyncio.run(_main(parser.parse_args()))
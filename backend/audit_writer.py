@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import os
+import shutil
+from collections import defaultdict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', '10000'))
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', '200'))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.environ.get('AUDIT_FLUSH_INTERVAL_SECONDS', '0.5'))
+AUDIT_ENQUEUE_TIMEOUT_SECONDS = float(os.environ.get('AUDIT_ENQUEUE_TIMEOUT_SECONDS', '0.1'))
+AUDIT_STOP_TIMEOUT_SECONDS = float(os.environ.get('AUDIT_STOP_TIMEOUT_SECONDS', '10'))
+# Writable directory for files the process keeps between runs
+STATE_DIR = os.environ.get('STATE_DIR', str(Path(__file__).parent / 'var'))
+AUDIT_SPILL_PATH = os.environ.get('AUDIT_SPILL_PATH', str(Path(STATE_DIR) / 'audit_spill.jsonl'))
+
+DUPLICATE_KEY = 11000
+_STOP = object()
+
+
+class BatchWriter:
+    """Write-behind pipeline that batches inserts off the request path.
+
+    Documents go through a bounded queue to a single drain task that issues
+    one ``insert_many`` per collection per batch. Anything that cannot be
+    written, either because the queue stays full or Mongo rejects the batch,
+    is appended to a JSONL spill file and replayed later. ``_id`` is assigned
+    up front so a replay of a partially applied batch is idempotent. Spill
+    file reads and writes run in a worker thread, off the event loop. Spill
+    lines that cannot be read back, such as one torn by a crash, are set
+    aside in a ``.corrupt`` file next to the spill file.
+
+    ``on_inserted(collection, documents)`` runs after each successful insert
+    with only the documents that insert added, so a replay over records an
+    earlier attempt already wrote does not report them twice. It should
+    handle its own errors; if it raises, the error is logged and the
+    documents, which are stored, are not retried.
+    """
+
+    def __init__(self, queue_size: int = AUDIT_QUEUE_SIZE, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL_SECONDS,
+                 enqueue_timeout: float = AUDIT_ENQUEUE_TIMEOUT_SECONDS, spill_path: str = AUDIT_SPILL_PATH,
+                 stop_timeout: float = AUDIT_STOP_TIMEOUT_SECONDS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.stop_timeout = stop_timeout
+        self.spill_path = Path(spill_path)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._db = None
+        self._on_inserted: Optional[Callable[[str, List[dict]], Awaitable[None]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._spill_lock = asyncio.Lock()
+        self.written = 0
+        self.spilled = 0
+        self.replayed = 0
+
+    def start(self, db, on_inserted: Optional[Callable[[str, List[dict]], Awaitable[None]]] = None):
+        self._db = db
+        self._on_inserted = on_inserted
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, collection: str, document: dict):
+        document.setdefault('_id', ObjectId())
+        item = (collection, document)
+        try:
+            self._queue.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+        # Back-pressure: wait briefly for room, then divert to disk rather than drop
+        try:
+            await asyncio.wait_for(self._queue.put(item), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            await self._spill([item])
+
+    async def _replay(self):
+        # A failed replay leaves its file to be retried later; it must not end the drain task
+        try:
+            await self.replay_spill()
+        except Exception as e:
+            logger.error(f"Audit spill replay failed: {e!r}")
+
+    async def _run(self):
+        batch: List[Tuple[str, dict]] = []
+        try:
+            await self._replay()
+            loop = asyncio.get_running_loop()
+            while True:
+                item = await self._queue.get()
+                stopping = item is _STOP
+                batch = [] if stopping else [item]
+                deadline = loop.time() + self.flush_interval
+                while not stopping and len(batch) < self.batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                    else:
+                        batch.append(item)
+                if stopping:
+                    while not self._queue.empty():
+                        item = self._queue.get_nowait()
+                        if item is not _STOP:
+                            batch.append(item)
+                ok = True
+                for chunk in [batch[i:i + self.batch_size] for i in range(0, len(batch), self.batch_size)]:
+                    ok = await self._write(chunk, unsettled=batch) and ok
+                batch = []
+                if stopping:
+                    return
+                if ok and self.spill_path.exists():
+                    await self._replay()
+        except asyncio.CancelledError:
+            # Cancelled by stop() mid-write; spill the groups not yet written or spilled by _write
+            await self._spill(batch)
+            raise
+
+    async def _write(self, batch: List[Tuple[str, dict]], unsettled: List[Tuple[str, dict]]) -> bool:
+        """Insert ``batch`` per collection, spilling any group that fails.
+
+        Each group is removed from ``unsettled`` once it is written or spilled.
+        """
+        grouped: Dict[str, List[dict]] = defaultdict(list)
+        for collection, document in batch:
+            grouped[collection].append(document)
+        ok = True
+        for collection, documents in grouped.items():
+            try:
+                await self._insert(collection, documents)
+                self.written += len(documents)
+            except Exception as e:
+                logger.error(f"Audit write to {collection} failed, spilling {len(documents)} records: {e}")
+                await self._spill([(collection, document) for document in documents])
+                ok = False
+            settled = {id(document) for document in documents}
+            unsettled[:] = [item for item in unsettled if id(item[1]) not in settled]
+        return ok
+
+    async def _insert(self, collection: str, documents: List[dict]):
+        inserted = documents
+        try:
+            await self._db[collection].insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Records already present from an earlier partial attempt are fine
+            errors = e.details.get('writeErrors', [])
+            if any(error['code'] != DUPLICATE_KEY for error in errors):
+                raise
+            if e.details.get('writeConcernErrors'):
+                raise
+            duplicates = {error['index'] for error in errors}
+            inserted = [document for i, document in enumerate(documents) if i not in duplicates]
+        if self._on_inserted is not None and inserted:
+            try:
+                await self._on_inserted(collection, inserted)
+            except Exception as e:
+                logger.error(f"Audit on_inserted hook for {len(inserted)} {collection} records failed: {e!r}")
+
+    def _append_spill(self, lines: List[str]):
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.spill_path.open('a+', encoding='utf-8') as spill:
+            # A write torn by a crash leaves no newline; start on a fresh line so only it is lost
+            if spill.tell():
+                spill.seek(spill.tell() - 1)
+                if spill.read(1) != '\n':
+                    spill.write('\n')
+            spill.writelines(lines)
+            spill.flush()
+            os.fsync(spill.fileno())
+
+    async def _spill(self, items: List[Tuple[str, dict]]):
+        if not items:
+            return
+        lines = [json_util.dumps({'collection': collection, 'document': document}) + '\n'
+                 for collection, document in items]
+        async with self._spill_lock:
+            await asyncio.to_thread(self._append_spill, lines)
+        self.spilled += len(items)
+
+    def _claim_spill(self, replaying: Path) -> bool:
+        """Move the spill file aside for replay; False when there is nothing to replay"""
+        if replaying.exists():
+            # Left behind by an interrupted replay; fold it back into the spill file
+            with self.spill_path.open('a', encoding='utf-8') as spill, replaying.open(encoding='utf-8') as src:
+                shutil.copyfileobj(src, spill)
+            replaying.unlink()
+        if not self.spill_path.exists():
+            return False
+        self.spill_path.replace(replaying)
+        return True
+
+    def _read_spill(self, replaying: Path) -> Dict[str, List[dict]]:
+        """Spilled records by collection; unreadable lines are moved to the ``.corrupt`` file"""
+        grouped: Dict[str, List[dict]] = defaultdict(list)
+        corrupt = []
+        with replaying.open(encoding='utf-8', errors='replace') as spill:
+            for line in spill:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json_util.loads(line)
+                    grouped[entry['collection']].append(entry['document'])
+                except (ValueError, TypeError, KeyError):
+                    corrupt.append(line if line.endswith('\n') else line + '\n')
+        if corrupt:
+            quarantine = self.spill_path.with_suffix('.corrupt')
+            logger.error(f"Moving {len(corrupt)} unreadable audit spill lines to {quarantine}")
+            with quarantine.open('a', encoding='utf-8') as target:
+                target.writelines(corrupt)
+        return grouped
+
+    async def replay_spill(self):
+        """Re-insert spilled records; anything that still fails is spilled again"""
+        replaying = self.spill_path.with_suffix('.replaying')
+        async with self._spill_lock:
+            if not await asyncio.to_thread(self._claim_spill, replaying):
+                return
+        grouped = await asyncio.to_thread(self._read_spill, replaying)
+        for collection, documents in grouped.items():
+            for i in range(0, len(documents), self.batch_size):
+                chunk = documents[i:i + self.batch_size]
+                try:
+                    await self._insert(collection, chunk)
+                    self.replayed += len(chunk)
+                except Exception as e:
+                    logger.error(f"Audit replay to {collection} failed: {e}")
+                    await self._spill([(collection, document) for document in chunk])
+        await asyncio.to_thread(replaying.unlink)
+
+    async def stop(self):
+        """Flush everything queued, then stop the drain task.
+
+        If the drain task has died, or has not finished within
+        ``stop_timeout``, whatever is still queued is spilled instead.
+        """
+        task, self._task = self._task, None
+        if task is None:
+            return
+        if not task.done():
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.stop_timeout
+            try:
+                # A sentinel rather than cancel() so an in-progress batch is never lost
+                await asyncio.wait_for(self._queue.put(_STOP), timeout=self.stop_timeout)
+                await asyncio.wait_for(asyncio.shield(task), timeout=max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                logger.error(f"Audit writer did not drain within {self.stop_timeout}s, spilling the queue")
+                task.cancel()
+        (error,) = await asyncio.gather(task, return_exceptions=True)
+        if isinstance(error, Exception):
+            logger.error(f"Audit writer had stopped: {error!r}")
+        leftover = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                leftover.append(item)
+        await self._spill(leftover)
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+        }
+
+
+audit_writer = BatchWriter()
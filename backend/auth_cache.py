@@ -0,0 +1,17 @@
+import os
+
+from ttl_cache import CountingTTLCache
+
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '10000'))
+# Bounds how long a revocation takes to reach other workers; 0 disables caching
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '30'))
+
+
+class UserCache(CountingTTLCache):
+    """Short-lived cache of user documents for get_current_user"""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        super().__init__(maxsize, ttl)
+
+
+user_cache = UserCache()
@@ -0,0 +1,103 @@
+"""Stress the audit write-behind pipeline and verify no record is lost.
+
+Producers enqueue records concurrently while the database is made to reject
+writes for part of the run (a simulated outage) and the queue is kept small
+enough to force back-pressure spills. After shutdown and replay, every
+record must be present exactly once:
+    MONGO_URL=mongodb://localhost:27017 python bench/audit_stress.py --records 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import AutoReconnect
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_writer import BatchWriter  # noqa: E402
+
+
+class OutageCollection:
+    def __init__(self, collection, outage):
+        self._collection = collection
+        self._outage = outage
+
+    async def insert_many(self, documents, **kwargs):
+        if self._outage.is_set():
+            raise AutoReconnect("simulated outage")
+        return await self._collection.insert_many(documents, **kwargs)
+
+
+class OutageDatabase:
+    """Delegates to a real database but fails inserts while ``outage`` is set"""
+
+    def __init__(self, db):
+        self._db = db
+        self.outage = asyncio.Event()
+
+    def __getitem__(self, name):
+        return OutageCollection(self._db[name], self.outage)
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[f"otcwise_bench_{uuid.uuid4().hex[:8]}"]
+    spill_path = Path(tempfile.mkdtemp()) / 'audit_spill.jsonl'
+    flaky = OutageDatabase(db)
+    writer = BatchWriter(queue_size=args.queue_size, batch_size=args.batch_size,
+                         flush_interval=0.05, enqueue_timeout=0.01, spill_path=str(spill_path))
+    try:
+        writer.start(flaky)
+        per_producer = args.records // args.producers
+
+        async def producer(n):
+            for i in range(per_producer):
+                await writer.enqueue(random.choice(['ai_audit_logs', 'symptom_checks']),
+                                     {'id': f"{n}-{i}", 'user_id': str(n)})
+                if i % 100 == 0:
+                    await asyncio.sleep(0)
+
+        async def outage():
+            await asyncio.sleep(args.outage_start)
+            flaky.outage.set()
+            await asyncio.sleep(args.outage_seconds)
+            flaky.outage.clear()
+
+        start = time.perf_counter()
+        await asyncio.gather(outage(), *(producer(n) for n in range(args.producers)))
+        await writer.stop()
+        # Records spilled after the last successful flush are replayed on next start
+        await writer.replay_spill()
+        elapsed = time.perf_counter() - start
+
+        expected = per_producer * args.producers
+        stored = sum([await db[name].count_documents({}) for name in ('ai_audit_logs', 'symptom_checks')])
+        distinct = set()
+        for name in ('ai_audit_logs', 'symptom_checks'):
+            distinct.update(await db[name].distinct('id'))
+        print(f"enqueued={expected} stored={stored} distinct={len(distinct)} "
+              f"elapsed={elapsed:.2f}s stats={writer.stats()}")
+        if stored != expected or len(distinct) != expected:
+            sys.exit("audit records lost or duplicated")
+        print("OK: no audit records lost")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=50000)
+    parser.add_argument('--producers', type=int, default=50)
+    parser.add_argument('--queue-size', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--outage-start', type=float, default=0.2)
+    parser.add_argument('--outage-seconds', type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,49 @@
+"""Measure authenticated-request throughput against a live server.
+
+Run once with the user cache on and once with it off to compare:
+    uvicorn server:app --port 8001                              # cached
+    USER_CACHE_TTL_SECONDS=0 uvicorn server:app --port 8001     # every request hits users
+    python bench/auth_throughput.py --base-url http://localhost:8001 --requests 5000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+
+async def main(args):
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30) as client:
+        resp = await client.post('/api/auth/register',
+                                 json={'email': email, 'password': 'bench-password', 'age_confirmed': True})
+        resp.raise_for_status()
+        headers = {'Authorization': f"Bearer {resp.json()['token']}"}
+
+        sem = asyncio.Semaphore(args.concurrency)
+        latencies = []
+
+        async def one():
+            async with sem:
+                start = time.perf_counter()
+                r = await client.get(args.path, headers=headers)
+                r.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{args.path}: {args.requests / elapsed:8.1f} req/s  "
+          f"p50={latencies[len(latencies) // 2]:.2f}ms  p99={latencies[int(len(latencies) * 0.99) - 1]:.2f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:8001')
+    parser.add_argument('--path', default='/api/consent/status')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""Nearest-provider latency with the in-memory grid and, optionally, $geoNear.
+
+    python bench/geo_nearest.py --providers 500000 --queries 1000
+    MONGO_URL=mongodb://localhost:27017 python bench/geo_nearest.py --mongo
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from geo import (  # noqa: E402
+    GeoGridIndex, location_point, near_providers, provider_filter,
+)
+
+SPECIALTIES = ['General Practice', 'Family Medicine', 'Pediatrics', 'Cardiology', 'Dermatology']
+# Population centres providers cluster around (lat, lng, spread in degrees)
+CITIES = [(40.71, -74.00, 0.6), (34.05, -118.24, 0.8), (41.88, -87.63, 0.5),
+          (51.51, -0.13, 0.5), (19.08, 72.88, 0.4), (28.61, 77.21, 0.5)]
+
+
+def make_providers(count, rng):
+    providers = []
+    for i in range(count):
+        city_lat, city_lng, spread = rng.choice(CITIES)
+        lat, lng = rng.gauss(city_lat, spread / 2), rng.gauss(city_lng, spread / 2)
+        start = rng.randrange(7) * 1440 + rng.choice([420, 480, 540])
+        providers.append({
+            'id': str(i), 'name': f"Provider {i}", 'address': f"{i} Example Street", 'phone': '+1-555-0000',
+            'specialty': rng.choice(SPECIALTIES), 'latitude': lat, 'longitude': lng,
+            'opening_hours': [{'start': start, 'end': start + 600}],
+        })
+    return providers
+
+
+def make_queries(count, rng):
+    queries = []
+    for _ in range(count):
+        city_lat, city_lng, spread = rng.choice(CITIES)
+        queries.append((rng.gauss(city_lat, spread / 3), rng.gauss(city_lng, spread / 3)))
+    return queries
+
+
+def report(label, samples):
+    samples.sort()
+    print(f"{label:<22} p50={samples[len(samples) // 2]:7.3f}ms  "
+          f"p99={samples[int(len(samples) * 0.99) - 1]:7.3f}ms")
+
+
+async def bench_mongo(providers, queries, args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[f"otcwise_bench_{uuid.uuid4().hex[:8]}"]
+    try:
+        for i in range(0, len(providers), 10000):
+            await db.doctors.insert_many(
+                [{**p, 'location': location_point(p['latitude'], p['longitude'])}
+                 for p in providers[i:i + 10000]])
+        await db.doctors.create_index([('location', '2dsphere')])
+        for label, query in (('mongo', {}), ('mongo open+specialty', provider_filter(True, 'Cardiology'))):
+            samples = []
+            for lat, lng in queries:
+                start = time.perf_counter()
+                await near_providers(db.doctors, lat, lng, args.radius, 20, query=query)
+                samples.append((time.perf_counter() - start) * 1000)
+            report(label, samples)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    providers = make_providers(args.providers, rng)
+    queries = make_queries(args.queries, rng)
+
+    grid = GeoGridIndex()
+    start = time.perf_counter()
+    grid.build(providers)
+    print(f"grid build: {time.perf_counter() - start:.2f}s for {len(grid)} providers")
+    for label, filters in (('grid', {}), ('grid open+specialty', {'open_now': True, 'specialty': 'Cardiology'})):
+        samples = []
+        for lat, lng in queries:
+            start = time.perf_counter()
+            grid.nearest(lat, lng, args.radius, 20, **filters)
+            samples.append((time.perf_counter() - start) * 1000)
+        report(label, samples)
+
+    if args.mongo:
+        asyncio.run(bench_mongo(providers, queries, args))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--providers', type=int, default=500000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--radius', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=11)
+    parser.add_argument('--mongo', action='store_true')
+    main(parser.parse_args())
@@ -0,0 +1,80 @@
+"""Show how users lookups scale with collection size, with and without indexes.
+
+Grows a scratch users collection to each size and times find_one by email
+and by id, before and after ensure_indexes:
+    MONGO_URL=mongodb://localhost:27017 python bench/index_scaling.py --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from indexes import ensure_indexes  # noqa: E402
+
+# Mirrors COLLECTION_INDEXES['users'] without importing the server
+USER_INDEXES = {'users': [
+    IndexModel([('email', ASCENDING)], name='email', unique=True),
+    IndexModel([('id', ASCENDING)], name='id', unique=True),
+]}
+
+
+async def grow(db, current, target, batch_size=10000):
+    while current < target:
+        count = min(batch_size, target - current)
+        await db.users.insert_many([
+            {'id': str(uuid.uuid4()), 'email': f"user{current + i}@example.com",
+             'password_hash': 'x', 'is_active': True}
+            for i in range(count)
+        ], ordered=False)
+        current += count
+    return current
+
+
+async def time_lookups(db, size, probes):
+    emails = [f"user{random.randrange(size)}@example.com" for _ in range(probes)]
+    start = time.perf_counter()
+    ids = []
+    for email in emails:
+        user = await db.users.find_one({'email': email}, {'_id': 0, 'id': 1})
+        ids.append(user['id'])
+    by_email = (time.perf_counter() - start) / probes * 1000
+    start = time.perf_counter()
+    for user_id in ids:
+        await db.users.find_one({'id': user_id}, {'_id': 0, 'id': 1})
+    by_id = (time.perf_counter() - start) / probes * 1000
+    return by_email, by_id
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[f"otcwise_bench_{uuid.uuid4().hex[:8]}"]
+    size = 0
+    print(f"{'users':>10} {'scan email':>12} {'scan id':>10} {'idx email':>10} {'idx id':>10}  (ms/lookup)")
+    try:
+        for target in sorted(args.sizes):
+            size = await grow(db, size, target)
+            await db.users.drop_indexes()
+            scan = await time_lookups(db, size, args.scan_probes)
+            await ensure_indexes(db, USER_INDEXES)
+            indexed = await time_lookups(db, size, args.probes)
+            print(f"{size:>10} {scan[0]:>12.3f} {scan[1]:>10.3f} {indexed[0]:>10.3f} {indexed[1]:>10.3f}")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--probes', type=int, default=1000)
+    parser.add_argument('--scan-probes', type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,93 @@
+"""Replay clustered locator traffic against a live server and report cache hit rate.
+
+Queries come from neighbourhood hotspots with Zipf-weighted popularity and a
+few hundred metres of jitter, the way app users cluster in practice. Compare:
+    uvicorn server:app --port 8001                                 # cached
+    LOCATOR_CACHE_TTL_SECONDS=0 uvicorn server:app --port 8001     # every request runs $geoNear
+    python bench/locator_replay.py --base-url http://localhost:8001 --requests 5000
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+
+import httpx
+
+# City centres and how far (degrees) their neighbourhoods spread
+CITIES = [(40.71, -74.00, 0.15), (34.05, -118.24, 0.25), (41.88, -87.63, 0.12), (51.51, -0.13, 0.12)]
+SPECIALTIES = ['General Practice', 'Family Medicine', 'Pediatrics']
+
+
+def make_hotspots(count, rng):
+    hotspots = []
+    for _ in range(count):
+        city_lat, city_lng, spread = rng.choice(CITIES)
+        hotspots.append((rng.gauss(city_lat, spread), rng.gauss(city_lng, spread)))
+    weights = [1 / (rank + 1) for rank in range(count)]
+    return hotspots, weights
+
+
+def make_request(hotspots, weights, args, rng):
+    lat, lng = rng.choices(hotspots, weights)[0]
+    # ~300m of jitter around the hotspot
+    lat += rng.gauss(0, 0.003)
+    lng += rng.gauss(0, 0.003 / math.cos(math.radians(lat)))
+    params = {'lat': round(lat, 6), 'lng': round(lng, 6),
+              'radius_km': rng.choice(args.radii), 'limit': 20}
+    if rng.random() < args.open_now_share:
+        params['open_now'] = 'true'
+    if rng.random() < args.doctor_share:
+        path = '/api/locator/doctors'
+        if rng.random() < 0.3:
+            params['specialty'] = rng.choice(SPECIALTIES)
+    else:
+        path = '/api/locator/pharmacies'
+    return path, params
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    hotspots, weights = make_hotspots(args.hotspots, rng)
+    requests = [make_request(hotspots, weights, args, rng) for _ in range(args.requests)]
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30) as client:
+        before = (await client.get('/api/locator/cache-stats')).json()
+        sem = asyncio.Semaphore(args.concurrency)
+        latencies = []
+
+        async def one(path, params):
+            async with sem:
+                start = time.perf_counter()
+                r = await client.get(path, params=params)
+                r.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(path, params) for path, params in requests))
+        elapsed = time.perf_counter() - start
+        after = (await client.get('/api/locator/cache-stats')).json()
+
+    latencies.sort()
+    print(f"{args.requests / elapsed:8.1f} req/s  p50={latencies[len(latencies) // 2]:.2f}ms  "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1]:.2f}ms")
+    hits = after['hits'] - before['hits']
+    misses = after['misses'] - before['misses']
+    fallbacks = after['fallbacks'] - before['fallbacks']
+    if hits + misses:
+        print(f"cache: {hits} hits, {misses} misses, {fallbacks} fallbacks, "
+              f"hit rate {hits / (hits + misses):.1%}, {after['size']} cells cached")
+    else:
+        print("cache: disabled or bypassed (GEO_BACKEND=memory)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:8001')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--hotspots', type=int, default=200)
+    parser.add_argument('--radii', type=float, nargs='+', default=[2, 5, 10])
+    parser.add_argument('--open-now-share', type=float, default=0.3)
+    parser.add_argument('--doctor-share', type=float, default=0.4)
+    parser.add_argument('--seed', type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+"""Measure /api/medicines/search latency before and during a login storm.
+
+Run against a live server started with RATE_LIMIT_ENABLED=0; with the
+default auth limit most logins would get a 429 without ever reaching
+bcrypt, so the run fails if any login is rate limited:
+    RATE_LIMIT_ENABLED=0 uvicorn server:app --port 8001
+    python bench/login_storm.py --base-url http://localhost:8001 --logins 200
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+
+import httpx
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def probe_search(client, stop, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get('/api/medicines/search', params={'query': 'tyl'})
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def login_storm(client, email, password, total, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    statuses = {}
+
+    async def one():
+        async with sem:
+            resp = await client.post('/api/auth/login', json={'email': email, 'password': password})
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    await asyncio.gather(*(one() for _ in range(total)))
+    return statuses
+
+
+async def measure(client, seconds, storm=None):
+    samples = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_search(client, stop, samples))
+    if storm is not None:
+        result = await storm
+    else:
+        await asyncio.sleep(seconds)
+        result = None
+    stop.set()
+    await probe
+    return samples, result
+
+
+def report(label, samples):
+    print(f"{label:<14} n={len(samples):<5} p50={percentile(samples, 50):7.1f}ms "
+          f"p99={percentile(samples, 99):7.1f}ms")
+
+
+async def main(args):
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    password = 'bench-password'
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30) as client:
+        await client.post('/api/auth/register',
+                          json={'email': email, 'password': password, 'age_confirmed': True})
+
+        baseline, _ = await measure(client, args.baseline_seconds)
+        storm_samples, statuses = await measure(
+            client, 0, login_storm(client, email, password, args.logins, args.concurrency))
+
+    report('baseline', baseline)
+    report('login storm', storm_samples)
+    print(f"login statuses: {statuses}")
+    if statuses.get(429):
+        print(f"FAIL {statuses[429]} logins were rate limited; restart the server with RATE_LIMIT_ENABLED=0")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:8001')
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--baseline-seconds', type=float, default=5.0)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,79 @@
+"""Compare medicine detail latency: six sequential queries vs one aggregation vs cache.
+
+Talks to Mongo directly and seeds its own medicine:
+    MONGO_URL=mongodb://localhost:27017 python bench/medicine_detail.py --iterations 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from medicine_detail import (  # noqa: E402
+    DETAIL_COLLECTIONS, MedicineDetailCache, fetch_medicine_detail,
+)
+
+
+async def fetch_sequential(db, medicine_id):
+    """The original get_medicine_info access pattern"""
+    medicine = await db.medicines.find_one({'id': medicine_id}, {'_id': 0})
+    for collection, (field, item_field, _) in DETAIL_COLLECTIONS.items():
+        items = await db[collection].find({'medicine_id': medicine_id}, {'_id': 0}).to_list(100)
+        medicine[field] = [item[item_field] for item in items]
+    return medicine
+
+
+async def fetch_cached(db, cache, medicine_id):
+    value = cache.get(medicine_id)
+    if value is None:
+        value = await fetch_medicine_detail(db, medicine_id)
+        cache.set(medicine_id, value)
+    return value
+
+
+async def seed(db, medicine_id, items):
+    await db.medicines.insert_one({'id': medicine_id, 'brand_name': 'Benchol', 'generic_name': 'Benchamide'})
+    for collection, (_, item_field, _) in DETAIL_COLLECTIONS.items():
+        await db[collection].insert_many(
+            [{'medicine_id': medicine_id, item_field: f"{item_field} {i}"} for i in range(items)])
+        await db[collection].create_index('medicine_id')
+
+
+async def time_path(label, fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(f"{label:<12} p50={samples[len(samples) // 2]:7.3f}ms "
+          f"p99={samples[int(len(samples) * 0.99) - 1]:7.3f}ms")
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[f"otcwise_bench_{uuid.uuid4().hex[:8]}"]
+    medicine_id = str(uuid.uuid4())
+    try:
+        await seed(db, medicine_id, args.items)
+        cache = MedicineDetailCache()
+        await time_path('sequential', lambda: fetch_sequential(db, medicine_id), args.iterations)
+        await time_path('aggregated', lambda: fetch_medicine_detail(db, medicine_id), args.iterations)
+        await time_path('cached', lambda: fetch_cached(db, cache, medicine_id), args.iterations)
+        print(f"cache: {cache.stats()}")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--items', type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
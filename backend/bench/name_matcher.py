@@ -0,0 +1,98 @@
+"""Compare the per-word regex scan with MedicineNameIndex on noisy OCR text.
+
+The regex baseline mirrors the old identify_medicine loop: one unanchored,
+case-insensitive scan of the whole catalog per OCR word, first hit wins.
+
+    python bench/name_matcher.py --catalog 20000 --samples 200
+"""
+import argparse
+import random
+import re
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from name_index import MedicineNameIndex  # noqa: E402
+
+SYLLABLES = ['ab', 'ac', 'al', 'am', 'ben', 'cet', 'cil', 'dex', 'dol', 'fen', 'gab', 'hyd',
+             'ib', 'lor', 'mek', 'mol', 'nap', 'nol', 'ox', 'pra', 'pro', 'ril', 'sar', 'tan',
+             'ten', 'tyl', 'vil', 'xin', 'zol', 'zep']
+FILLER = ['tablets', 'extra', 'strength', 'each', 'contains', 'caplets', 'relief', 'directions',
+          'warnings', 'adults', 'children', 'under', 'years', 'take', 'with', 'water']
+OCR_SWAPS = {'o': '0', 'l': '1', 'e': '3', 's': '5', 'm': 'rn', 'i': 'l'}
+
+
+def make_name(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def make_catalog(size, rng):
+    return [{'id': str(i), 'brand_name': make_name(rng), 'generic_name': make_name(rng)}
+            for i in range(size)]
+
+
+def corrupt(word, rng, rate=0.15):
+    out = []
+    for ch in word:
+        roll = rng.random()
+        if roll < rate and ch.lower() in OCR_SWAPS:
+            out.append(OCR_SWAPS[ch.lower()])
+        elif roll < rate * 1.3:
+            out.append(rng.choice(string.ascii_lowercase))
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+def make_sample(medicine, rng):
+    words = rng.sample(FILLER, 6) + [corrupt(medicine['brand_name'], rng), '500mg']
+    rng.shuffle(words)
+    return ' '.join(words).upper()
+
+
+def regex_loop(catalog, text):
+    for word in text.split():
+        if len(word) > 3:
+            pattern = re.compile(re.escape(word), re.IGNORECASE)
+            hits = [m for m in catalog
+                    if pattern.search(m['brand_name']) or pattern.search(m['generic_name'])]
+            if hits:
+                return [m['id'] for m in hits[:5]]
+    return []
+
+
+def run(label, fn, samples):
+    correct = 0
+    start = time.perf_counter()
+    for expected, text in samples:
+        ids = fn(text)
+        correct += bool(ids) and ids[0] == expected
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed / len(samples) * 1000:9.3f} ms/image  "
+          f"top-1 accuracy {correct / len(samples):6.1%}")
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    catalog = make_catalog(args.catalog, rng)
+    targets = rng.sample(catalog, args.samples)
+    samples = [(m['id'], make_sample(m, rng)) for m in targets]
+
+    index = MedicineNameIndex()
+    start = time.perf_counter()
+    index.build(catalog)
+    print(f"index build: {(time.perf_counter() - start) * 1000:.1f} ms for {len(catalog)} medicines")
+
+    run('regex', lambda text: regex_loop(catalog, text), samples)
+    run('matcher', lambda text: [mid for mid, _ in index.match(text)], samples)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--catalog', type=int, default=20000)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    main(parser.parse_args())
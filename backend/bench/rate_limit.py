@@ -0,0 +1,78 @@
+"""Overhead and behaviour of the rate-limit middleware on the in-memory backend.
+
+Drives a bare Starlette app through httpx's ASGI transport, so the numbers
+are middleware cost only: a limited route vs an unlimited one, with many
+users sharing one bucket table. Also checks that the limit holds and that
+denied requests carry Retry-After.
+    python bench/rate_limit.py --requests 5000 --users 1000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rate_limit import MemoryBackend, RateLimitMiddleware, Rule, parse_limit  # noqa: E402
+
+
+async def ok(request):
+    return PlainTextResponse('ok')
+
+
+def make_app(limit):
+    app = Starlette(routes=[Route('/limited', ok, methods=['POST']), Route('/open', ok, methods=['POST'])])
+    return RateLimitMiddleware(
+        app,
+        rules={('POST', '/limited'): Rule('bench', limit)},
+        backend=MemoryBackend(),
+        identify=lambda request: request.headers.get('x-user'),
+        enabled=True,
+    )
+
+
+async def timed(client, path, requests, users):
+    start = time.perf_counter()
+    for i in range(requests):
+        await client.post(path, headers={'x-user': f'user-{i % users}'})
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+async def main(args):
+    limit = parse_limit(args.limit)
+    transport = httpx.ASGITransport(app=make_app(limit))
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        statuses = [(await client.post('/limited', headers={'x-user': 'burst'})).status_code
+                    for _ in range(limit.limit + 5)]
+        denied = await client.post('/limited', headers={'x-user': 'burst'})
+        anonymous = [(await client.post('/limited')).status_code for _ in range(limit.limit + 1)]
+        failures = []
+        if statuses.count(200) != limit.limit or statuses.count(429) != 5:
+            failures.append(f"burst of {len(statuses)} allowed {statuses.count(200)}, expected {limit.limit}")
+        if denied.status_code != 429 or int(denied.headers.get('retry-after', 0)) < 1:
+            failures.append(f"denied response missing Retry-After: {denied.status_code} {dict(denied.headers)}")
+        if anonymous[-1] != 429:
+            failures.append("anonymous requests were not limited by client IP")
+
+        await timed(client, '/open', 200, args.users)
+        open_us = await timed(client, '/open', args.requests, args.users)
+        limited_us = await timed(client, '/limited', args.requests, args.users)
+    print(f"unlimited route: {open_us:7.1f} us/request")
+    print(f"limited route:   {limited_us:7.1f} us/request  ({limited_us - open_us:+.1f} us, {args.users} users)")
+    for failure in failures:
+        print(f"  FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--limit', default='10/minute')
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,126 @@
+"""Requests/sec per core for medicine detail and first-aid detail, before vs after.
+
+"before" serves cached Pydantic models through ``response_model`` and the
+stdlib JSON response, as the handlers used to; "after" serves the cached
+encoded bytes the handlers now keep. Both apps use the server's models and
+are called as plain ASGI apps on one event loop, with no HTTP client, so
+the numbers are server-side cost per core:
+    python bench/serialization.py --requests 20000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import orjson
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from first_aid import EMERGENCY_NOTE, build_snapshot, cached_response  # noqa: E402
+from serialization import dumps, json_response, model_document  # noqa: E402
+from server import FirstAidDetail, FirstAidStep, MedicineInfo  # noqa: E402
+
+MEDICINE = {
+    'id': 'bench-medicine', 'brand_name': 'Advil', 'generic_name': 'Ibuprofen', 'drug_class': 'NSAID',
+    'standard_adult_dose': '200-400 mg every 4-6 hours as needed; do not exceed 1200 mg in 24 hours',
+    'indications': ['Headache', 'Dental pain', 'Menstrual cramps', 'Muscle aches', 'Minor arthritis pain', 'Fever'],
+    'contraindications': ['Known allergy to NSAIDs', 'History of stomach ulcers or bleeding', 'Late pregnancy'],
+    'interactions': ['Anticoagulants such as warfarin', 'Other NSAIDs', 'Lithium', 'Methotrexate', 'ACE inhibitors'],
+    'adverse_effects': ['Upset stomach', 'Heartburn', 'Nausea', 'Dizziness', 'Rare: stomach bleeding'],
+    'cautions': ['Take with food or milk', 'Avoid alcohol', 'Ask a pharmacist if taking other medicines'],
+    'name_key': 'advil', 'ngrams': ['adv', 'dvi', 'vil'],
+}
+TOPIC = {'id': 'burns', 'title': 'Burns', 'description': 'Minor burn care', 'icon': 'flame'}
+STEPS = [{'topic_id': 'burns', 'step_order': i, 'instruction': f"Step {i}: cool the burn under cool running "
+          f"water for at least 10 minutes and remove tight items before swelling starts."} for i in range(1, 7)]
+
+
+def before_app() -> FastAPI:
+    app = FastAPI()
+    cache = {MEDICINE['id']: MedicineInfo(**MEDICINE)}
+
+    @app.get('/api/medicines/{medicine_id}', response_model=MedicineInfo)
+    async def get_medicine_info(medicine_id: str):
+        cached = cache.get(medicine_id)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Medicine not found")
+        return cached
+
+    @app.get('/api/first-aid/{topic_id}', response_model=FirstAidDetail)
+    async def get_first_aid_detail(topic_id: str):
+        steps: List[FirstAidStep] = [FirstAidStep(**step) for step in STEPS]
+        return FirstAidDetail(**TOPIC, steps=steps, emergency_note=EMERGENCY_NOTE)
+
+    return app
+
+
+def after_app() -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+    cache = {MEDICINE['id']: dumps(model_document(MedicineInfo, MEDICINE))}
+    snapshot = build_snapshot([TOPIC], STEPS)
+
+    @app.get('/api/medicines/{medicine_id}', response_model=MedicineInfo)
+    async def get_medicine_info(medicine_id: str):
+        body = cache.get(medicine_id)
+        if body is None:
+            raise HTTPException(status_code=404, detail="Medicine not found")
+        return json_response(body)
+
+    @app.get('/api/first-aid/{topic_id}', response_model=FirstAidDetail)
+    async def get_first_aid_detail(topic_id: str, request: Request):
+        return cached_response(request, snapshot.details[topic_id], snapshot.etag)
+
+    return app
+
+
+async def call(app, path: str) -> bytes:
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+             'headers': [(b'host', b'bench')], 'client': ('127.0.0.1', 1), 'server': ('bench', 80)}
+    body = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.body':
+            body.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return b''.join(body)
+
+
+async def rps(app, path: str, requests: int) -> float:
+    for _ in range(200):
+        await call(app, path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await call(app, path)
+    return requests / (time.perf_counter() - start)
+
+
+async def main(args):
+    apps = {'before': before_app(), 'after': after_app()}
+    paths = {'medicine detail': f"/api/medicines/{MEDICINE['id']}", 'first-aid detail': '/api/first-aid/burns'}
+    failures = []
+    for label, path in paths.items():
+        old = orjson.loads(await call(apps['before'], path))
+        new = orjson.loads(await call(apps['after'], path))
+        if old != new:
+            failures.append(f"{label}: response bodies differ")
+        results = {name: await rps(app, path, args.requests) for name, app in apps.items()}
+        print(f"{label:<17} before {results['before']:8.0f} req/s   after {results['after']:8.0f} req/s   "
+              f"x{results['after'] / results['before']:.2f}")
+    for failure in failures:
+        print(f"  FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    sys.exit(asyncio.run(main(parser.parse_args())))
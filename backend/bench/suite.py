@@ -0,0 +1,457 @@
+"""Mixed-workload load test of the API, with baseline comparison.
+
+Boots ``server.app`` in-process with the fake LLM. It runs against the
+Mongo in MONGO_URL, or against mongomock with ``--mongomock``, which uses
+the in-memory geo backend since mongomock has no $geoNear. The suite
+bulk-inserts generated catalogs before startup, so the startup backfills
+and catalog load run as they would after a deploy. It then drives a
+weighted mix of scenarios from concurrent virtual users, and reports
+throughput and p50/p95/p99 per scenario:
+    MONGO_URL=mongodb://localhost:27017 python bench/suite.py --duration 30 --save results.json
+
+``bench/baseline.json`` is a committed mongomock run of the browse mix on a
+small catalog. Compare a change against it with the same flags:
+    python bench/suite.py --mongomock --mix browse --medicines 500 --pharmacies 200 --doctors 100 \
+        --users 20 --concurrency 8 --duration 10 --baseline bench/baseline.json
+It was recorded on one machine, so on another first save a baseline of the
+unchanged tree with the same command and ``--save``, and compare to that.
+
+Before the load phase it records startup cost: the time to import the
+server in a fresh interpreter, how long after startup /api/health/ready
+turns 200, and when a search request first completes under ``--fast-ms``.
+
+``--baseline`` exits non-zero when a scenario's p95 or throughput regressed
+by more than ``--tolerance``, and notes any run settings that differ from
+the baseline's. Load is generated on the server's event loop,
+so compare runs from the same machine and mode; the numbers are relative.
+Any run also fails if a symptom check answers non-2xx or with the fallback
+analysis, since those latencies would not be measuring the real path.
+The OCR scenario needs the tesseract binary and is skipped without it.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, NamedTuple
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+CITY = (40.7128, -74.0060)
+SPECIALTIES = ['General Practice', 'Pediatrics', 'Dermatology', 'Cardiology', 'Family Medicine']
+SYMPTOMS = ['headache', 'runny nose', 'sore throat', 'cough', 'fever', 'fatigue', 'nausea', 'back pain',
+            'sneezing', 'itchy eyes', 'muscle aches', 'heartburn', 'dizziness', 'insomnia']
+DETAIL_ITEMS = 3
+PASSWORD = 'bench-password'
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def use_mongomock():
+    """Point the server's Motor client at an in-memory mongomock client"""
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+
+    class Client(AsyncMongoMockClient):
+        def __init__(self, host=None, **options):
+            super().__init__()
+
+    motor.motor_asyncio.AsyncIOMotorClient = Client
+    os.environ['GEO_BACKEND'] = 'memory'
+    os.environ['MEDICINE_CACHE_WATCH'] = 'false'
+
+
+def make_name(rng):
+    syllables = ['ac', 'al', 'ben', 'car', 'cet', 'dex', 'fen', 'ib', 'lor', 'mel', 'nap', 'ox', 'pro', 'ra',
+                 'sal', 'ta', 'ti', 'ver', 'zol', 'mi', 'ne', 'do', 'pa', 'ro', 'xa']
+    return ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+async def insert_chunked(collection, records, size=5000):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            await collection.insert_many(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch)
+
+
+async def seed_catalogs(db, args, rng) -> List[dict]:
+    """Generated medicines, details and providers; returns the medicines.
+
+    Search fields and provider locations are left for the startup backfills.
+    """
+    from medicine_detail import DETAIL_COLLECTIONS
+
+    medicines = []
+    for i in range(args.medicines):
+        generic = make_name(rng) + rng.choice(['fen', 'mide', 'zole', 'pril', 'statin', 'cillin', 'ine'])
+        medicines.append({'id': f"bench-med-{i}", 'brand_name': make_name(rng), 'generic_name': generic,
+                          'drug_class': rng.choice(['Analgesic', 'NSAID', 'Antihistamine', 'Antacid'])})
+    await insert_chunked(db.medicines, [dict(medicine) for medicine in medicines])
+    for collection, (_, item_field, _) in DETAIL_COLLECTIONS.items():
+        await insert_chunked(db[collection], (
+            {'medicine_id': medicine['id'], item_field: f"{item_field.replace('_', ' ')} {j} for {medicine['generic_name']}"}
+            for medicine in medicines for j in range(DETAIL_ITEMS)))
+
+    def providers(kind, count):
+        for i in range(count):
+            record = {
+                'id': f"bench-{kind}-{i}", 'name': f"{make_name(rng)} {kind.title()}",
+                'address': f"{rng.randint(1, 999)} {make_name(rng)} St",
+                'latitude': CITY[0] + rng.uniform(-0.5, 0.5), 'longitude': CITY[1] + rng.uniform(-0.5, 0.5),
+                'phone': f"555-{rng.randint(1000, 9999)}",
+                # Weekdays 08:00-20:00 UTC
+                'opening_hours': [{'start': day * 1440 + 480, 'end': day * 1440 + 1200} for day in range(5)],
+            }
+            if kind == 'doctor':
+                record['specialty'] = rng.choice(SPECIALTIES)
+            yield record
+    await insert_chunked(db.pharmacies, providers('pharmacy', args.pharmacies))
+    await insert_chunked(db.doctors, providers('doctor', args.doctors))
+    return medicines
+
+
+async def seed_users(server, count: int) -> List[dict]:
+    from passwords import hash_password
+
+    password_hash = hash_password(PASSWORD)
+    users = []
+    now = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime())
+    consents = []
+    for i in range(count):
+        user_id = str(uuid.uuid4())
+        consent = {'id': str(uuid.uuid4()), 'user_id': user_id, 'age_confirmed': True, 'disclaimer_accepted': True,
+                   'consent_version': server.CONSENT_VERSION, 'accepted_at': now}
+        consents.append(consent)
+        users.append({'id': user_id, 'email': f"bench-{i}-{user_id[:8]}@example.com",
+                      'token': server.create_jwt_token(user_id, consent=consent)})
+    await server.db.users.insert_many([
+        {'id': user['id'], 'email': user['email'], 'password_hash': password_hash, 'is_active': True,
+         'token_version': 0, 'created_at': now, 'last_login': now} for user in users])
+    await server.db.user_consent.insert_many(consents)
+    return users
+
+
+def make_label_image(text: str) -> bytes:
+    from PIL import Image, ImageDraw
+
+    image = Image.new('L', (640, 200), 255)
+    ImageDraw.Draw(image).text((20, 80), text, fill=0)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class Context(NamedTuple):
+    medicines: List[dict]
+    users: List[dict]
+    symptom_sets: List[List[str]]
+    label_images: List[bytes]
+
+
+def auth(ctx, rng):
+    return {'Authorization': f"Bearer {rng.choice(ctx.users)['token']}"}
+
+
+async def search_as_you_type(client, ctx, rng):
+    name = rng.choice(ctx.medicines)[rng.choice(['brand_name', 'generic_name'])]
+    return await client.get('/api/medicines/search', params={'query': name[:rng.randint(1, min(8, len(name)))]})
+
+
+async def medicine_detail(client, ctx, rng):
+    # Skewed towards a hot set, as real traffic is
+    index = min(len(ctx.medicines) - 1, int(rng.paretovariate(1.2)) - 1)
+    return await client.get(f"/api/medicines/{ctx.medicines[index]['id']}")
+
+
+async def symptom_check(client, ctx, rng):
+    return await client.post('/api/symptoms/check', json={'symptoms': rng.choice(ctx.symptom_sets)},
+                             headers=auth(ctx, rng))
+
+
+async def login(client, ctx, rng):
+    return await client.post('/api/auth/login', json={'email': rng.choice(ctx.users)['email'], 'password': PASSWORD})
+
+
+async def ocr_upload(client, ctx, rng):
+    files = {'file': ('label.png', rng.choice(ctx.label_images), 'image/png')}
+    return await client.post('/api/medicines/identify', files=files, headers=auth(ctx, rng))
+
+
+async def locator(client, ctx, rng):
+    params = {'lat': CITY[0] + rng.uniform(-0.3, 0.3), 'lng': CITY[1] + rng.uniform(-0.3, 0.3),
+              'radius_km': rng.choice([2, 5, 10]), 'open_now': rng.random() < 0.3}
+    if rng.random() < 0.5:
+        return await client.get('/api/locator/pharmacies', params=params)
+    if rng.random() < 0.3:
+        params['specialty'] = rng.choice(SPECIALTIES)
+    return await client.get('/api/locator/doctors', params=params)
+
+
+async def first_aid(client, ctx, rng):
+    return await client.get('/api/first-aid/topics')
+
+
+SCENARIOS: Dict[str, Callable[..., Awaitable[httpx.Response]]] = {
+    'search': search_as_you_type,
+    'detail': medicine_detail,
+    'symptoms': symptom_check,
+    'login': login,
+    'ocr': ocr_upload,
+    'locator': locator,
+    'first_aid': first_aid,
+}
+
+# Relative weights of each scenario in a workload mix
+MIXES = {
+    'mixed': {'search': 40, 'detail': 20, 'symptoms': 5, 'login': 3, 'ocr': 1, 'locator': 20, 'first_aid': 11},
+    'browse': {'search': 50, 'detail': 25, 'locator': 15, 'first_aid': 10},
+    'login_storm': {'login': 60, 'search': 40},
+    'symptoms': {'symptoms': 80, 'search': 20},
+}
+
+
+# Scenarios where any non-2xx answer, or a fallback answer, fails the run
+STRICT_SCENARIOS = {'symptoms'}
+# Flags that only change how a run is judged, not what it measures
+COMPARISON_SETTINGS = {'tolerance', 'min_delta_ms', 'fast_ms'}
+
+
+def response_status(name: str, response: httpx.Response):
+    """Status to record; a symptom fallback is a 200 that still means the analysis failed"""
+    if name == 'symptoms' and response.status_code == 200:
+        import server
+        if response.json().get('summary') == server.symptom_fallback()['summary']:
+            return 'fallback'
+    return response.status_code
+
+
+def is_error(name: str, status) -> bool:
+    if not isinstance(status, int):
+        return True
+    if name in STRICT_SCENARIOS:
+        return not 200 <= status < 300
+    return status >= 500 or status == 429
+
+
+async def virtual_user(client, ctx, mix, rng, deadline, samples, statuses):
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await SCENARIOS[name](client, ctx, rng)
+            status = response_status(name, response)
+        except Exception as e:
+            status = type(e).__name__
+        if samples is not None:
+            samples[name].append((time.perf_counter() - start) * 1000)
+            statuses[name][status] = statuses[name].get(status, 0) + 1
+
+
+async def drive(client, ctx, mix, args, seconds, record=True):
+    samples = {name: [] for name in mix} if record else None
+    statuses = {name: {} for name in mix}
+    deadline = time.perf_counter() + seconds
+    rngs = [random.Random(args.seed * 1000 + i) for i in range(args.concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(virtual_user(client, ctx, mix, rng, deadline, samples, statuses) for rng in rngs))
+    elapsed = time.perf_counter() - start
+    if not record:
+        return None
+    results = {}
+    for name, latencies in samples.items():
+        if not latencies:
+            continue
+        errors = sum(count for status, count in statuses[name].items() if is_error(name, status))
+        results[name] = {
+            'requests': len(latencies), 'errors': errors, 'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50), 'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99), 'statuses': {str(k): v for k, v in statuses[name].items()},
+        }
+    return results
+
+
+def measure_import() -> float:
+    """Seconds to import the server in a fresh interpreter, as each worker does on boot"""
+    code = 'import time; start = time.perf_counter(); import server; print(time.perf_counter() - start)'
+    completed = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=os.environ,
+                               capture_output=True, text=True, check=True)
+    return float(completed.stdout.split()[-1])
+
+
+async def measure_startup(client, started: float, query: str, fast_ms: float, interval: float = 0.25,
+                         timeout: float = 300) -> dict:
+    """Poll readiness and a search request from the moment startup began"""
+    startup = {'ready_s': None, 'first_request_ms': None, 'first_fast_request_s': None}
+    while time.perf_counter() - started < timeout:
+        if startup['ready_s'] is None and (await client.get('/api/health/ready')).status_code == 200:
+            startup['ready_s'] = time.perf_counter() - started
+        if startup['first_fast_request_s'] is None:
+            sent = time.perf_counter()
+            response = await client.get('/api/medicines/search', params={'query': query})
+            latency_ms = (time.perf_counter() - sent) * 1000
+            if startup['first_request_ms'] is None:
+                startup['first_request_ms'] = latency_ms
+            if response.status_code == 200 and latency_ms <= fast_ms:
+                startup['first_fast_request_s'] = time.perf_counter() - started
+        if None not in (startup['ready_s'], startup['first_fast_request_s']):
+            break
+        await asyncio.sleep(interval)
+    return startup
+
+
+def report_startup(startup: dict, baseline, args):
+    def seconds(value):
+        return '-' if value is None else f"{value:.2f}s"
+
+    print(f"startup: import {seconds(startup['import_s'])}, lifespan {seconds(startup['lifespan_s'])}, "
+          f"ready after {seconds(startup['ready_s'])}, first search {startup['first_request_ms']:.1f}ms, "
+          f"first search under {args.fast_ms:g}ms after {seconds(startup['first_fast_request_s'])}")
+    if baseline:
+        print(f"baseline: import {seconds(baseline.get('import_s'))}, ready after {seconds(baseline.get('ready_s'))}, "
+              f"first search under {args.fast_ms:g}ms after {seconds(baseline.get('first_fast_request_s'))}")
+
+
+def report(results, baseline, args) -> List[str]:
+    print(f"{'scenario':<10} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          + ('  vs baseline' if baseline else ''))
+    regressions = []
+    for name, row in results.items():
+        line = (f"{name:<10} {row['requests']:>8} {row['errors']:>6} {row['rps']:>8.1f} "
+                f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+        base = (baseline or {}).get(name)
+        if base:
+            p95_change = row['p95_ms'] / base['p95_ms'] - 1 if base['p95_ms'] else 0.0
+            rps_change = row['rps'] / base['rps'] - 1 if base['rps'] else 0.0
+            line += f"  p95 {p95_change:+.0%} rps {rps_change:+.0%}"
+            # The absolute floor keeps sub-millisecond jitter from failing a run
+            if p95_change > args.tolerance and row['p95_ms'] - base['p95_ms'] > args.min_delta_ms:
+                regressions.append(f"{name}: p95 {base['p95_ms']:.1f}ms -> {row['p95_ms']:.1f}ms")
+            if rps_change < -args.tolerance:
+                regressions.append(f"{name}: throughput {base['rps']:.1f} -> {row['rps']:.1f} rps")
+        print(line)
+        if row['errors']:
+            print(f"{'':<10} statuses {row['statuses']}")
+    return regressions
+
+
+async def main(args):
+    os.environ['LLM_PROVIDER'] = 'fake'
+    # Shipped catalogs (first aid content, well-known medicines) load on top of the generated ones
+    os.environ['CATALOG_LOAD'] = 'always'
+    os.environ['CATALOG_DIR'] = str(BACKEND_DIR / 'data')
+    # The suite measures handler cost; limits would turn most of the load into 429s
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    os.environ.setdefault('FAKE_LLM_LATENCY_MS', str(args.llm_latency_ms))
+    if args.mongomock:
+        use_mongomock()
+        os.environ.setdefault('MONGO_URL', 'mongodb://mongomock')
+    os.environ['DB_NAME'] = args.db_name or f"otcwise_bench_{uuid.uuid4().hex[:8]}"
+
+    rng = random.Random(args.seed)
+
+    import_s = measure_import()
+    import server
+
+    mix = dict(MIXES[args.mix])
+    if 'ocr' in mix and not shutil.which('tesseract'):
+        print("tesseract not found; skipping the ocr scenario")
+        del mix['ocr']
+
+    start = time.perf_counter()
+    # Opened before startup so the catalogs are seeded first; the lifespan reuses this client
+    server.mongo.connect()
+    try:
+        medicines = await seed_catalogs(server.db, args, rng)
+        booted = time.perf_counter()
+        async with server.app.router.lifespan_context(server.app):
+            lifespan_s = time.perf_counter() - booted
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=60) as client:
+                startup = await measure_startup(client, booted, medicines[0]['brand_name'][:3], args.fast_ms)
+                startup.update(import_s=import_s, lifespan_s=lifespan_s)
+                users = await seed_users(server, args.users)
+                print(f"seeded {args.medicines} medicines, {args.pharmacies} pharmacies, {args.doctors} doctors, "
+                      f"{args.users} users in {time.perf_counter() - start:.1f}s")
+                ctx = Context(
+                    medicines=medicines,
+                    users=users,
+                    symptom_sets=[rng.sample(SYMPTOMS, rng.randint(1, 3)) for _ in range(args.symptom_sets)],
+                    label_images=[make_label_image(f"{m['brand_name']} {m['generic_name']} 200mg".upper())
+                                  for m in medicines[:20]],
+                )
+                if args.warmup:
+                    await drive(client, ctx, mix, args, args.warmup, record=False)
+                results = await drive(client, ctx, mix, args, args.duration)
+    finally:
+        if not args.mongomock and not args.db_name:
+            server.mongo.connect()
+            await server.mongo.client.drop_database(os.environ['DB_NAME'])
+        server.mongo.close()
+
+    baseline = None
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+    print(f"mix={args.mix} concurrency={args.concurrency} duration={args.duration}s "
+          f"mongo={'mongomock' if args.mongomock else 'MONGO_URL'}")
+    if baseline:
+        changed = [name for name, value in baseline.get('config', {}).items()
+                   if name not in COMPARISON_SETTINGS and vars(args).get(name) != value]
+        if changed:
+            print(f"note: baseline was run with different {', '.join(changed)}")
+    report_startup(startup, baseline and baseline.get('startup'), args)
+    regressions = report(results, baseline and baseline['results'], args)
+    if args.save:
+        config = {k: v for k, v in vars(args).items() if k not in ('save', 'baseline')}
+        Path(args.save).write_text(json.dumps({'config': config, 'startup': startup, 'results': results}, indent=2) + '\n')
+        print(f"saved results to {args.save}")
+    for regression in regressions:
+        print(f"  REGRESSION {regression}")
+    failures = [f"{name}: {row['errors']} of {row['requests']} requests failed {row['statuses']}"
+                for name, row in results.items() if name in STRICT_SCENARIOS and row['errors']]
+    for failure in failures:
+        print(f"  FAIL {failure}")
+    return 1 if regressions or failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--mongomock', action='store_true', help='in-memory Mongo instead of MONGO_URL')
+    parser.add_argument('--db-name', help='existing database to use and keep (default: a throwaway one)')
+    parser.add_argument('--medicines', type=int, default=5000)
+    parser.add_argument('--pharmacies', type=int, default=2000)
+    parser.add_argument('--doctors', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--symptom-sets', type=int, default=200)
+    parser.add_argument('--llm-latency-ms', type=float, default=800)
+    parser.add_argument('--save', help='write results as JSON, e.g. to use as a baseline')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative p95/throughput change')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='ignore p95 increases smaller than this')
+    parser.add_argument('--fast-ms', type=float, default=50, help='latency a startup search request must beat')
+    parser.add_argument('--seed', type=int, default=11)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,104 @@
+"""Accuracy and throughput of the symptom response parser on a fixtures corpus.
+
+Each fixture in fixtures/symptom_responses.jsonl holds a model response and
+the fields a correct parse should produce (null where the model supplied
+nothing and the default applies). Every response is parsed whole and again
+in random-sized chunks, as a stream would deliver it.
+    python bench/symptom_parser.py --repeat 200
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from symptom_parser import (  # noqa: E402
+    DEFAULT_ASSOCIATIONS, DEFAULT_NEXT_STEPS, DEFAULT_RISK_LEVEL, DEFAULT_SUMMARY, FIELDS,
+    SymptomResponseParser,
+)
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures' / 'symptom_responses.jsonl'
+DEFAULTS = {
+    'summary': DEFAULT_SUMMARY,
+    'possible_associations': DEFAULT_ASSOCIATIONS,
+    'risk_level': DEFAULT_RISK_LEVEL,
+    'next_steps': DEFAULT_NEXT_STEPS,
+}
+
+
+def parse(response, chunk_sizes=None):
+    parser = SymptomResponseParser()
+    if chunk_sizes is None:
+        parser.feed(response)
+    else:
+        pos = 0
+        for size in chunk_sizes:
+            parser.feed(response[pos:pos + size])
+            pos += size
+    parser.finish()
+    return parser.result(), parser.fallbacks
+
+
+def chunking(length, rng, max_chunk):
+    sizes = []
+    while sum(sizes) < length:
+        sizes.append(rng.randint(1, max_chunk))
+    return sizes
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    fixtures = [json.loads(line) for line in FIXTURES.read_text(encoding='utf-8').splitlines() if line.strip()]
+    correct = total = fallbacks = 0
+    failures = []
+    for fixture in fixtures:
+        expected = {name: fixture['expected'][name] or DEFAULTS[name] for name in FIELDS}
+        result, missing = parse(fixture['response'])
+        fallbacks += len(missing)
+        for name in FIELDS:
+            total += 1
+            if result[name] == expected[name]:
+                correct += 1
+            else:
+                failures.append(f"{fixture['name']}.{name}: {result[name]!r}")
+        for _ in range(args.stream_trials):
+            streamed, _ = parse(fixture['response'], chunking(len(fixture['response']), rng, args.max_chunk))
+            if streamed != result:
+                failures.append(f"{fixture['name']}: streamed parse differs from whole parse")
+                break
+
+    print(f"fields correct: {correct}/{total} ({correct / total:.1%}), "
+          f"defaults used: {fallbacks}/{total} across {len(fixtures)} fixtures")
+    for failure in failures:
+        print(f"  FAIL {failure}")
+
+    responses = [fixture['response'] for fixture in fixtures]
+    size = sum(len(response) for response in responses)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for response in responses:
+            parse(response)
+    elapsed = time.perf_counter() - start
+    print(f"whole:    {args.repeat * len(responses) / elapsed:9.0f} responses/s  "
+          f"{args.repeat * size / elapsed / 1e6:6.1f} MB/s")
+    chunked = [(response, [16] * (len(response) // 16 + 1)) for response in responses]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for response, sizes in chunked:
+            parse(response, sizes)
+    elapsed = time.perf_counter() - start
+    print(f"16B chunks: {args.repeat * len(responses) / elapsed:7.0f} responses/s  "
+          f"{args.repeat * size / elapsed / 1e6:6.1f} MB/s")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--stream-trials', type=int, default=20)
+    parser.add_argument('--max-chunk', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=3)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""Compare time-to-first-byte and total time of /symptoms/check vs its SSE variant.
+
+Start the server with the fake LLM so both paths see the same latency, and
+without rate limiting, which would refuse most of one user's checks; distinct
+symptom sets make every request reach the model:
+    LLM_PROVIDER=fake RATE_LIMIT_ENABLED=0 uvicorn server:app --port 8001
+    python bench/symptom_stream.py --base-url http://localhost:8001 --requests 20
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+
+async def timed(client, method, path, headers, body):
+    start = time.perf_counter()
+    first_byte = first_section = None
+    async with client.stream(method, path, headers=headers, json=body) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_text():
+            now = time.perf_counter() - start
+            if first_byte is None:
+                first_byte = now
+            if first_section is None and ('event: summary' in chunk or path.endswith('/check')):
+                first_section = now
+    return first_byte, first_section, time.perf_counter() - start
+
+
+def summarize(label, samples):
+    def p50(values):
+        values = sorted(values)
+        return values[len(values) // 2] * 1000
+    print(f"{label:<8} ttfb p50={p50([s[0] for s in samples]):8.1f}ms  "
+          f"first section p50={p50([s[1] for s in samples]):8.1f}ms  "
+          f"total p50={p50([s[2] for s in samples]):8.1f}ms")
+
+
+async def main(args):
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        resp = await client.post('/api/auth/register',
+                                 json={'email': email, 'password': 'bench-password', 'age_confirmed': True})
+        resp.raise_for_status()
+        headers = {'Authorization': f"Bearer {resp.json()['token']}"}
+
+        results = {'json': [], 'sse': []}
+        for i in range(args.requests):
+            # A distinct symptom set per request keeps the response cache out of the comparison
+            body = {'symptoms': ['headache', 'runny nose', f"bench-{uuid.uuid4().hex[:6]}"]}
+            results['json'].append(await timed(client, 'POST', '/api/symptoms/check', headers, body))
+            body = {'symptoms': ['headache', 'runny nose', f"bench-{uuid.uuid4().hex[:6]}"]}
+            results['sse'].append(await timed(client, 'POST', '/api/symptoms/check/stream', headers, body))
+
+    summarize('json', results['json'])
+    summarize('sse', results['sse'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:8001')
+    parser.add_argument('--requests', type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
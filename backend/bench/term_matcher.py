@@ -0,0 +1,77 @@
+"""Per-request cost of safety term scanning as the term list grows.
+
+Compares the compiled TermMatcher with the substring scan it replaced, on
+symptom-sized and LLM-response-sized texts, for lists up to 10k terms.
+    python bench/term_matcher.py --sizes 10 100 1000 10000
+"""
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from term_matcher import TermMatcher  # noqa: E402
+
+VOCABULARY = ('pain headache fever cough nausea rest fluids consider pharmacist may help associated '
+              'with could be linked to symptoms mild moderate sleep hydration stomach throat').split()
+
+
+def make_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+
+def make_terms(count, rng):
+    terms = []
+    for _ in range(count):
+        words = [make_word(rng) for _ in range(rng.choice([1, 1, 2, 3]))]
+        terms.append(' '.join(words) + ('*' if rng.random() < 0.1 else ''))
+    return terms
+
+
+def make_text(words, rng):
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def substring_scan(terms):
+    plain = [term.rstrip('*') for term in terms]
+
+    def scan(text):
+        lowered = text.lower()
+        return any(term in lowered for term in plain)
+    return scan
+
+
+def time_per_call(fn, texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    texts = {label: [make_text(words, rng) for _ in range(50)]
+             for label, words in (('symptoms', 12), ('response', 250))}
+    print(f"{'terms':>7} {'text':>9} {'build ms':>9} {'matcher us':>11} {'substring us':>13}")
+    for size in args.sizes:
+        terms = make_terms(size, rng)
+        start = time.perf_counter()
+        matcher = TermMatcher(terms)
+        build_ms = (time.perf_counter() - start) * 1000
+        scan = substring_scan(terms)
+        for label, samples in texts.items():
+            compiled = time_per_call(matcher.search, samples, args.repeat)
+            naive = time_per_call(scan, samples, max(1, args.repeat // 10))
+            print(f"{size:>7} {label:>9} {build_ms:>9.1f} {compiled:>11.1f} {naive:>13.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,70 @@
+"""Local stand-in for LlmChat with injectable latency and failures.
+
+Selected with LLM_PROVIDER=fake; tune with FAKE_LLM_LATENCY_MS,
+FAKE_LLM_JITTER_MS and FAKE_LLM_FAILURE_RATE.
+"""
+import asyncio
+import os
+import random
+from typing import AsyncIterator
+
+FAKE_LLM_LATENCY_MS = float(os.environ.get('FAKE_LLM_LATENCY_MS', '800'))
+FAKE_LLM_JITTER_MS = float(os.environ.get('FAKE_LLM_JITTER_MS', '200'))
+FAKE_LLM_FAILURE_RATE = float(os.environ.get('FAKE_LLM_FAILURE_RATE', '0'))
+
+FAKE_RESPONSE = """{
+  "summary": "These symptoms are commonly reported together and may be associated with a mild, self-limiting illness. Rest and hydration often help, but symptoms that persist deserve attention.",
+  "possible_associations": [
+    "Common cold",
+    "Seasonal allergies",
+    "Mild viral infection"
+  ],
+  "risk_level": "Low",
+  "next_steps": [
+    "Rest and stay hydrated",
+    "Consider speaking with a pharmacist about over-the-counter options",
+    "See a doctor if symptoms last more than a few days"
+  ]
+}"""
+
+
+class FakeLlmError(Exception):
+    pass
+
+
+class FakeUserMessage:
+    """Stands in for the SDK's UserMessage, so the fake provider runs without the SDK installed"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeLlmChat:
+    def __init__(self, api_key=None, session_id=None, system_message=None, latency_ms=None,
+                 jitter_ms=None, failure_rate=None, response=FAKE_RESPONSE):
+        self.system_message = system_message
+        self.latency_ms = FAKE_LLM_LATENCY_MS if latency_ms is None else latency_ms
+        self.jitter_ms = FAKE_LLM_JITTER_MS if jitter_ms is None else jitter_ms
+        self.failure_rate = FAKE_LLM_FAILURE_RATE if failure_rate is None else failure_rate
+        self.response = response
+
+    def with_model(self, provider, model):
+        return self
+
+    async def send_message(self, message) -> str:
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms))
+        await asyncio.sleep(delay / 1000)
+        if random.random() < self.failure_rate:
+            raise FakeLlmError("Injected upstream failure")
+        return self.response
+
+    async def stream_message(self, message) -> AsyncIterator[str]:
+        """Yield the response line by line, spreading the latency across lines"""
+        lines = self.response.splitlines(keepends=True)
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms))
+        fail_at = random.randrange(len(lines)) if random.random() < self.failure_rate else None
+        for i, line in enumerate(lines):
+            await asyncio.sleep(delay / len(lines) / 1000)
+            if i == fail_at:
+                raise FakeLlmError("Injected upstream failure")
+            yield line
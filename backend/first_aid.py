@@ -0,0 +1,123 @@
+"""First-aid content served from an immutable in-memory snapshot.
+
+Topics and steps are read once into pre-serialized response bodies keyed by
+a content hash, which doubles as the ETag. Writers bump a version counter
+in ``content_versions``; workers poll it and rebuild the snapshot when it moves.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from fastapi import Request, Response
+from pymongo import ReturnDocument
+
+from serialization import dumps, json_response
+
+FIRST_AID_VERSION_CHECK_SECONDS = float(os.environ.get('FIRST_AID_VERSION_CHECK_SECONDS', '30'))
+FIRST_AID_MAX_AGE_SECONDS = int(os.environ.get('FIRST_AID_MAX_AGE_SECONDS', '300'))
+
+VERSION_COLLECTION = 'content_versions'
+VERSION_KEY = 'first_aid'
+FIRST_AID_CATALOGS = ('first_aid_topics', 'first_aid_steps')
+
+DEFAULT_FIRST_AID_STEPS = [
+    {'step_order': 1, 'instruction': 'Assess the situation and ensure safety for yourself and the person.'},
+    {'step_order': 2, 'instruction': 'Call emergency services if the situation is severe.'},
+    {'step_order': 3, 'instruction': 'Follow specific first aid procedures for this condition.'},
+]
+EMERGENCY_NOTE = 'If condition worsens or you\'re unsure, seek professional medical help immediately.'
+TOPIC_FIELDS = ('id', 'title', 'description', 'icon')
+
+
+class FirstAidSnapshot(NamedTuple):
+    version: int
+    etag: str
+    topics: bytes
+    details: Dict[str, bytes]
+    bundle: bytes
+
+
+def build_snapshot(topics: List[dict], steps: List[dict], version: int = 0) -> FirstAidSnapshot:
+    steps_by_topic: Dict[str, List[dict]] = {}
+    for step in sorted(steps, key=lambda s: s['step_order']):
+        steps_by_topic.setdefault(step['topic_id'], []).append(
+            {'step_order': step['step_order'], 'instruction': step['instruction']})
+    topic_list = [{field: topic[field] for field in TOPIC_FIELDS} for topic in topics]
+    details = {
+        topic['id']: {
+            'id': topic['id'],
+            'title': topic['title'],
+            'description': topic['description'],
+            'steps': steps_by_topic.get(topic['id']) or DEFAULT_FIRST_AID_STEPS,
+            'emergency_note': EMERGENCY_NOTE,
+        }
+        for topic in topics
+    }
+    content = dumps({'topics': topic_list, 'details': details})
+    etag = '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+    return FirstAidSnapshot(
+        version=version,
+        etag=etag,
+        topics=dumps(topic_list),
+        details={topic_id: dumps(detail) for topic_id, detail in details.items()},
+        bundle=dumps({'etag': etag.strip('"'), 'topics': topic_list, 'details': details}),
+    )
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match
+    return any(tag.strip().replace('W/', '', 1) == etag for tag in if_none_match.split(','))
+
+
+def cached_response(request: Request, body: bytes, etag: str) -> Response:
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age={FIRST_AID_MAX_AGE_SECONDS}'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return json_response(body, headers)
+
+
+async def bump_version(db) -> int:
+    """Record a first-aid content change so every worker reloads its snapshot"""
+    doc = await db[VERSION_COLLECTION].find_one_and_update(
+        {'_id': VERSION_KEY}, {'$inc': {'version': 1}}, upsert=True, return_document=ReturnDocument.AFTER)
+    return doc['version']
+
+
+class FirstAidContent:
+    def __init__(self, check_seconds: float = FIRST_AID_VERSION_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self.snapshot: Optional[FirstAidSnapshot] = None
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._checked_at = None
+
+    @property
+    def needs_check(self) -> bool:
+        return (self.snapshot is None or self._checked_at is None
+                or time.monotonic() - self._checked_at > self.check_seconds)
+
+    async def ensure_fresh(self, db) -> FirstAidSnapshot:
+        if not self.needs_check:
+            return self.snapshot
+        async with self._lock:
+            if self.needs_check:
+                doc = await db[VERSION_COLLECTION].find_one({'_id': VERSION_KEY})
+                version = doc['version'] if doc else 0
+                # An explicit invalidate() rebuilds even if the counter did not move
+                if self.snapshot is None or self._checked_at is None or version != self.snapshot.version:
+                    topics = await db.first_aid_topics.find({}, {'_id': 0}).to_list(None)
+                    steps = await db.first_aid_steps.find({}, {'_id': 0}).to_list(None)
+                    self.snapshot = build_snapshot(topics, steps, version)
+                self._checked_at = time.monotonic()
+        return self.snapshot
+
+
+first_aid_content = FirstAidContent()
@@ -0,0 +1,231 @@
+"""Proximity search for pharmacies and doctors.
+
+Providers store a GeoJSON ``location`` point (2dsphere indexed) and,
+optionally, ``opening_hours`` as UTC minute-of-week intervals
+(``[{'start': 0..10080, 'end': ...}]``, Monday 00:00 UTC = 0) so "open now"
+is a plain indexed-collection filter. ``GEO_BACKEND=memory`` serves the same
+queries from an in-process grid index instead of ``$geoNear``.
+"""
+import asyncio
+import math
+import os
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+GEO_BACKEND = os.environ.get('GEO_BACKEND', 'mongo')
+GEO_DEFAULT_RADIUS_KM = float(os.environ.get('GEO_DEFAULT_RADIUS_KM', '10'))
+GEO_MAX_RADIUS_KM = float(os.environ.get('GEO_MAX_RADIUS_KM', '100'))
+GEO_MAX_PAGE_SIZE = 50
+GEO_GRID_CELL_DEGREES = float(os.environ.get('GEO_GRID_CELL_DEGREES', '0.05'))
+GEO_INDEX_REFRESH_SECONDS = int(os.environ.get('GEO_INDEX_REFRESH_SECONDS', '300'))
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+PROVIDER_PROJECTION = {'_id': 0, 'location': 0, 'opening_hours': 0}
+CANDIDATE_PROJECTION = {'_id': 0, 'location': 0}
+
+
+def location_point(lat: float, lng: float) -> dict:
+    return {'type': 'Point', 'coordinates': [lng, lat]}
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def minute_of_week(now: Optional[datetime] = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    return now.weekday() * 24 * 60 + now.hour * 60 + now.minute
+
+
+def is_open(provider: dict, minute: int) -> bool:
+    for span in provider.get('opening_hours', ()):
+        if span['start'] <= minute < span['end']:
+            return True
+    return False
+
+
+def provider_filter(open_now: bool = False, specialty: Optional[str] = None,
+                    now: Optional[datetime] = None) -> dict:
+    query = {}
+    if open_now:
+        minute = minute_of_week(now)
+        query['opening_hours'] = {'$elemMatch': {'start': {'$lte': minute}, 'end': {'$gt': minute}}}
+    if specialty:
+        query['specialty'] = {'$regex': '^' + re.escape(specialty.strip()) + '$', '$options': 'i'}
+    return query
+
+
+def clamp_page(radius_km: float, limit: int, offset: int) -> Tuple[float, int, int]:
+    return (min(max(radius_km, 0.1), GEO_MAX_RADIUS_KM),
+            max(1, min(limit, GEO_MAX_PAGE_SIZE)),
+            max(0, offset))
+
+
+async def near_providers(collection, lat: float, lng: float, radius_km: float, limit: int,
+                         offset: int = 0, query: Optional[dict] = None,
+                         projection: dict = PROVIDER_PROJECTION) -> List[dict]:
+    """Nearest providers within radius via $geoNear; distance in km"""
+    pipeline = [
+        {'$geoNear': {
+            'near': location_point(lat, lng),
+            'distanceField': 'distance',
+            'maxDistance': radius_km * 1000,
+            'spherical': True,
+            'query': query or {},
+        }},
+        {'$skip': offset},
+        {'$limit': limit},
+        {'$project': projection},
+    ]
+    providers = await collection.aggregate(pipeline).to_list(limit)
+    for provider in providers:
+        provider['distance'] = round(provider['distance'] / 1000, 3)
+    return providers
+
+
+async def backfill_locations(collection, batch_size: int = 1000) -> int:
+    """Add GeoJSON points to providers that only have latitude/longitude"""
+    updated = 0
+    batch = []
+    cursor = collection.find({'location': {'$exists': False}}, {'_id': 1, 'latitude': 1, 'longitude': 1})
+    async for provider in cursor:
+        if 'latitude' not in provider or 'longitude' not in provider:
+            continue
+        batch.append(UpdateOne({'_id': provider['_id']},
+                               {'$set': {'location': location_point(provider['latitude'], provider['longitude'])}}))
+        if len(batch) >= batch_size:
+            await collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+
+class GeoGridIndex:
+    """Fixed-degree grid of providers searched in expanding rings.
+
+    A cell in ring ``r`` around the query cell is at least ``r - 1`` cell
+    widths from the query, which can sit on the edge of its own cell. The
+    search stops before a ring once enough matches are closer than that
+    bound, or the bound passes the radius.
+    """
+
+    def __init__(self, cell_degrees: float = GEO_GRID_CELL_DEGREES,
+                 refresh_seconds: int = GEO_INDEX_REFRESH_SECONDS):
+        self.cell = cell_degrees
+        self.refresh_seconds = refresh_seconds
+        self._lng_cells = int(round(360 / cell_degrees))
+        self._grid: Dict[Tuple[int, int], List[Tuple[float, float, dict]]] = {}
+        # Same entries bucketed by (cell, lowercase specialty) for filtered lookups
+        self._by_specialty: Dict[tuple, List[Tuple[float, float, dict]]] = {}
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        self._lock = asyncio.Lock()
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell)), int(math.floor((lng + 180) / self.cell)) % self._lng_cells
+
+    def build(self, providers: Iterable[dict]):
+        grid = defaultdict(list)
+        by_specialty = defaultdict(list)
+        for provider in providers:
+            lat, lng = provider['latitude'], provider['longitude']
+            doc = {k: v for k, v in provider.items() if k not in ('_id', 'location')}
+            cell = self._cell(lat, lng)
+            grid[cell].append((lat, lng, doc))
+            if doc.get('specialty'):
+                by_specialty[cell, doc['specialty'].lower()].append((lat, lng, doc))
+        self._grid = dict(grid)
+        self._by_specialty = dict(by_specialty)
+        self._loaded_at = time.monotonic()
+        self._stale = False
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._grid.values())
+
+    def invalidate(self):
+        self._stale = True
+
+    @property
+    def needs_refresh(self) -> bool:
+        return (self._stale or self._loaded_at is None
+                or time.monotonic() - self._loaded_at > self.refresh_seconds)
+
+    async def ensure_fresh(self, collection):
+        if not self.needs_refresh:
+            return
+        async with self._lock:
+            if self.needs_refresh:
+                self.build(await collection.find({}, {'_id': 0, 'location': 0}).to_list(None))
+
+    def _ring(self, row: int, col: int, r: int) -> Iterable[Tuple[int, int]]:
+        if r == 0:
+            yield row, col
+            return
+        for dc in range(-r, r + 1):
+            yield row - r, (col + dc) % self._lng_cells
+            yield row + r, (col + dc) % self._lng_cells
+        for dr in range(-r + 1, r):
+            yield row + dr, (col - r) % self._lng_cells
+            yield row + dr, (col + r) % self._lng_cells
+
+    def nearest(self, lat: float, lng: float, radius_km: float, limit: int, offset: int = 0,
+                open_now: bool = False, specialty: Optional[str] = None,
+                now: Optional[datetime] = None) -> List[dict]:
+        """In-memory equivalent of near_providers with provider_filter"""
+        wanted = offset + limit
+        minute = minute_of_week(now) if open_now else None
+        if specialty:
+            wanted_specialty = specialty.strip().lower()
+            buckets = self._by_specialty
+
+            def bucket(cell):
+                return buckets.get((cell, wanted_specialty), ())
+        else:
+            def bucket(cell):
+                return self._grid.get(cell, ())
+        row, col = self._cell(lat, lng)
+        found: List[Tuple[float, dict]] = []
+        lat_radius = radius_km / KM_PER_DEGREE
+        for r in range(self._lng_cells // 2 + 1):
+            # Lower bound on the distance to anything in ring r or beyond: at least r - 1 cells
+            # apart in latitude or in longitude. By the haversine formula a longitude gap g at
+            # latitudes up to max_lat is at least 2R asin(cos(max_lat) sin(g / 2)) away.
+            gap = math.radians(max(r - 1, 0) * self.cell)
+            max_lat = min(89.9, abs(lat) + (r + 1) * self.cell)
+            bound = 2 * EARTH_RADIUS_KM * math.asin(math.cos(math.radians(max_lat)) * math.sin(gap / 2))
+            if r and len(found) >= wanted and found[wanted - 1][0] <= bound:
+                break
+            if bound > radius_km:
+                break
+            for cell in self._ring(row, col, r):
+                for plat, plng, doc in bucket(cell):
+                    # Cheap rejections before the trigonometry
+                    if abs(plat - lat) > lat_radius or (minute is not None and not is_open(doc, minute)):
+                        continue
+                    distance = haversine_km(lat, lng, plat, plng)
+                    if distance <= radius_km:
+                        found.append((distance, doc))
+            found.sort(key=lambda item: item[0])
+        results = []
+        for distance, doc in found[offset:wanted]:
+            provider = {k: v for k, v in doc.items() if k != 'opening_hours'}
+            provider['distance'] = round(distance, 3)
+            results.append(provider)
+        return results
+
+
+pharmacy_grid = GeoGridIndex()
+doctor_grid = GeoGridIndex()
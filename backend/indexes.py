@@ -0,0 +1,139 @@
+"""Declarative index management.
+
+Indexes are declared per collection as ``pymongo.IndexModel`` lists next to
+the models in ``server.py`` and applied idempotently at startup, or from the
+command line:
+
+    python indexes.py ensure
+    python indexes.py report
+"""
+import argparse
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+AUDIT_RETENTION_DAYS = os.environ.get('AUDIT_RETENTION_DAYS')
+SYMPTOM_CHECK_RETENTION_DAYS = os.environ.get('SYMPTOM_CHECK_RETENTION_DAYS')
+
+INDEX_OPTIONS_CONFLICT = 85
+
+
+def ttl_index(field: str, days: Optional[str], name: str) -> List[IndexModel]:
+    """A TTL index on a BSON date field, or nothing when retention is unset"""
+    if not days:
+        return []
+    return [IndexModel([(field, ASCENDING)], name=name, expireAfterSeconds=int(float(days) * 86400))]
+
+
+async def _update_ttl(db, collection: str, index: IndexModel):
+    document = index.document
+    await db.command('collMod', collection, index={
+        'name': document['name'],
+        'expireAfterSeconds': document['expireAfterSeconds'],
+    })
+
+
+async def _make_unique(db, collection: str, index: IndexModel) -> bool:
+    """Replace a non-unique index on the declared keys with the unique one"""
+    keys = list(index.document['key'].items())
+    async for existing in db[collection].list_indexes():
+        if list(existing['key'].items()) == keys and not existing.get('unique'):
+            break
+    else:
+        return False
+    await db[collection].drop_index(existing['name'])
+    try:
+        await db[collection].create_indexes([index])
+    except OperationFailure:
+        # Usually existing duplicates; put the old index back so queries stay indexed
+        await db[collection].create_indexes([IndexModel(keys, name=existing['name'])])
+        raise
+    return True
+
+
+async def ensure_indexes(db, declared: Dict[str, List[IndexModel]]) -> Dict[str, List[str]]:
+    """Create every declared index; existing ones are left untouched.
+
+    The exceptions are TTL changes, which are applied in place, and a
+    non-unique index on keys now declared unique, which is rebuilt as unique.
+    """
+    created = {}
+    for collection, indexes in declared.items():
+        names = []
+        for index in indexes:
+            document = dict(index.document)
+            try:
+                names.extend(await db[collection].create_indexes([index]))
+            except OperationFailure as e:
+                if e.code == INDEX_OPTIONS_CONFLICT and 'expireAfterSeconds' in document:
+                    await _update_ttl(db, collection, index)
+                    names.append(document['name'])
+                elif e.code == INDEX_OPTIONS_CONFLICT and document.get('unique'):
+                    try:
+                        if not await _make_unique(db, collection, index):
+                            raise e
+                    except OperationFailure as conflict:
+                        logger.error(f"Index {collection}.{document['name']} not made unique: {conflict}")
+                        continue
+                    logger.info(f"Index {collection}.{document['name']} rebuilt as unique")
+                    names.append(document['name'])
+                else:
+                    # e.g. a unique index over existing duplicates; keep going
+                    logger.error(f"Index {collection}.{document['name']} not created: {e}")
+        created[collection] = names
+    return created
+
+
+async def index_report(db, declared: Dict[str, List[IndexModel]]) -> Dict[str, dict]:
+    """Declared indexes that are missing, present ones that are undeclared or unused"""
+    report = {}
+    for collection, indexes in declared.items():
+        wanted = {index.document['name'] for index in indexes}
+        existing = set()
+        async for index in db[collection].list_indexes():
+            existing.add(index['name'])
+        existing.discard('_id_')
+        unused = []
+        try:
+            async for stat in db[collection].aggregate([{'$indexStats': {}}]):
+                if stat['name'] != '_id_' and stat['accesses']['ops'] == 0:
+                    unused.append(stat['name'])
+        except OperationFailure:
+            pass
+        report[collection] = {
+            'missing': sorted(wanted - existing),
+            'undeclared': sorted(existing - wanted),
+            'unused': sorted(unused),
+        }
+    return report
+
+
+async def _main(command: str):
+    # Deferred so the server's env loading and declarations are reused
+    from server import COLLECTION_INDEXES, mongo
+
+    mongo.connect()
+    db = mongo.database
+
+    try:
+        if command == 'ensure':
+            for collection, names in (await ensure_indexes(db, COLLECTION_INDEXES)).items():
+                print(f"{collection}: {', '.join(names) or '-'}")
+        else:
+            for collection, entry in (await index_report(db, COLLECTION_INDEXES)).items():
+                print(f"{collection}: missing={entry['missing']} undeclared={entry['undeclared']} "
+                      f"unused={entry['unused']}")
+    finally:
+        mongo.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage MongoDB indexes')
+    parser.add_argument('command', choices=['ensure', 'report'])
+    asyncio.run(_main(parser.parse_args().command))
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+from pymongo import ASCENDING, IndexModel
+
+from llm_client import LlmUnavailableError
+
+SYMPTOM_CACHE_SIZE = int(os.environ.get('SYMPTOM_CACHE_SIZE', '5000'))
+SYMPTOM_CACHE_TTL_SECONDS = int(os.environ.get('SYMPTOM_CACHE_TTL_SECONDS', '3600'))
+SYMPTOM_CACHE_MONGO = os.environ.get('SYMPTOM_CACHE_MONGO', 'false').lower() == 'true'
+SYMPTOM_CACHE_MONGO_TTL_SECONDS = int(os.environ.get('SYMPTOM_CACHE_MONGO_TTL_SECONDS', str(24 * 3600)))
+SYMPTOM_CACHE_COLLECTION = 'symptom_analysis_cache'
+
+logger = logging.getLogger(__name__)
+
+SYMPTOM_CACHE_INDEXES = [
+    IndexModel([('created_at', ASCENDING)], name='created_at_ttl',
+               expireAfterSeconds=SYMPTOM_CACHE_MONGO_TTL_SECONDS),
+]
+
+
+def normalize_symptoms(symptoms: List[str]) -> Tuple[str, ...]:
+    """Lowercased, trimmed, deduplicated and sorted symptom set"""
+    return tuple(sorted({' '.join(s.lower().split()) for s in symptoms} - {''}))
+
+
+def cache_key(symptoms: Tuple[str, ...]) -> str:
+    return hashlib.sha256('\n'.join(symptoms).encode('utf-8')).hexdigest()
+
+
+class SymptomResponseCache:
+    """Two-tier cache of raw LLM responses with in-flight coalescing.
+
+    Raw responses are stored rather than parsed results so callers can re-run
+    parsing and compliance checks on every hit.
+    """
+
+    def __init__(self, maxsize: int = SYMPTOM_CACHE_SIZE, ttl: int = SYMPTOM_CACHE_TTL_SECONDS,
+                 collection=None, collection_ttl: int = SYMPTOM_CACHE_MONGO_TTL_SECONDS):
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._collection = collection
+        self._collection_ttl = collection_ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def use_collection(self, collection):
+        self._collection = collection
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self.memory_hits += 1
+            self.saved_seconds += entry[1]
+            return entry[0]
+        if self._collection is not None:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=self._collection_ttl)
+            try:
+                doc = await self._collection.find_one({'_id': key, 'created_at': {'$gt': cutoff}})
+            except Exception as e:
+                logger.warning(f"Symptom cache read failed: {e}")
+                doc = None
+            if doc:
+                self._memory[key] = (doc['response'], doc['latency'])
+                self.mongo_hits += 1
+                self.saved_seconds += doc['latency']
+                return doc['response']
+        return None
+
+    async def set(self, key: str, response: str, latency: float):
+        self._memory[key] = (response, latency)
+        if self._collection is not None:
+            try:
+                await self._collection.replace_one(
+                    {'_id': key},
+                    {'response': response, 'latency': latency, 'created_at': datetime.now(timezone.utc)},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"Symptom cache write failed: {e}")
+
+    async def invalidate(self, key: str):
+        self._memory.pop(key, None)
+        if self._collection is not None:
+            try:
+                await self._collection.delete_one({'_id': key})
+            except Exception as e:
+                logger.warning(f"Symptom cache delete failed: {e}")
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        if key in self._inflight:
+            self.coalesced += 1
+            return await asyncio.shield(self._inflight[key])
+        # Registered before any await so concurrent callers coalesce onto it
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self.get(key)
+            if response is None:
+                self.misses += 1
+                start = time.perf_counter()
+                response = await compute()
+                await self.set(key, response, time.perf_counter() - start)
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            # Only the leader was cancelled; waiters get an error they serve a fallback for
+            future.set_exception(LlmUnavailableError("Coalesced analysis was cancelled"))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an error with no waiters isn't logged as unhandled
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.mongo_hits + self.coalesced
+        total = hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'mongo_hits': self.mongo_hits,
+            'coalesced': self.coalesced,
+            'misses': self.misses,
+            'hit_rate': hits / total if total else 0.0,
+            'saved_latency_seconds': round(self.saved_seconds, 3),
+        }
+
+
+symptom_cache = SymptomResponseCache()
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Callable
+
+from metrics import LLM_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '16'))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('LLM_QUEUE_TIMEOUT_SECONDS', '2'))
+LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', '30'))
+LLM_RETRIES = int(os.environ.get('LLM_RETRIES', '2'))
+LLM_BACKOFF_BASE_SECONDS = float(os.environ.get('LLM_BACKOFF_BASE_SECONDS', '0.5'))
+LLM_BACKOFF_MAX_SECONDS = float(os.environ.get('LLM_BACKOFF_MAX_SECONDS', '4'))
+LLM_BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get('LLM_BREAKER_RESET_SECONDS', '30'))
+
+
+class LlmUnavailableError(Exception):
+    """The call was not attempted or gave up; callers should serve a fallback"""
+
+
+class CircuitOpenError(LlmUnavailableError):
+    pass
+
+
+class ConcurrencyLimitError(LlmUnavailableError):
+    pass
+
+
+def _outcome(error: BaseException) -> str:
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    if isinstance(error, ConcurrencyLimitError):
+        return 'queue_timeout'
+    if isinstance(error, asyncio.TimeoutError):
+        return 'timeout'
+    return 'error'
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES,
+                 reset_timeout: float = LLM_BREAKER_RESET_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        now = self._clock()
+        if now - self._opened_at >= self.reset_timeout:
+            # Let one request through to probe the provider; a probe that never
+            # reports back is retried after another reset_timeout
+            self.state = self.HALF_OPEN
+            self._opened_at = now
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"LLM circuit opened after {self.failures} failures")
+            self.state = self.OPEN
+            self._opened_at = self._clock()
+
+
+class LlmClient:
+    """Concurrency cap, deadlines, retries and circuit breaking around LlmChat.
+
+    ``chat_factory`` returns a fresh chat object exposing ``send_message``;
+    in production that is a configured ``LlmChat``, in tests a ``FakeLlmChat``.
+    """
+
+    def __init__(self, chat_factory: Callable[[], Any], max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS, timeout: float = LLM_TIMEOUT_SECONDS,
+                 retries: int = LLM_RETRIES, backoff_base: float = LLM_BACKOFF_BASE_SECONDS,
+                 backoff_max: float = LLM_BACKOFF_MAX_SECONDS, breaker: CircuitBreaker = None):
+        self.chat_factory = chat_factory
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retries from synchronizing across requests
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _attempt(self, message) -> str:
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise ConcurrencyLimitError("LLM concurrency limit reached")
+        try:
+            chat = self.chat_factory()
+            return await asyncio.wait_for(chat.send_message(message), timeout=self.timeout)
+        finally:
+            self._semaphore.release()
+
+    async def send_message(self, message) -> str:
+        start = time.perf_counter()
+        outcome = 'ok'
+        try:
+            return await self._send_message(message)
+        except asyncio.CancelledError:
+            outcome = 'abandoned'
+            raise
+        except Exception as e:
+            outcome = _outcome(e)
+            raise
+        finally:
+            LLM_REQUEST_SECONDS.labels('send', outcome).observe(time.perf_counter() - start)
+
+    async def _send_message(self, message) -> str:
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM circuit open")
+            try:
+                response = await self._attempt(message)
+            except LlmUnavailableError:
+                raise
+            except Exception as e:
+                last_error = e
+                self.breaker.record_failure()
+                if attempt < self.retries:
+                    await asyncio.sleep(self._backoff(attempt))
+                continue
+            self.breaker.record_success()
+            return response
+        raise LlmUnavailableError(f"LLM call failed after {self.retries + 1} attempts: {last_error!r}")
+
+    async def stream_message(self, message) -> AsyncIterator[str]:
+        """Yield response chunks under the same cap, deadline and breaker.
+
+        Chats without ``stream_message`` yield their full response as one
+        chunk. Streams are not retried since chunks may already be consumed.
+        """
+        start = time.perf_counter()
+        outcome = 'ok'
+        try:
+            async for chunk in self._stream_message(message):
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            # Client disconnected or the request was cancelled mid-stream
+            outcome = 'abandoned'
+            raise
+        except Exception as e:
+            outcome = _outcome(e)
+            raise
+        finally:
+            LLM_REQUEST_SECONDS.labels('stream', outcome).observe(time.perf_counter() - start)
+
+    async def _stream_message(self, message) -> AsyncIterator[str]:
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM circuit open")
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise ConcurrencyLimitError("LLM concurrency limit reached")
+        try:
+            chat = self.chat_factory()
+            if not hasattr(chat, 'stream_message'):
+                response = await asyncio.wait_for(chat.send_message(message), timeout=self.timeout)
+                self.breaker.record_success()
+                yield response
+                return
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.timeout
+            chunks = chat.stream_message(message).__aiter__()
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+            self.breaker.record_success()
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            self._semaphore.release()
@@ -0,0 +1,200 @@
+"""Bulk import of reference catalogs from CSV or JSONL.
+
+Each catalog upserts on a natural key, so re-running an import updates
+records in place instead of duplicating them. Records without an ``id``
+get a deterministic one derived from their natural fields for the same
+reason. Files are streamed and written in ``bulk_write`` batches.
+
+A running server picks up CLI imports as its in-memory indexes and caches
+refresh; the startup loader invalidates them directly.
+
+    python loader.py medicines formulary.csv
+    python loader.py --dir data
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from first_aid import FIRST_AID_CATALOGS, bump_version
+from geo import location_point
+from medicine_detail import DETAIL_COLLECTIONS
+from search import normalize_name, search_fields
+
+CATALOG_DIR = os.environ.get('CATALOG_DIR', str(Path(__file__).parent / 'data'))
+# off | missing (only catalogs whose collection is empty) | always
+CATALOG_LOAD = os.environ.get('CATALOG_LOAD', 'missing')
+CATALOG_BATCH_SIZE = int(os.environ.get('CATALOG_BATCH_SIZE', '1000'))
+
+DUPLICATE_KEY = 11000
+ID_NAMESPACE = uuid.UUID('6f0c5c43-5d0e-4b8e-9a53-0f3b0c8a7e21')
+
+
+def _derived_id(catalog: str, *parts) -> str:
+    return str(uuid.uuid5(ID_NAMESPACE, '|'.join([catalog, *(normalize_name(str(p or '')) for p in parts)])))
+
+
+def _prepare_medicine(record: dict) -> dict:
+    record.setdefault('id', _derived_id('medicines', record.get('brand_name'), record['generic_name']))
+    record.update(search_fields(record))
+    return record
+
+
+def _prepare_topic(record: dict) -> dict:
+    record.setdefault('id', _derived_id('first_aid_topics', record['title']))
+    return record
+
+
+def _prepare_step(record: dict) -> dict:
+    record.setdefault('id', _derived_id('first_aid_steps', record['topic_id'], record['step_order']))
+    return record
+
+
+def _prepare_provider(catalog: str) -> Callable[[dict], dict]:
+    def prepare(record: dict) -> dict:
+        record.setdefault('id', _derived_id(catalog, record['name'], record.get('address')))
+        record['location'] = location_point(record['latitude'], record['longitude'])
+        return record
+    return prepare
+
+
+class Catalog(NamedTuple):
+    key: Tuple[str, ...]
+    prepare: Optional[Callable[[dict], dict]] = None
+    # CSV columns that need converting from text
+    types: Dict[str, Callable] = {}
+
+
+CATALOGS: Dict[str, Catalog] = {
+    'medicines': Catalog(('id',), _prepare_medicine),
+    'first_aid_topics': Catalog(('id',), _prepare_topic),
+    'first_aid_steps': Catalog(('topic_id', 'step_order'), _prepare_step, {'step_order': int}),
+    'pharmacies': Catalog(('id',), _prepare_provider('pharmacies'),
+                          {'latitude': float, 'longitude': float, 'opening_hours': json.loads}),
+    'doctors': Catalog(('id',), _prepare_provider('doctors'),
+                       {'latitude': float, 'longitude': float, 'opening_hours': json.loads}),
+    **{
+        collection: Catalog(('medicine_id', item_field))
+        for collection, (_, item_field, _) in DETAIL_COLLECTIONS.items()
+    },
+}
+
+
+def read_records(path: Path, types: Optional[Dict[str, Callable]] = None) -> Iterator[dict]:
+    """Stream records from a .csv or .jsonl file; empty CSV cells are dropped"""
+    types = types or {}
+    with path.open(encoding='utf-8', newline='') as source:
+        if path.suffix == '.csv':
+            for row in csv.DictReader(source):
+                yield {k: types.get(k, str)(v) for k, v in row.items() if k and v not in (None, '')}
+        elif path.suffix in ('.jsonl', '.ndjson'):
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unsupported catalog format: {path.name}")
+
+
+async def _upsert(collection, operations: List[UpdateOne]) -> Tuple[int, int]:
+    # Concurrent upserts of a new key can race on the unique index; the retry matches the winner
+    for attempt in range(2):
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            return result.upserted_count, result.modified_count
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if attempt or any(error['code'] != DUPLICATE_KEY for error in errors):
+                raise
+
+
+async def load_catalog(db, catalog: str, path: Path, batch_size: int = CATALOG_BATCH_SIZE) -> dict:
+    """Upsert every record in ``path`` into ``catalog``"""
+    spec = CATALOGS[catalog]
+    collection = db[catalog]
+    counts = {'read': 0, 'inserted': 0, 'updated': 0}
+    batch = []
+    for record in read_records(path, spec.types):
+        if spec.prepare is not None:
+            record = spec.prepare(record)
+        batch.append(UpdateOne({k: record[k] for k in spec.key}, {'$set': record}, upsert=True))
+        counts['read'] += 1
+        if len(batch) >= batch_size:
+            inserted, updated = await _upsert(collection, batch)
+            counts['inserted'] += inserted
+            counts['updated'] += updated
+            batch = []
+    if batch:
+        inserted, updated = await _upsert(collection, batch)
+        counts['inserted'] += inserted
+        counts['updated'] += updated
+    if catalog in FIRST_AID_CATALOGS and (counts['inserted'] or counts['updated']):
+        await bump_version(db)
+    return counts
+
+
+def catalog_files(directory: Path) -> List[Tuple[str, Path]]:
+    """``<catalog>.csv``/``<catalog>.jsonl`` files in a directory, in CATALOGS order"""
+    files = []
+    for catalog in CATALOGS:
+        for suffix in ('.csv', '.jsonl', '.ndjson'):
+            path = directory / f"{catalog}{suffix}"
+            if path.exists():
+                files.append((catalog, path))
+    return files
+
+
+async def load_directory(db, directory: Path, only_missing: bool = False,
+                         batch_size: int = CATALOG_BATCH_SIZE) -> Dict[str, dict]:
+    files = catalog_files(directory)
+    skip = set()
+    if only_missing:
+        for catalog in {catalog for catalog, _ in files}:
+            if await db[catalog].estimated_document_count() > 0:
+                skip.add(catalog)
+    loaded = {}
+    for catalog, path in files:
+        if catalog in skip:
+            continue
+        counts = await load_catalog(db, catalog, path, batch_size)
+        if catalog in loaded:
+            counts = {k: loaded[catalog][k] + v for k, v in counts.items()}
+        loaded[catalog] = counts
+    return loaded
+
+
+async def _main(args):
+    # Deferred so the server's env loading and Mongo settings are reused
+    from server import mongo
+
+    mongo.connect()
+    db = mongo.database
+
+    try:
+        if args.dir:
+            loaded = await load_directory(db, Path(args.dir), args.missing_only, args.batch_size)
+        else:
+            loaded = {args.catalog: await load_catalog(db, args.catalog, Path(args.path), args.batch_size)}
+        for catalog, counts in loaded.items():
+            print(f"{catalog}: read={counts['read']} inserted={counts['inserted']} updated={counts['updated']}")
+    finally:
+        mongo.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import reference catalogs from CSV or JSONL')
+    parser.add_argument('catalog', nargs='?', choices=sorted(CATALOGS))
+    parser.add_argument('path', nargs='?')
+    parser.add_argument('--dir', help='load every <catalog>.csv/.jsonl file in this directory')
+    parser.add_argument('--missing-only', action='store_true', help='with --dir, skip non-empty collections')
+    parser.add_argument('--batch-size', type=int, default=CATALOG_BATCH_SIZE)
+    args = parser.parse_args()
+    if not args.dir and not (args.catalog and args.path):
+        parser.error('give a catalog and a path, or --dir')
+    asyncio.run(_main(args))
@@ -0,0 +1,128 @@
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from geo import haversine_km, is_open, minute_of_week
+from ttl_cache import CountingTTLCache
+
+LOCATOR_CACHE_PRECISION = int(os.environ.get('LOCATOR_CACHE_PRECISION', '6'))
+LOCATOR_CACHE_TTL_SECONDS = float(os.environ.get('LOCATOR_CACHE_TTL_SECONDS', '120'))
+LOCATOR_CACHE_SIZE = int(os.environ.get('LOCATOR_CACHE_SIZE', '20000'))
+LOCATOR_CACHE_CANDIDATES = int(os.environ.get('LOCATOR_CACHE_CANDIDATES', '200'))
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat: float, lng: float, precision: int = LOCATOR_CACHE_PRECISION) -> str:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """(lat_min, lat_max, lng_min, lng_max) of a geohash cell"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if bits >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+
+# fetch(lat, lng, radius_km, limit, specialty) -> providers nearest to (lat, lng),
+# including latitude/longitude and opening_hours
+CandidateFetch = Callable[[float, float, float, int, Optional[str]], Awaitable[List[dict]]]
+
+
+class LocatorCache:
+    """Per-geohash-cell candidate sets for locator queries.
+
+    A miss fetches the providers nearest the cell centre out to the requested
+    radius plus the cell's half-diagonal, which covers every point in the
+    cell. Each request then recomputes exact distances from its own
+    coordinates and applies open_now, so opening hours never go stale. When the candidate cap was hit, only
+    the part of the set known to be complete is trusted. If that is too
+    small for the requested page, the caller falls back to a direct query.
+    """
+
+    def __init__(self, maxsize: int = LOCATOR_CACHE_SIZE, ttl: float = LOCATOR_CACHE_TTL_SECONDS,
+                 precision: int = LOCATOR_CACHE_PRECISION, candidates: int = LOCATOR_CACHE_CANDIDATES):
+        self.precision = precision
+        self.candidates = candidates
+        self._cells = CountingTTLCache(maxsize, ttl)
+        self.enabled = self._cells.enabled
+        self.fallbacks = 0
+
+    async def nearby(self, kind: str, fetch: CandidateFetch, lat: float, lng: float, radius_km: float,
+                     limit: int, offset: int = 0, open_now: bool = False,
+                     specialty: Optional[str] = None) -> Optional[List[dict]]:
+        """A page of providers, or None when the caller must query directly"""
+        cell = geohash_encode(lat, lng, self.precision)
+        specialty_key = specialty.strip().lower() if specialty else None
+        key = (kind, cell, round(radius_km, 3), specialty_key)
+        entry = self._cells.get(key)
+        if entry is None:
+            lat_min, lat_max, lng_min, lng_max = geohash_bounds(cell)
+            center = ((lat_min + lat_max) / 2, (lng_min + lng_max) / 2)
+            reach = radius_km + haversine_km(center[0], center[1], lat_max, lng_max)
+            providers = await fetch(center[0], center[1], reach, self.candidates, specialty)
+            if len(providers) >= self.candidates:
+                reach = max(haversine_km(center[0], center[1], p['latitude'], p['longitude']) for p in providers)
+            entry = (center, reach, providers)
+            self._cells.set(key, entry)
+
+        center, reach, providers = entry
+        # Providers farther than this from the user may be missing from the set
+        trusted = min(radius_km, reach - haversine_km(lat, lng, center[0], center[1]))
+        minute = minute_of_week() if open_now else None
+        ranked = []
+        for provider in providers:
+            if minute is not None and not is_open(provider, minute):
+                continue
+            distance = haversine_km(lat, lng, provider['latitude'], provider['longitude'])
+            if distance <= trusted:
+                ranked.append((distance, provider))
+        if len(ranked) < offset + limit and trusted < radius_km:
+            self.fallbacks += 1
+            return None
+        ranked.sort(key=lambda item: item[0])
+        page = []
+        for distance, provider in ranked[offset:offset + limit]:
+            result = {k: v for k, v in provider.items() if k not in ('opening_hours', 'distance')}
+            result['distance'] = round(distance, 3)
+            page.append(result)
+        return page
+
+    def invalidate(self, kind: Optional[str] = None):
+        """Drop cached cells for one provider kind, or all of them"""
+        if kind is None:
+            self._cells.invalidate()
+        else:
+            self._cells.invalidate_where(lambda key: key[0] == kind)
+
+    def stats(self) -> dict:
+        return {**self._cells.stats(), 'fallbacks': self.fallbacks}
+
+
+locator_cache = LocatorCache()
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from search import SEARCH_FIELDS
+from ttl_cache import CountingTTLCache
+
+MEDICINE_CACHE_SIZE = int(os.environ.get('MEDICINE_CACHE_SIZE', '2048'))
+MEDICINE_CACHE_TTL_SECONDS = int(os.environ.get('MEDICINE_CACHE_TTL_SECONDS', '600'))
+MEDICINE_CACHE_WATCH = os.environ.get('MEDICINE_CACHE_WATCH', 'false').lower() == 'true'
+DETAIL_ITEM_LIMIT = 100
+
+logger = logging.getLogger(__name__)
+
+# collection -> (MedicineInfo field, item field, fallback when empty)
+DETAIL_COLLECTIONS = {
+    'medicine_indications': ('indications', 'indication', 'General pain relief'),
+    'medicine_contraindications': ('contraindications', 'contraindication', 'Known allergy to this medication'),
+    'medicine_interactions': ('interactions', 'interaction', 'May interact with other medications'),
+    'medicine_adverse_effects': ('adverse_effects', 'adverse_effect', 'Nausea, dizziness (rare)'),
+    'medicine_cautions': ('cautions', 'caution', 'Use as directed on package'),
+}
+DEFAULT_ADULT_DOSE = 'Refer to package instructions (reference only, not personalized)'
+
+
+def detail_pipeline(medicine_id: str) -> list:
+    pipeline = [{'$match': {'id': medicine_id}}, {'$limit': 1}]
+    for collection, (field, _, _) in DETAIL_COLLECTIONS.items():
+        pipeline.append({'$lookup': {
+            'from': collection,
+            'localField': 'id',
+            'foreignField': 'medicine_id',
+            'as': field,
+        }})
+    pipeline.append({'$addFields': {
+        field: {'$slice': ['$' + field, DETAIL_ITEM_LIMIT]} for field, _, _ in DETAIL_COLLECTIONS.values()
+    }})
+    pipeline.append({'$project': {'_id': 0, **{field: 0 for field in SEARCH_FIELDS}}})
+    return pipeline
+
+
+async def fetch_medicine_detail(db, medicine_id: str) -> Optional[dict]:
+    """Medicine plus all related detail collections in one aggregation"""
+    found = await db.medicines.aggregate(detail_pipeline(medicine_id)).to_list(1)
+    if not found:
+        return None
+    medicine = found[0]
+    for field, item_field, fallback in DETAIL_COLLECTIONS.values():
+        items = [item[item_field] for item in medicine.get(field, []) if item_field in item]
+        medicine[field] = items or [fallback]
+    medicine['standard_adult_dose'] = medicine.get('standard_adult_dose', DEFAULT_ADULT_DOSE)
+    return medicine
+
+
+class MedicineDetailCache(CountingTTLCache):
+    """TTL + LRU cache of encoded medicine detail responses keyed by medicine_id"""
+
+    def __init__(self, maxsize: int = MEDICINE_CACHE_SIZE, ttl: int = MEDICINE_CACHE_TTL_SECONDS):
+        super().__init__(maxsize, ttl)
+
+
+medicine_detail_cache = MedicineDetailCache()
+
+
+async def watch_detail_changes(db, cache: MedicineDetailCache = medicine_detail_cache):
+    """Invalidate cached details from a change stream (requires a replica set)"""
+    collections = ['medicines', *DETAIL_COLLECTIONS]
+    pipeline = [{'$match': {'ns.coll': {'$in': collections}}}]
+    async with db.watch(pipeline, full_document='updateLookup') as stream:
+        async for change in stream:
+            document = change.get('fullDocument') or {}
+            key = 'id' if change['ns']['coll'] == 'medicines' else 'medicine_id'
+            # Deletes carry no document, so the affected medicine is unknown
+            cache.invalidate(document.get(key))
+
+
+async def supervise_detail_watch(db, cache: MedicineDetailCache = medicine_detail_cache,
+                                 initial_delay: float = 1.0, max_delay: float = 60.0):
+    """Keep ``watch_detail_changes`` running, reopening the stream with backoff when it fails.
+
+    Changes made while the stream is down are never seen, so the cache is
+    cleared when it fails and again as it reopens.
+    """
+    delay = initial_delay
+    while True:
+        started = time.monotonic()
+        try:
+            await watch_detail_changes(db, cache)
+            logger.warning("Medicine detail change stream ended")
+        except Exception as e:
+            logger.error(f"Medicine detail change stream failed: {e!r}")
+        cache.invalidate()
+        # A stream that stayed up for a while starts the backoff over
+        if time.monotonic() - started > max_delay:
+            delay = initial_delay
+        logger.info(f"Reopening the medicine detail change stream in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+        cache.invalidate()
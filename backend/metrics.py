@@ -0,0 +1,484 @@
+"""Process-local metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms are plain Python objects; a labelled metric
+keeps one child per label combination, so a hot-path update is a dict
+lookup, a bisect and a few additions under a lock. Motor reports Mongo
+commands from its worker threads, which is why the updates are locked.
+``render()`` produces the payload for the scrape endpoint, which answers
+scrapers presenting ``METRICS_TOKEN`` as a bearer token and admins.
+
+With several workers each process reports its own series; scrape them
+individually or aggregate by instance.
+
+Opt-in slow request profiling: with ``METRICS_PROFILE_SLOW_MS`` set, a
+thread samples the event loop's stack every ``METRICS_PROFILE_INTERVAL_MS``,
+and any request slower than the threshold logs the stacks sampled while it
+was in flight.
+"""
+import asyncio
+import bisect
+import collections
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') not in ('0', 'false', 'off')
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.environ.get('EVENT_LOOP_LAG_INTERVAL_SECONDS', '0.5'))
+METRICS_PROFILE_SLOW_MS = float(os.environ.get('METRICS_PROFILE_SLOW_MS', '0'))
+METRICS_PROFILE_INTERVAL_MS = float(os.environ.get('METRICS_PROFILE_INTERVAL_MS', '5'))
+METRICS_PROFILE_MAX_DEPTH = 40
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join('%s="%s"' % (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], '_Metric'] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> List[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """(suffix, extra label names, extra label values, value) for one unlabelled series"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        series = self._children.items() if self.labelnames else [((), self)]
+        for values, metric in sorted(series):
+            for suffix, names, extra, value in metric._samples():
+                labels = _format_labels(self.labelnames + tuple(names), tuple(values) + tuple(extra))
+                lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def _child(self):
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def _samples(self):
+        return [('', (), (), self.value)]
+
+
+class Gauge(_Metric):
+    """``function`` makes an unlabelled gauge read its value at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+        self.function = function
+
+    def _child(self):
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def _samples(self):
+        return [('', (), (), self.function() if self.function else self.value)]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per-bucket counts, cumulated when rendered; the last slot is +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def _child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> '_Timer':
+        return _Timer(self)
+
+    def _samples(self):
+        samples = []
+        total = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            samples.append(('_bucket', ('le',), (_format_value(bound),), total))
+        samples.append(('_sum', (), (), self.sum))
+        samples.append(('_count', (), (), total))
+        return samples
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One broken scrape-time callback must not take the endpoint down
+                logger.warning(f"Failed to render metric {metric.name}: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template', ['method', 'route', 'status'])
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    'http_requests_in_flight', 'HTTP requests currently being served', ['method', 'route'])
+MONGO_COMMAND_SECONDS = registry.histogram(
+    'mongo_command_duration_seconds', 'MongoDB command latency', ['collection', 'command'], MONGO_BUCKETS)
+MONGO_COMMAND_FAILURES = registry.counter(
+    'mongo_command_failures_total', 'MongoDB commands that returned an error', ['collection', 'command'])
+MONGO_POOL_CONNECTIONS = registry.gauge(
+    'mongo_pool_connections', 'Open pooled connections per server', ['address'])
+MONGO_POOL_CHECKED_OUT = registry.gauge(
+    'mongo_pool_checked_out_connections', 'Pooled connections currently in use per server', ['address'])
+MONGO_POOL_CHECKOUT_SECONDS = registry.histogram(
+    'mongo_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection', buckets=MONGO_BUCKETS)
+MONGO_POOL_CHECKOUT_FAILURES = registry.counter(
+    'mongo_pool_checkout_failures_total', 'Connection checkouts that failed, by reason', ['reason'])
+MONGO_POOL_CLEARED = registry.counter(
+    'mongo_pool_cleared_total', 'Times a server\'s pool was cleared after an error', ['address'])
+LLM_REQUEST_SECONDS = registry.histogram(
+    'llm_request_duration_seconds', 'LLM calls including retries, by outcome', ['mode', 'outcome'], SLOW_BUCKETS)
+SYMPTOM_ANALYSES = registry.counter(
+    'symptom_analyses_total', 'Symptom analyses by how they were answered', ['outcome'])
+LLM_COMPLIANCE_FAILURES = registry.counter(
+    'llm_compliance_failures_total', 'LLM outputs rejected by the forbidden term check')
+OCR_SECONDS = registry.histogram(
+    'ocr_duration_seconds', 'OCR wall time including the process pool queue', ['outcome'], SLOW_BUCKETS)
+BCRYPT_SECONDS = registry.histogram(
+    'bcrypt_duration_seconds', 'bcrypt wall time including the thread pool queue', ['operation'], SLOW_BUCKETS)
+EVENT_LOOP_LAG_SECONDS = registry.histogram(
+    'event_loop_lag_seconds', 'How late the event loop woke a sleeping monitor task', buckets=LAG_BUCKETS)
+
+
+class RouteTemplates:
+    """Maps a request to its route's path template, so ids don't become label values.
+
+    Matches the compiled path patterns directly; ``Route.matches`` costs
+    several microseconds per route, which adds up on every request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[List[Tuple[re.Pattern, Optional[set], str]]] = None
+
+    def _compile(self):
+        # Built on first use, once every router has been included
+        return [(route.path_regex, getattr(route, 'methods', None), route.path)
+                for route in self.app.router.routes if hasattr(route, 'path_regex')]
+
+    def __call__(self, method: str, path: str) -> str:
+        if self._routes is None:
+            self._routes = self._compile()
+        partial = None
+        for regex, methods, template in self._routes:
+            if regex.match(path):
+                if methods is None or method in methods:
+                    return template
+                # Path matched but the method did not; the response will be a 405
+                partial = partial or template
+        return partial or 'unmatched'
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and in-flight requests per route"""
+
+    def __init__(self, app, router_app=None, exclude: Sequence[str] = (),
+                 profiler: Optional['SlowRequestProfiler'] = None, enabled: bool = METRICS_ENABLED):
+        self.app = app
+        # The FastAPI app whose routes are matched; middleware wraps it, so it is passed separately
+        self.route_template = RouteTemplates(router_app)
+        self.exclude = set(exclude)
+        self.profiler = profiler
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope['type'] != 'http' or scope['path'] in self.exclude:
+            return await self.app(scope, receive, send)
+        method = scope['method']
+        route = self.route_template(method, scope['path'])
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method, route)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end = time.perf_counter()
+            in_flight.dec()
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status)).observe(end - start)
+            if self.profiler is not None:
+                self.profiler.request_finished(method, scope['path'], start, end)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Command timings per collection, passed to the client via ``event_listeners``"""
+
+    def __init__(self):
+        # request_id -> labels; started and finished events come from the same thread
+        self._pending: Dict[int, Tuple[str, str]] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            target = event.command.get('collection')
+        collection = target if isinstance(target, str) else '-'
+        self._pending[event.request_id] = (collection, event.command_name)
+
+    def succeeded(self, event):
+        labels = self._pending.pop(event.request_id, None)
+        if labels is not None:
+            MONGO_COMMAND_SECONDS.labels(*labels).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        labels = self._pending.pop(event.request_id, None)
+        if labels is not None:
+            MONGO_COMMAND_SECONDS.labels(*labels).observe(event.duration_micros / 1e6)
+            MONGO_COMMAND_FAILURES.labels(*labels).inc()
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Pool occupancy and checkout waits, passed to the client via ``event_listeners``"""
+
+    def __init__(self):
+        # A checkout's started and finished events come from the thread doing the checkout
+        self._local = threading.local()
+
+    def pool_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).set(0)
+        MONGO_POOL_CHECKED_OUT.labels(_address(event)).set(0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        MONGO_POOL_CLEARED.labels(_address(event)).inc()
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).dec()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._observe_wait()
+        MONGO_POOL_CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def connection_checked_out(self, event):
+        self._observe_wait()
+        MONGO_POOL_CHECKED_OUT.labels(_address(event)).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(_address(event)).dec()
+
+    def _observe_wait(self):
+        started = getattr(self._local, 'started', None)
+        if started is not None:
+            MONGO_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+            self._local.started = None
+
+
+async def monitor_event_loop(interval: float = EVENT_LOOP_LAG_INTERVAL_SECONDS):
+    """Sleep ``interval`` repeatedly and record how much later than requested each wake-up was"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - start - interval))
+
+
+class SlowRequestProfiler:
+    """Samples the event loop thread's stack and reports it for slow requests.
+
+    Samples are not attributed to individual requests: with concurrent
+    requests, a slow request's report covers everything the loop did while
+    it was in flight, which is usually what explains the slowness.
+    """
+
+    def __init__(self, threshold_ms: float = METRICS_PROFILE_SLOW_MS,
+                 interval_ms: float = METRICS_PROFILE_INTERVAL_MS, top: int = 5):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.top = top
+        # Enough for the slowest request we would report on, about a minute of samples
+        self._samples: Deque[Tuple[float, Tuple[str, ...]]] = collections.deque(
+            maxlen=max(1000, int(60 / max(self.interval, 0.001))))
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._target: Optional[int] = None
+        self.reports: Deque[dict] = collections.deque(maxlen=20)
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def start(self):
+        """Call from the event loop thread"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None and frame.f_code.co_filename.endswith('selectors.py'):
+                # Loop is waiting for I/O
+                self._samples.append((time.perf_counter(), None))
+                continue
+            stack = []
+            while frame is not None and len(stack) < METRICS_PROFILE_MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self._samples.append((time.perf_counter(), tuple(reversed(stack))))
+
+    def request_finished(self, method: str, path: str, start: float, end: float):
+        if not self.enabled or end - start < self.threshold:
+            return
+        stacks = collections.Counter(stack for at, stack in list(self._samples) if start <= at <= end)
+        idle = stacks.pop(None, 0)
+        top = [{'samples': count, 'stack': ';'.join(stack)} for stack, count in stacks.most_common(self.top)]
+        self.reports.append({'method': method, 'path': path, 'duration_ms': round((end - start) * 1000, 1),
+                             'busy_samples': sum(stacks.values()), 'idle_samples': idle, 'top': top})
+        lines = '\n'.join(f"  {entry['samples']:5d} {entry['stack']}" for entry in top)
+        logger.warning(f"Slow request {method} {path} took {(end - start) * 1000:.0f}ms; "
+                       f"{sum(stacks.values())} busy and {idle} idle loop samples, most frequent stacks:\n{lines}")
+
+
+mongo_command_metrics = MongoCommandMetrics()
+mongo_pool_metrics = MongoPoolMetrics()
+slow_request_profiler = SlowRequestProfiler()
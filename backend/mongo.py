@@ -0,0 +1,138 @@
+"""MongoDB client lifecycle, pool settings and per-collection routing.
+
+``MongoConnection`` owns the process's Motor client: the app lifespan
+opens it on startup and closes it on shutdown. Pool size, timeouts and
+wire compression come from the environment.
+
+``connection.db`` can be handed out at import time. It resolves the
+client only when a collection is first used. Collections listed in the
+routing table get their own read preference and write concern, so
+read-mostly catalogs can be served by secondaries while accounts stay on
+the primary. Collections not listed use the client defaults: primary
+reads and the server's default write concern.
+"""
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference
+from pymongo.read_preferences import Nearest, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.write_concern import WriteConcern
+
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = os.environ.get('MONGO_MAX_IDLE_TIME_MS')
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '10000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '10000'))
+MONGO_SOCKET_TIMEOUT_MS = os.environ.get('MONGO_SOCKET_TIMEOUT_MS')
+# How long a request may wait for a free pooled connection; unset waits indefinitely
+MONGO_WAIT_QUEUE_TIMEOUT_MS = os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS')
+# e.g. 'zstd,snappy,zlib'; zstd and snappy need their optional packages installed
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')
+MONGO_CATALOG_READ_PREFERENCE = os.environ.get('MONGO_CATALOG_READ_PREFERENCE', 'secondaryPreferred')
+# Secondaries lagging more than this are not read from; -1 means no limit, otherwise at least 90
+MONGO_CATALOG_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_CATALOG_MAX_STALENESS_SECONDS', '-1'))
+
+_READ_PREFERENCES = {
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+
+def read_preference(mode: str, max_staleness: int = -1):
+    if mode == 'primary':
+        return ReadPreference.PRIMARY
+    return _READ_PREFERENCES[mode](max_staleness=max_staleness)
+
+
+class Routing(NamedTuple):
+    read_preference: Optional[object] = None
+    write_concern: Optional[WriteConcern] = None
+
+
+def client_options() -> dict:
+    options = {
+        'maxPoolSize': MONGO_MAX_POOL_SIZE,
+        'minPoolSize': MONGO_MIN_POOL_SIZE,
+        'connectTimeoutMS': MONGO_CONNECT_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    }
+    if MONGO_MAX_IDLE_TIME_MS:
+        options['maxIdleTimeMS'] = int(MONGO_MAX_IDLE_TIME_MS)
+    if MONGO_SOCKET_TIMEOUT_MS:
+        options['socketTimeoutMS'] = int(MONGO_SOCKET_TIMEOUT_MS)
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options['waitQueueTimeoutMS'] = int(MONGO_WAIT_QUEUE_TIMEOUT_MS)
+    if MONGO_COMPRESSORS:
+        options['compressors'] = MONGO_COMPRESSORS
+    return options
+
+
+class RoutedDatabase:
+    """Database proxy returning collections with their routing options applied"""
+
+    def __init__(self, connection: 'MongoConnection', routing: Dict[str, Routing]):
+        self._connection = connection
+        self._routing = routing
+        self._collections = {}
+
+    def __getitem__(self, name: str):
+        collection = self._collections.get(name)
+        if collection is None:
+            database = self._connection.database
+            routing = self._routing.get(name)
+            if routing is None:
+                collection = database[name]
+            else:
+                collection = database.get_collection(
+                    name, read_preference=routing.read_preference, write_concern=routing.write_concern)
+            self._collections[name] = collection
+        return collection
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attribute = getattr(self._connection.database, name)
+        # Motor returns a collection for any unknown attribute, as in db.users
+        if type(attribute).__name__.endswith('Collection'):
+            return self[name]
+        return attribute
+
+    def reset(self):
+        self._collections.clear()
+
+
+class MongoConnection:
+    def __init__(self, url: str, name: str, routing: Optional[Dict[str, Routing]] = None,
+                 event_listeners: Optional[List[object]] = None):
+        self.url = url
+        self.name = name
+        self.event_listeners = event_listeners or []
+        self.client: Optional[AsyncIOMotorClient] = None
+        self._database = None
+        self.db = RoutedDatabase(self, routing or {})
+
+    @property
+    def database(self):
+        if self._database is None:
+            raise RuntimeError("MongoDB client is not open; it is opened by the app lifespan")
+        return self._database
+
+    def connect(self) -> AsyncIOMotorClient:
+        """Create the client; connections are made lazily, up to minPoolSize in the background"""
+        if self.client is None:
+            self.client = AsyncIOMotorClient(self.url, event_listeners=self.event_listeners, **client_options())
+            self._database = self.client[self.name]
+        return self.client
+
+    async def ping(self):
+        await self.database.command('ping')
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self._database = None
+        self.db.reset()
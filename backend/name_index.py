@@ -0,0 +1,147 @@
+import asyncio
+import os
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NAME_INDEX_REFRESH_SECONDS = int(os.environ.get('NAME_INDEX_REFRESH_SECONDS', '300'))
+MIN_TOKEN_LENGTH = 4
+
+# Digits OCR commonly produces in place of letters, only substituted when
+# the digit sits between two letters (e.g. "Tyl3nol", "Adv1l")
+OCR_CONFUSIONS = {'0': 'o', '1': 'l', '3': 'e', '5': 's', '8': 'b'}
+_CONFUSABLE_DIGIT = re.compile(r'(?<=[a-z])[01358](?=[a-z])')
+_WORD = re.compile(r'[a-z]+')
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _CONFUSABLE_DIGIT.sub(lambda m: OCR_CONFUSIONS[m.group()], text)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _WORD.findall(normalize(text)) if len(t) >= MIN_TOKEN_LENGTH]
+
+
+def max_edits(token: str) -> int:
+    if len(token) >= 9:
+        return 2
+    if len(token) >= 5:
+        return 1
+    return 0
+
+
+class _TrieNode:
+    __slots__ = ('children', 'term')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.term: Optional[str] = None
+
+
+class MedicineNameIndex:
+    """Trie over brand/generic name tokens with bounded-edit-distance lookup.
+
+    Each distinct OCR token is resolved once (exact hit, else a Levenshtein
+    walk of the trie), then candidates are ranked by how much of each
+    medicine's name was matched and how closely.
+    """
+
+    def __init__(self, refresh_seconds: int = NAME_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._root = _TrieNode()
+        self._postings: Dict[str, List[str]] = {}
+        self._name_tokens: Dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        self._lock = asyncio.Lock()
+
+    def build(self, medicines: Iterable[dict]):
+        root = _TrieNode()
+        postings: Dict[str, List[str]] = defaultdict(list)
+        name_tokens: Dict[str, int] = {}
+        for medicine in medicines:
+            tokens = set()
+            for field in ('brand_name', 'generic_name'):
+                if medicine.get(field):
+                    tokens.update(tokenize(medicine[field]))
+            if not tokens:
+                continue
+            name_tokens[medicine['id']] = len(tokens)
+            for token in tokens:
+                postings[token].append(medicine['id'])
+                node = root
+                for ch in token:
+                    node = node.children.setdefault(ch, _TrieNode())
+                node.term = token
+        self._root = root
+        self._postings = dict(postings)
+        self._name_tokens = name_tokens
+        self._loaded_at = time.monotonic()
+        self._stale = False
+
+    def invalidate(self):
+        self._stale = True
+
+    @property
+    def needs_refresh(self) -> bool:
+        return (self._stale or self._loaded_at is None
+                or time.monotonic() - self._loaded_at > self.refresh_seconds)
+
+    async def ensure_fresh(self, db):
+        if not self.needs_refresh:
+            return
+        async with self._lock:
+            if self.needs_refresh:
+                medicines = await db.medicines.find(
+                    {}, {'_id': 0, 'id': 1, 'brand_name': 1, 'generic_name': 1}
+                ).to_list(None)
+                self.build(medicines)
+
+    def _fuzzy(self, word: str, limit: int) -> List[Tuple[str, int]]:
+        results = []
+        first_row = list(range(len(word) + 1))
+        stack = [(child, ch, first_row) for ch, child in self._root.children.items()]
+        while stack:
+            node, ch, prev_row = stack.pop()
+            row = [prev_row[0] + 1]
+            for i in range(1, len(word) + 1):
+                cost = 0 if word[i - 1] == ch else 1
+                row.append(min(row[i - 1] + 1, prev_row[i] + 1, prev_row[i - 1] + cost))
+            if node.term is not None and row[-1] <= limit:
+                results.append((node.term, row[-1]))
+            if min(row) <= limit:
+                stack.extend((child, c, row) for c, child in node.children.items())
+        return results
+
+    def ids_for(self, term: str) -> List[str]:
+        return self._postings.get(term, [])
+
+    def lookup(self, word: str) -> List[Tuple[str, int]]:
+        """Index tokens matching ``word`` with their edit distance"""
+        if word in self._postings:
+            return [(word, 0)]
+        limit = max_edits(word)
+        return self._fuzzy(word, limit) if limit else []
+
+    def match(self, text: str, limit: int = 5) -> List[Tuple[str, float]]:
+        best: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for word in set(tokenize(text)):
+            for term, distance in self.lookup(word):
+                quality = 1.0 - distance / len(term)
+                for medicine_id in self._postings[term]:
+                    matched = best[medicine_id]
+                    if quality > matched.get(term, 0.0):
+                        matched[term] = quality
+        ranked = []
+        for medicine_id, matched in best.items():
+            coverage = len(matched) / self._name_tokens[medicine_id]
+            ranked.append((medicine_id, sum(matched.values()) * (0.5 + 0.5 * coverage)))
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+
+medicine_name_index = MedicineNameIndex()
@@ -0,0 +1,215 @@
+import asyncio
+import importlib
+import io
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Iterable, Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from metrics import OCR_SECONDS
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', '2'))
+OCR_MAX_CONCURRENCY = int(os.environ.get('OCR_MAX_CONCURRENCY', str(OCR_WORKERS * 2)))
+OCR_TIMEOUT_SECONDS = float(os.environ.get('OCR_TIMEOUT_SECONDS', '20'))
+OCR_MAX_SIDE = int(os.environ.get('OCR_MAX_SIDE', '1600'))
+OCR_BINARIZE_THRESHOLD = int(os.environ.get('OCR_BINARIZE_THRESHOLD', '150'))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(8 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+# Room for the multipart boundaries and part headers around the image
+UPLOAD_FORM_OVERHEAD_BYTES = 16 * 1024
+OCR_JOB_TTL_SECONDS = int(os.environ.get('OCR_JOB_TTL_SECONDS', '600'))
+# Start the worker processes during warmup rather than on the first upload
+OCR_PREFORK = os.environ.get('OCR_PREFORK', '1') not in ('0', 'false', 'off')
+
+
+def preprocess_image(data: bytes, max_side: int = OCR_MAX_SIDE,
+                     threshold: int = OCR_BINARIZE_THRESHOLD) -> 'Image.Image':
+    """Orient, downscale, grayscale and binarize an uploaded photo for OCR"""
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(data))
+    # draft() lets JPEG decode at a reduced scale instead of full resolution
+    image.draft('L', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side))
+    image = ImageOps.autocontrast(image.convert('L'))
+    return image.point(lambda px: 255 if px > threshold else 0)
+
+
+def load_ocr():
+    """Worker initializer; PIL and pytesseract are only ever imported in the workers"""
+    for module in ('PIL.Image', 'PIL.ImageOps', 'pytesseract'):
+        importlib.import_module(module)
+
+
+def run_ocr(data: bytes) -> str:
+    """Executed inside a worker process"""
+    import pytesseract
+
+    return pytesseract.image_to_string(preprocess_image(data))
+
+
+class UploadSizeLimitMiddleware:
+    """ASGI middleware refusing request bodies over ``max_bytes`` on ``paths``.
+
+    Starlette receives and spools a whole multipart body before the endpoint
+    runs, so the size limit has to apply while the body is being received: a
+    declared Content-Length over the limit gets a 413 straight away, and a
+    chunked body is cut off with a 413 once it passes the limit.
+    """
+
+    def __init__(self, app, paths: Iterable[str],
+                 max_bytes: int = UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD_BYTES):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.paths:
+            return await self.app(scope, receive, send)
+        length = Headers(scope=scope).get('content-length', '')
+        if length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse({'detail': 'Image too large'}, status_code=413)
+            return await response(scope, receive, send)
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing as they are
+                    raise HTTPException(status_code=413, detail="Image too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> bytes:
+    """Read a received upload, rejecting an image over max_bytes.
+
+    The request body has already been spooled by the time this runs;
+    ``UploadSizeLimitMiddleware`` is what bounds how much of it is received.
+    This check applies the exact limit to the image itself.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail="Image too large")
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise HTTPException(status_code=413, detail="Image too large")
+    if not buffer:
+        raise HTTPException(status_code=400, detail="Empty upload")
+    return bytes(buffer)
+
+
+class OcrPool:
+    """Process pool for OCR with a concurrency cap and per-job deadline.
+
+    A timed-out job is abandoned, not killed: the worker finishes it in the
+    background, which the concurrency cap keeps from snowballing.
+    """
+
+    def __init__(self, workers: int = OCR_WORKERS, max_concurrency: int = OCR_MAX_CONCURRENCY,
+                 timeout: float = OCR_TIMEOUT_SECONDS):
+        self.workers = workers
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=load_ocr)
+        return self._executor
+
+    async def warm(self):
+        """Start every worker and let it finish its imports before the first upload"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, os.getpid) for _ in range(self.workers)))
+
+    async def extract_text(self, data: bytes) -> str:
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_executor(), run_ocr, data)
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                text = await asyncio.wait_for(future, timeout=self.timeout)
+                outcome = 'ok'
+                return text
+            except asyncio.TimeoutError:
+                outcome = 'timeout'
+                raise HTTPException(status_code=504, detail="Image processing timed out")
+            finally:
+                OCR_SECONDS.labels(outcome).observe(time.perf_counter() - start)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class OcrJobStore:
+    """In-memory registry of background identification jobs"""
+
+    def __init__(self, ttl: int = OCR_JOB_TTL_SECONDS):
+        self.ttl = ttl
+        self._jobs: Dict[str, dict] = {}
+        self._tasks = set()
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for job_id in [k for k, job in self._jobs.items() if job['updated'] < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, user_id: str, work: Callable[[], Awaitable[dict]]) -> str:
+        self._expire()
+        job_id = str(uuid.uuid4())
+        self._jobs[job_id] = {'status': 'pending', 'user_id': user_id, 'updated': time.monotonic()}
+
+        async def runner():
+            job = self._jobs[job_id]
+            try:
+                job['result'] = await work()
+                job['status'] = 'done'
+            except HTTPException as e:
+                job['status'] = 'failed'
+                job['error'] = e.detail
+            except Exception:
+                job['status'] = 'failed'
+                job['error'] = "Failed to process image"
+            job['updated'] = time.monotonic()
+
+        task = asyncio.create_task(runner())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_id
+
+    def get(self, job_id: str, user_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        if job is None or job['user_id'] != user_id:
+            return None
+        response = {'job_id': job_id, 'status': job['status']}
+        if 'result' in job:
+            response['result'] = job['result']
+        if 'error' in job:
+            response['error'] = job['error']
+        return response
+
+
+ocr_pool = OcrPool()
+ocr_jobs = OcrJobStore()
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+from fastapi import HTTPException
+
+from metrics import BCRYPT_SECONDS
+
+# bcrypt releases the GIL while hashing, so a thread pool is enough to keep
+# password work off the event loop.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS', '4'))
+PASSWORD_MAX_PENDING = int(os.environ.get('PASSWORD_MAX_PENDING', '64'))
+PASSWORD_RETRY_AFTER = os.environ.get('PASSWORD_RETRY_AFTER', '1')
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Return the cost factor encoded in a bcrypt hash ($2b$<cost>$...)"""
+    parts = hashed.split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """Bounded executor for bcrypt work with admission control.
+
+    Jobs beyond ``max_pending`` (running + queued) are rejected with a 503
+    instead of piling up behind the workers.
+    """
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, max_pending: int = PASSWORD_MAX_PENDING,
+                 rounds: int = BCRYPT_ROUNDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.max_pending
+
+    async def _run(self, operation: str, fn, *args):
+        if self.saturated:
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, please retry",
+                headers={'Retry-After': PASSWORD_RETRY_AFTER}
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            try:
+                return await loop.run_in_executor(self._executor, fn, *args)
+            finally:
+                BCRYPT_SECONDS.labels(operation).observe(time.perf_counter() - start)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run('hash', hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run('verify', verify_password, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return hash_rounds(hashed) != self.rounds
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,173 @@
+"""Token-bucket rate limiting for expensive routes.
+
+Each rule gives a route a bucket per client. The client is the
+authenticated user where there is one, else the client IP. Buckets refill
+continuously at ``limit / period``, hold at most ``limit`` tokens, and cost
+one token per request, so every check is O(1). Denied requests get a 429
+with ``Retry-After``.
+
+``RATE_LIMIT_BACKEND=memory`` keeps buckets per process. ``mongo`` shares
+them across workers through an atomic pipeline update on a TTL-indexed
+collection. If Mongo cannot be reached the check fails open: the request
+is let through and the error logged, so an outage does not take the
+limited routes down with it.
+"""
+import logging
+import math
+import os
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from cachetools import TTLCache
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') not in ('0', 'false', 'off')
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000'))
+# Number of trusted reverse proxies appending to X-Forwarded-For; 0 uses the socket peer
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '0'))
+
+RATE_LIMIT_COLLECTION = 'rate_limits'
+RATE_LIMIT_INDEXES = [IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0)]
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+class Limit(NamedTuple):
+    limit: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.period
+
+
+def parse_limit(spec: str) -> Optional[Limit]:
+    """'10/minute' -> Limit(10, 60); '0' or 'off' disables the rule"""
+    spec = spec.strip().lower()
+    if spec in ('', '0', 'off', 'none'):
+        return None
+    count, _, period = spec.partition('/')
+    return Limit(int(count), PERIODS[period.strip().rstrip('s') or 'second'])
+
+
+class Rule(NamedTuple):
+    name: str
+    limit: Limit
+    # 'user' keys on the authenticated user when there is one, 'ip' always on the client address
+    key: str = 'user'
+
+
+def refill(tokens: float, updated: float, now: float, limit: Limit) -> float:
+    return min(float(limit.limit), tokens + (now - updated) * limit.rate)
+
+
+class MemoryBackend:
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._max_keys = max_keys
+        # One TTLCache per period so idle buckets expire once they would be full again
+        self._buckets: Dict[float, TTLCache] = {}
+
+    async def take(self, key: str, limit: Limit) -> Tuple[bool, float]:
+        """Spend one token; returns (allowed, seconds until one is available)"""
+        buckets = self._buckets.get(limit.period)
+        if buckets is None:
+            buckets = self._buckets[limit.period] = TTLCache(
+                maxsize=self._max_keys, ttl=limit.period, timer=self._clock)
+        now = self._clock()
+        tokens, updated = buckets.get(key, (float(limit.limit), now))
+        tokens = refill(tokens, updated, now, limit)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        buckets[key] = (tokens, now)
+        return allowed, 0.0 if allowed else (1 - tokens) / limit.rate
+
+
+class MongoBackend:
+    """Buckets shared by all workers; refill and spend happen in one atomic update"""
+
+    def __init__(self, db, collection: str = RATE_LIMIT_COLLECTION):
+        # Looked up per call: the middleware is built before the app lifespan opens the client
+        self.db = db
+        self.collection = collection
+
+    async def take(self, key: str, limit: Limit) -> Tuple[bool, float]:
+        now = time.time()
+        tokens = {'$min': [limit.limit, {'$add': [
+            {'$ifNull': ['$tokens', limit.limit]},
+            {'$multiply': [{'$subtract': [now, {'$ifNull': ['$updated', now]}]}, limit.rate]},
+        ]}]}
+        try:
+            doc = await self.db[self.collection].find_one_and_update(
+                {'_id': key},
+                [
+                    {'$set': {'tokens': tokens, 'updated': now}},
+                    {'$set': {'allowed': {'$gte': ['$tokens', 1]}}},
+                    {'$set': {
+                        'tokens': {'$cond': ['$allowed', {'$subtract': ['$tokens', 1]}, '$tokens']},
+                        'expires_at': {'$add': ['$$NOW', int(limit.period * 1000)]},
+                    }},
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except Exception as e:
+            logger.warning(f"Rate limit check for {key} failed, allowing the request: {e}")
+            return True, 0.0
+        if doc['allowed']:
+            return True, 0.0
+        return False, (1 - doc['tokens']) / limit.rate
+
+
+def client_ip(request: Request, proxy_hops: int = RATE_LIMIT_PROXY_HOPS) -> str:
+    if proxy_hops:
+        forwarded = [ip.strip() for ip in request.headers.get('x-forwarded-for', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxy_hops:
+            return forwarded[-proxy_hops]
+    return request.client.host if request.client else 'unknown'
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying ``rules`` keyed by (method, path).
+
+    ``identify`` maps a request to a user id, or None for anonymous
+    requests. It runs before routing, so it should be cheap: verifying
+    the bearer token without a database lookup is enough for keying.
+    """
+
+    def __init__(self, app, rules: Dict[Tuple[str, str], Rule], backend,
+                 identify: Callable[[Request], Optional[str]], enabled: bool = RATE_LIMIT_ENABLED):
+        self.app = app
+        self.rules = rules
+        self.backend = backend
+        self.identify = identify
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        rule = self.rules.get((scope['method'], scope['path']))
+        if rule is None:
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        user_id = self.identify(request) if rule.key == 'user' else None
+        key = f"{rule.name}:user:{user_id}" if user_id else f"{rule.name}:ip:{client_ip(request)}"
+        allowed, retry_after = await self.backend.take(key, rule.limit)
+        if allowed:
+            return await self.app(scope, receive, send)
+        response = JSONResponse(
+            {'detail': 'Too many requests'}, status_code=429,
+            headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+        await response(scope, receive, send)
+
+
+def create_backend(db=None, backend: str = RATE_LIMIT_BACKEND):
+    if backend == 'mongo':
+        return MongoBackend(db)
+    return MemoryBackend()
@@ -0,0 +1,152 @@
+import base64
+import json
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import ASCENDING, UpdateOne
+
+from name_index import medicine_name_index, tokenize
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+SEARCH_MAX_QUERY_LENGTH = 100
+NGRAM_SIZE = 3
+
+# Derived fields stored on medicine documents, never returned to clients
+SEARCH_FIELDS = ('search_names', 'search_ngrams', 'name_key')
+MEDICINE_PROJECTION = {'_id': 0, **{field: 0 for field in SEARCH_FIELDS}}
+
+SEARCH_INDEXES = [
+    ([('search_names', ASCENDING)], {'name': 'search_names'}),
+    ([('search_ngrams', ASCENDING)], {'name': 'search_ngrams'}),
+    ([('name_key', ASCENDING), ('id', ASCENDING)], {'name': 'name_key_id'}),
+]
+
+# Relevance tiers, served in order: exact > prefix > substring > fuzzy
+TIER_EXACT, TIER_PREFIX, TIER_SUBSTRING, TIER_FUZZY = range(4)
+
+
+def normalize_name(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.split())
+
+
+def ngrams(text: str, size: int = NGRAM_SIZE) -> List[str]:
+    return sorted({text[i:i + size] for i in range(len(text) - size + 1)})
+
+
+def search_fields(medicine: dict) -> dict:
+    """Normalized name fields backing the indexed search path"""
+    names = [normalize_name(medicine[f]) for f in ('brand_name', 'generic_name') if medicine.get(f)]
+    grams = set()
+    for name in names:
+        grams.update(ngrams(name))
+    return {
+        'search_names': names,
+        'search_ngrams': sorted(grams),
+        'name_key': names[0] if names else '',
+    }
+
+
+async def backfill_search_fields(db, batch_size: int = 1000) -> int:
+    """Populate search fields on medicines that predate them"""
+    updated = 0
+    batch = []
+    cursor = db.medicines.find({'name_key': {'$exists': False}}, {'_id': 1, 'brand_name': 1, 'generic_name': 1})
+    async for medicine in cursor:
+        batch.append(UpdateOne({'_id': medicine['_id']}, {'$set': search_fields(medicine)}))
+        if len(batch) >= batch_size:
+            await db.medicines.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await db.medicines.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+
+def encode_cursor(tier: int, name_key: Optional[str] = None, medicine_id: Optional[str] = None) -> str:
+    raw = json.dumps([tier, name_key, medicine_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[int, Optional[str], Optional[str]]:
+    try:
+        tier, name_key, medicine_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(tier, int) or not all(v is None or isinstance(v, str) for v in (name_key, medicine_id)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tier, name_key, medicine_id
+
+
+def fuzzy_candidate_ids(query: str) -> List[str]:
+    ids = set()
+    # Same tokens the index was built from, so "paracetamol-500" or "vitamin,c" still match
+    for word in set(tokenize(query)):
+        for term, _ in medicine_name_index.lookup(word):
+            ids.update(medicine_name_index.ids_for(term))
+    return sorted(ids)
+
+
+def tier_filter(tier: int, query: str, fuzzy_ids: Optional[List[str]] = None) -> Optional[dict]:
+    escaped = re.escape(query)
+    prefix = re.compile('^' + escaped)
+    if tier == TIER_EXACT:
+        return {'search_names': query}
+    if tier == TIER_PREFIX:
+        return {'$and': [{'search_names': prefix}, {'search_names': {'$ne': query}}]}
+    if tier == TIER_SUBSTRING:
+        if len(query) < NGRAM_SIZE:
+            return None
+        return {'$and': [
+            {'search_ngrams': {'$all': ngrams(query)}},
+            {'search_names': re.compile(escaped)},
+            {'search_names': {'$not': prefix}},
+        ]}
+    if not fuzzy_ids:
+        return None
+    return {'$and': [{'id': {'$in': fuzzy_ids}}, {'search_names': {'$not': re.compile(escaped)}}]}
+
+
+async def search_medicine_catalog(db, query: str, limit: int = SEARCH_PAGE_SIZE,
+                                  cursor: Optional[str] = None) -> dict:
+    """Ranked keyset-paginated search; each tier is an indexed query"""
+    query = normalize_name(query)[:SEARCH_MAX_QUERY_LENGTH]
+    if not query:
+        return {'results': [], 'next_cursor': None}
+    limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+    start_tier, after_key, after_id = decode_cursor(cursor) if cursor else (TIER_EXACT, None, None)
+    start_tier = max(start_tier, TIER_EXACT)
+
+    fuzzy_ids = None
+    results = []
+    last = None
+    for tier in range(start_tier, TIER_FUZZY + 1):
+        if tier == TIER_FUZZY:
+            await medicine_name_index.ensure_fresh(db)
+            fuzzy_ids = fuzzy_candidate_ids(query)
+        conditions = tier_filter(tier, query, fuzzy_ids)
+        if conditions is None:
+            continue
+        if tier == start_tier and after_id is not None:
+            conditions = {'$and': [conditions, {'$or': [
+                {'name_key': {'$gt': after_key}},
+                {'name_key': after_key, 'id': {'$gt': after_id}},
+            ]}]}
+        remaining = limit - len(results)
+        # Fetch one extra row to know whether a next page exists
+        page = await db.medicines.find(conditions, {'_id': 0, 'search_names': 0, 'search_ngrams': 0}) \
+            .sort([('name_key', ASCENDING), ('id', ASCENDING)]).limit(remaining + 1).to_list(remaining + 1)
+        for medicine in page[:remaining]:
+            last = (tier, medicine.pop('name_key', ''), medicine['id'])
+            results.append(medicine)
+        if len(page) > remaining:
+            return {'results': results, 'next_cursor': encode_cursor(*last)}
+        if len(results) >= limit:
+            # Page filled exactly at the end of this tier; continue from the next one
+            return {'results': results, 'next_cursor': encode_cursor(tier + 1)}
+    return {'results': results, 'next_cursor': None}
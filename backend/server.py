@@ -1,56 +1,135 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile, status
-from fastapi.security import HTTPBearer, HTTPAuthCredentials
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, Request, UploadFile, status
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from contextlib import asynccontextmanager
 import os
+import asyncio
+import hmac
+import json
 import logging
+import time
 from pathlib import Path
+from pymongo import ASCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import DuplicateKeyError
+from pymongo.write_concern import WriteConcern
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import jwt
-from PIL import Image
-import pytesseract
-import io
 import re
-from emergentintegrations.llm.chat import LlmChat, UserMessage
-
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Local modules read their settings from the environment at import time
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, LLM_COMPLIANCE_FAILURES, METRICS_ENABLED, SYMPTOM_ANALYSES,
+    MetricsMiddleware, monitor_event_loop, mongo_command_metrics, mongo_pool_metrics,
+    registry as metrics_registry, slow_request_profiler,
+)
+from mongo import (
+    MONGO_CATALOG_MAX_STALENESS_SECONDS, MONGO_CATALOG_READ_PREFERENCE, MONGO_MAX_POOL_SIZE, MongoConnection,
+    Routing, read_preference,
+)
+from passwords import password_hasher
+from auth_cache import user_cache
+from llm_client import LlmClient, LlmUnavailableError
+from llm_cache import (
+    SYMPTOM_CACHE_COLLECTION, SYMPTOM_CACHE_INDEXES, SYMPTOM_CACHE_MONGO,
+    cache_key as symptom_cache_key, normalize_symptoms, symptom_cache,
+)
+from term_matcher import SafetyTerms
+from symptom_parser import RESPONSE_SCHEMA, OutputComplianceError, SymptomResponseParser, parse_symptom_text
+from audit_writer import audit_writer
+from geo import (
+    CANDIDATE_PROJECTION, GEO_BACKEND, GEO_DEFAULT_RADIUS_KM, backfill_locations, clamp_page, doctor_grid,
+    near_providers, pharmacy_grid, provider_filter,
+)
+from locator_cache import locator_cache
+from ocr import OCR_PREFORK, UploadSizeLimitMiddleware, ocr_pool, ocr_jobs, read_upload
+from name_index import medicine_name_index
+from search import (
+    MEDICINE_PROJECTION, SEARCH_INDEXES, SEARCH_PAGE_SIZE,
+    backfill_search_fields, search_medicine_catalog,
+)
+from first_aid import FIRST_AID_CATALOGS, cached_response, first_aid_content
+from serialization import dumps, json_response, model_document
+from rate_limit import (
+    RATE_LIMIT_BACKEND, RATE_LIMIT_COLLECTION, RATE_LIMIT_INDEXES, RateLimitMiddleware, Rule, create_backend,
+    parse_limit,
+)
+from loader import CATALOG_DIR, CATALOG_LOAD, load_directory
+from indexes import AUDIT_RETENTION_DAYS, SYMPTOM_CHECK_RETENTION_DAYS, ensure_indexes, ttl_index
+from analytics import read_rollups, record_rollups
+from medicine_detail import (
+    DETAIL_COLLECTIONS, MEDICINE_CACHE_WATCH, fetch_medicine_detail, medicine_detail_cache, supervise_detail_watch,
+)
+
+# Where each collection's reads and writes go. Catalogs are read-mostly and tolerate
+# replication lag; accounts and consent are read back right after they are written.
+CATALOG_READS = Routing(read_preference(MONGO_CATALOG_READ_PREFERENCE, MONGO_CATALOG_MAX_STALENESS_SECONDS))
+COLLECTION_ROUTING = {
+    **{collection: CATALOG_READS for collection in ('medicines', *DETAIL_COLLECTIONS, 'pharmacies', 'doctors')},
+    'users': Routing(read_preference('primary')),
+    'user_consent': Routing(read_preference('primary')),
+    # Audit records must survive a failover; feedback only needs the primary's acknowledgement
+    'ai_audit_logs': Routing(write_concern=WriteConcern('majority', j=True)),
+    'feedback': Routing(write_concern=WriteConcern(w=1)),
+    # Ops dashboards poll these; a slightly stale rollup is fine
+    'analytics_rollups': CATALOG_READS,
+}
+
+# MongoDB connection, opened and closed by the app lifespan
+mongo = MongoConnection(
+    os.environ['MONGO_URL'],
+    os.environ['DB_NAME'],
+    routing=COLLECTION_ROUTING,
+    event_listeners=[mongo_command_metrics, mongo_pool_metrics] if METRICS_ENABLED else [],
+)
+db = mongo.db
 
 # JWT Secret
 JWT_SECRET = os.environ.get('JWT_SECRET', 'otcwise-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
+# Accounts allowed to read the admin endpoints
+ADMIN_EMAILS = {email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()}
+# Bearer token for the Prometheus scraper; without it /api/metrics needs an admin login
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Current disclaimer version; consent given to an older version must be renewed
+CONSENT_VERSION = os.environ.get('CONSENT_VERSION', '1.0')
+
 # Emergent LLM Key
 EMERGENT_KEY = os.environ.get('EMERGENT_LLM_KEY')
+# 'emergent' or 'fake' (local stand-in with injectable latency and failures)
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'emergent')
 
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
-# Emergency keywords
+# Emergency keywords, matched on word boundaries; a trailing * makes the last word a prefix.
+# Every phrase ends in * so inflections ("chest pains", "overdosed") are still caught, and
+# compounds that only contain a keyword mid-word are listed on their own.
 EMERGENCY_KEYWORDS = [
-    'chest pain', 'difficulty breathing', 'seizure', 'severe bleeding',
-    'loss of consciousness', 'unconscious', 'not breathing', 'choking',
-    'heart attack', 'stroke', 'severe burn', 'poisoning', 'overdose'
+    'chest pain*', 'difficulty breathing*', 'seizure*', 'severe bleeding*',
+    'loss of consciousness*', 'unconscious*', 'not breathing*', 'choking*',
+    'heart attack*', 'stroke*', 'heatstroke*', 'sunstroke*', 'ministroke*', 'severe burn*', 'poisoning*',
+    'overdos*'
 ]
 
 # Forbidden output words
 FORBIDDEN_WORDS = [
-    'diagnose', 'diagnosis', 'prescribe', 'prescription', 'cure', 'guaranteed',
+    'diagnose*', 'diagnosis', 'prescribe*', 'prescription*', 'cure*', 'guaranteed',
     'you have', 'your condition is', 'definitely', 'certainly will'
 ]
 
+# Database-stored terms extend these lists at runtime
+safety_terms = SafetyTerms({'emergency': EMERGENCY_KEYWORDS, 'forbidden': FORBIDDEN_WORDS})
+
 # Pydantic Models
 class UserRegister(BaseModel):
     email: EmailStr
@@ -63,12 +142,14 @@ class UserLogin(BaseModel):
 
 class ConsentAccept(BaseModel):
     age_confirmed: bool
-    consent_version: str = "1.0"
+    consent_version: str = CONSENT_VERSION
 
 class ConsentStatus(BaseModel):
     age_confirmed: bool
     disclaimer_accepted: bool
     consent_version: str
+    # The version the consent page must be accepted at; differs from consent_version once the text changes
+    current_version: str
 
 class FirstAidTopic(BaseModel):
     id: str
@@ -143,17 +224,61 @@ class FeedbackSubmit(BaseModel):
     type: str  # Feedback, Error, AdverseEffect
     message: str
 
-# Helper Functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# Indexes backing the queries below, applied at startup by ensure_indexes
+COLLECTION_INDEXES = {
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email', unique=True),
+        IndexModel([('id', ASCENDING)], name='id', unique=True),
+    ],
+    'user_consent': [IndexModel([('user_id', ASCENDING)], name='user_id', unique=True)],
+    'first_aid_topics': [IndexModel([('id', ASCENDING)], name='id', unique=True)],
+    # Unique on the loader's upsert key, so concurrent imports cannot duplicate a step
+    'first_aid_steps': [
+        IndexModel([('topic_id', ASCENDING), ('step_order', ASCENDING)], name='topic_id_step_order', unique=True),
+    ],
+    'medicines': [
+        IndexModel([('id', ASCENDING)], name='id', unique=True),
+        *[IndexModel(keys, **options) for keys, options in SEARCH_INDEXES],
+    ],
+    # Unique on the loader's upsert key; the medicine_id prefix also serves lookups by medicine
+    **{
+        collection: [IndexModel([('medicine_id', ASCENDING), (item_field, ASCENDING)],
+                                name=f"medicine_id_{item_field}", unique=True)]
+        for collection, (_, item_field, _) in DETAIL_COLLECTIONS.items()
+    },
+    'ai_audit_logs': [
+        IndexModel([('user_id', ASCENDING), ('created_at', ASCENDING)], name='user_id_created_at'),
+        *ttl_index('recorded_at', AUDIT_RETENTION_DAYS, 'recorded_at_ttl'),
+    ],
+    'symptom_checks': [
+        IndexModel([('user_id', ASCENDING), ('created_at', ASCENDING)], name='user_id_created_at'),
+        *ttl_index('recorded_at', SYMPTOM_CHECK_RETENTION_DAYS, 'recorded_at_ttl'),
+    ],
+    **({SYMPTOM_CACHE_COLLECTION: SYMPTOM_CACHE_INDEXES} if SYMPTOM_CACHE_MONGO else {}),
+    **({RATE_LIMIT_COLLECTION: RATE_LIMIT_INDEXES} if RATE_LIMIT_BACKEND == 'mongo' else {}),
+    'pharmacies': [
+        IndexModel([('id', ASCENDING)], name='id', unique=True),
+        IndexModel([('location', GEOSPHERE)], name='location_2dsphere'),
+    ],
+    'doctors': [
+        IndexModel([('id', ASCENDING)], name='id', unique=True),
+        IndexModel([('location', GEOSPHERE)], name='location_2dsphere'),
+    ],
+}
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+# Helper Functions
+def consent_claim(consent: Optional[dict]) -> dict:
+    """Consent state carried in the token so symptom checks can skip the consent lookup"""
+    if not consent:
+        return {'age_confirmed': False, 'version': None}
+    return {'age_confirmed': bool(consent.get('age_confirmed')), 'version': consent.get('consent_version')}
 
-def create_jwt_token(user_id: str) -> str:
+def create_jwt_token(user_id: str, token_version: int = 0, consent: Optional[dict] = None) -> str:
     expiration = datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
     payload = {
         'user_id': user_id,
+        'ver': token_version,
+        'consent': consent_claim(consent),
         'exp': expiration
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
@@ -166,129 +291,163 @@ def decode_jwt_token(token: str) -> dict:
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-async def get_current_user(credentials: HTTPAuthCredentials = Depends(security)):
-    token = credentials.credentials
-    payload = decode_jwt_token(token)
+async def get_token_payload(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    # FastAPI caches dependencies per request, so the token is decoded once
+    return decode_jwt_token(credentials.credentials)
+
+async def get_current_user(payload: dict = Depends(get_token_payload)):
     user_id = payload.get('user_id')
-    user = await db.users.find_one({'id': user_id}, {'_id': 0})
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await db.users.find_one({'id': user_id}, {'_id': 0, 'password_hash': 0})
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        user_cache.set(user_id, user)
+    # Bumping token_version revokes every token issued before it
+    if payload.get('ver', 0) != user.get('token_version', 0):
+        raise HTTPException(status_code=401, detail="Token revoked")
     return user
 
-def detect_emergency(symptoms: List[str]) -> bool:
-    """Detect emergency keywords in symptoms"""
-    symptoms_text = ' '.join(symptoms).lower()
-    return any(keyword in symptoms_text for keyword in EMERGENCY_KEYWORDS)
+async def require_admin(user = Depends(get_current_user)):
+    if user['email'].lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+async def require_metrics_access(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    if METRICS_TOKEN and hmac.compare_digest(credentials.credentials.encode(), METRICS_TOKEN.encode()):
+        return
+    await require_admin(await get_current_user(decode_jwt_token(credentials.credentials)))
+
+async def revoke_user_tokens(user_id: str):
+    await db.users.update_one({'id': user_id}, {'$inc': {'token_version': 1}})
+    user_cache.invalidate(user_id)
+
+def detect_emergency(symptoms: List[str]) -> List[str]:
+    """Emergency terms present in the symptoms; empty when there are none"""
+    return safety_terms['emergency'].find('\n'.join(symptoms))
 
 def check_output_compliance(text: str) -> bool:
     """Check if AI output contains forbidden words"""
-    text_lower = text.lower()
-    return not any(word in text_lower for word in FORBIDDEN_WORDS)
+    term = safety_terms['forbidden'].search(text)
+    if term is not None:
+        LLM_COMPLIANCE_FAILURES.inc()
+        logger.warning(f"AI output matched forbidden term {term!r}")
+    return term is None
 
-async def call_ai_for_symptoms(symptoms: List[str]) -> dict:
-    """Call Claude AI for symptom analysis with safety filters"""
-    
-    # Check for emergency
-    if detect_emergency(symptoms):
-        return {
-            'emergency': True,
-            'summary': 'Emergency situation detected',
-            'possible_associations': [],
-            'risk_level': 'High',
-            'next_steps': ['Call emergency services immediately', 'Seek immediate medical attention'],
-            'disclaimer': 'This is an emergency. Please contact emergency services.'
-        }
-    
-    # Prepare prompt
-    symptoms_str = ', '.join(symptoms)
-    system_message = """You are an educational health information assistant for OTCwise. 
+SYMPTOM_SYSTEM_MESSAGE = """You are an educational health information assistant for OTCwise. 
     You provide NON-DIAGNOSTIC educational insights only. 
     NEVER diagnose conditions, prescribe medications, or use certainty language.
     Always use phrases like 'may be associated with', 'could be linked to', 'it may help to consider'.
     Categorize risk as Low, Moderate, or High and suggest appropriate next steps."""
+
+SYMPTOM_DISCLAIMER = 'This information is educational only and does not replace professional medical advice.'
+
+def build_symptom_prompt(symptoms: List[str]) -> str:
+    symptoms_str = ', '.join(symptoms)
+    return f"""Given these reported symptoms: {symptoms_str}
     
-    prompt = f"""Given these reported symptoms: {symptoms_str}
+    Respond with only a JSON object, no other text, matching this JSON schema:
+    {json.dumps(RESPONSE_SCHEMA)}
     
-    Provide:
-    1. A brief educational summary (2-3 sentences)
-    2. Possible associations (list 2-4 general conditions these MAY be associated with)
-    3. Risk level (Low/Moderate/High)
-    4. Next steps (self-care, pharmacist consultation, doctor visit, or urgent care)
+    - summary: a brief educational summary (2-3 sentences)
+    - possible_associations: 2-4 general conditions these MAY be associated with
+    - risk_level: Low, Moderate or High
+    - next_steps: 2-4 suggestions (self-care, pharmacist consultation, doctor visit, or urgent care)
     
     Remember: Be calm, educational, non-diagnostic. Never say 'you have' or conclude a disease."""
+
+def create_symptom_chat():
+    if LLM_PROVIDER == 'fake':
+        from fake_llm import FakeLlmChat
+        chat_class = FakeLlmChat
+    else:
+        # Imported on first use, so starting a worker doesn't load the LLM SDK
+        from emergentintegrations.llm.chat import LlmChat
+        chat_class = LlmChat
+    chat = chat_class(
+        api_key=EMERGENT_KEY,
+        session_id=str(uuid.uuid4()),
+        system_message=SYMPTOM_SYSTEM_MESSAGE
+    )
+    chat.with_model("anthropic", "claude-sonnet-4-5-20250929")
+    return chat
+
+symptom_llm = LlmClient(create_symptom_chat)
+
+def symptom_message(symptoms: List[str]):
+    if LLM_PROVIDER == 'fake':
+        from fake_llm import FakeUserMessage
+        message_class = FakeUserMessage
+    else:
+        from emergentintegrations.llm.chat import UserMessage
+        message_class = UserMessage
+    return message_class(text=build_symptom_prompt(symptoms))
+
+async def request_symptom_analysis(symptoms: List[str]) -> str:
+    """Call Claude AI and return the raw response, rejecting non-compliant output"""
+    response = await symptom_llm.send_message(symptom_message(symptoms))
+    if not check_output_compliance(response):
+        raise OutputComplianceError("AI output failed compliance check")
+    return response
+
+def parse_symptom_response(response: str) -> dict:
+    return {**parse_symptom_text(response), 'emergency': False, 'disclaimer': SYMPTOM_DISCLAIMER}
+
+def emergency_response() -> dict:
+    return {
+        'emergency': True,
+        'summary': 'Emergency situation detected',
+        'possible_associations': [],
+        'risk_level': 'High',
+        'next_steps': ['Call emergency services immediately', 'Seek immediate medical attention'],
+        'disclaimer': 'This is an emergency. Please contact emergency services.'
+    }
+
+def symptom_fallback() -> dict:
+    return {
+        'emergency': False,
+        'summary': 'Unable to process symptoms at this time.',
+        'possible_associations': ['Please consult a healthcare professional'],
+        'risk_level': 'Moderate',
+        'next_steps': ['Visit a doctor or pharmacist for proper evaluation'],
+        'disclaimer': SYMPTOM_DISCLAIMER
+    }
+
+async def call_ai_for_symptoms(symptoms: List[str]) -> dict:
+    """Call Claude AI for symptom analysis with safety filters"""
+    await safety_terms.ensure_fresh(db)
     
+    # Check for emergency
+    if detect_emergency(symptoms):
+        SYMPTOM_ANALYSES.labels('emergency').inc()
+        return emergency_response()
+    
+    normalized = normalize_symptoms(symptoms)
+    key = symptom_cache_key(normalized)
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_KEY,
-            session_id=str(uuid.uuid4()),
-            system_message=system_message
-        )
-        chat.with_model("anthropic", "claude-sonnet-4-5-20250929")
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
+        response = await symptom_cache.get_or_compute(key, lambda: request_symptom_analysis(list(normalized)))
         
-        # Parse response
-        lines = response.strip().split('\n')
-        summary = ''
-        associations = []
-        risk_level = 'Moderate'
-        next_steps = []
-        
-        current_section = None
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            if 'summary' in line.lower():
-                current_section = 'summary'
-            elif 'association' in line.lower():
-                current_section = 'associations'
-            elif 'risk' in line.lower():
-                current_section = 'risk'
-                if 'low' in line.lower():
-                    risk_level = 'Low'
-                elif 'high' in line.lower():
-                    risk_level = 'High'
-            elif 'next step' in line.lower():
-                current_section = 'steps'
-            elif current_section == 'summary' and not line.startswith(('1.', '2.', '3.', '4.', '-', '*')):
-                summary += line + ' '
-            elif current_section == 'associations' and (line.startswith(('-', '*')) or line[0].isdigit()):
-                associations.append(line.lstrip('- *0123456789. '))
-            elif current_section == 'steps' and (line.startswith(('-', '*')) or line[0].isdigit()):
-                next_steps.append(line.lstrip('- *0123456789. '))
-        
-        if not summary:
-            summary = response[:200]
-        if not associations:
-            associations = ['General health concerns that may require professional evaluation']
-        if not next_steps:
-            next_steps = ['Consider consulting a healthcare professional for personalized advice']
-        
-        # Compliance check
+        # Cached answers are re-checked in case the forbidden word list changed
         if not check_output_compliance(response):
-            raise HTTPException(status_code=500, detail="AI output failed compliance check")
+            await symptom_cache.invalidate(key)
+            raise OutputComplianceError("AI output failed compliance check")
         
-        return {
-            'emergency': False,
-            'summary': summary.strip(),
-            'possible_associations': associations[:4],
-            'risk_level': risk_level,
-            'next_steps': next_steps[:4],
-            'disclaimer': 'This information is educational only and does not replace professional medical advice.'
-        }
+        result = parse_symptom_response(response)
+        SYMPTOM_ANALYSES.labels('ok').inc()
+        return result
     
+    except OutputComplianceError as e:
+        logger.error(f"AI call failed: {e}")
+        SYMPTOM_ANALYSES.labels('fallback_compliance').inc()
+        return symptom_fallback()
+    except LlmUnavailableError as e:
+        logger.warning(f"AI unavailable, serving fallback: {e}")
+        SYMPTOM_ANALYSES.labels('fallback_unavailable').inc()
+        return symptom_fallback()
     except Exception as e:
         logger.error(f"AI call failed: {e}")
-        return {
-            'emergency': False,
-            'summary': 'Unable to process symptoms at this time.',
-            'possible_associations': ['Please consult a healthcare professional'],
-            'risk_level': 'Moderate',
-            'next_steps': ['Visit a doctor or pharmacist for proper evaluation'],
-            'disclaimer': 'This information is educational only and does not replace professional medical advice.'
-        }
+        SYMPTOM_ANALYSES.labels('fallback_error').inc()
+        return symptom_fallback()
 
 # Auth Endpoints
 @api_router.post("/auth/register")
@@ -304,13 +463,17 @@ async def register(user_data: UserRegister):
     user_doc = {
         'id': user_id,
         'email': user_data.email,
-        'password_hash': hash_password(user_data.password),
+        'password_hash': await password_hasher.hash(user_data.password),
         'is_active': True,
+        'token_version': 0,
         'created_at': datetime.now(timezone.utc).isoformat(),
         'last_login': datetime.now(timezone.utc).isoformat()
     }
     
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create consent record
     consent_doc = {
@@ -318,28 +481,39 @@ async def register(user_data: UserRegister):
         'user_id': user_id,
         'age_confirmed': user_data.age_confirmed,
         'disclaimer_accepted': True,
-        'consent_version': '1.0',
+        'consent_version': CONSENT_VERSION,
         'accepted_at': datetime.now(timezone.utc).isoformat()
     }
     await db.user_consent.insert_one(consent_doc)
     
-    token = create_jwt_token(user_id)
+    token = create_jwt_token(user_id, consent=consent_doc)
     return {'token': token, 'user_id': user_id}
 
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
     user = await db.users.find_one({'email': credentials.email}, {'_id': 0})
-    if not user or not verify_password(credentials.password, user['password_hash']):
+    if not user or not await password_hasher.verify(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    update = {'last_login': datetime.now(timezone.utc).isoformat()}
+    # Upgrade hashes made with a different cost factor, unless the pool is busy
+    if password_hasher.needs_rehash(user['password_hash']) and not password_hasher.saturated:
+        update['password_hash'] = await password_hasher.hash(credentials.password)
+    
     await db.users.update_one(
         {'email': credentials.email},
-        {'$set': {'last_login': datetime.now(timezone.utc).isoformat()}}
+        {'$set': update}
     )
     
-    token = create_jwt_token(user['id'])
+    consent = await db.user_consent.find_one({'user_id': user['id']}, {'_id': 0})
+    token = create_jwt_token(user['id'], user.get('token_version', 0), consent)
     return {'token': token, 'user_id': user['id']}
 
+@api_router.post("/auth/logout-all")
+async def logout_all(user = Depends(get_current_user)):
+    await revoke_user_tokens(user['id'])
+    return {'message': 'All sessions revoked'}
+
 # Consent Endpoints
 @api_router.get("/consent/status", response_model=ConsentStatus)
 async def get_consent_status(user = Depends(get_current_user)):
@@ -348,18 +522,21 @@ async def get_consent_status(user = Depends(get_current_user)):
         return ConsentStatus(
             age_confirmed=False,
             disclaimer_accepted=False,
-            consent_version='1.0'
+            consent_version=CONSENT_VERSION,
+            current_version=CONSENT_VERSION
         )
-    return ConsentStatus(**consent)
+    return ConsentStatus(**consent, current_version=CONSENT_VERSION)
 
 @api_router.post("/consent/accept")
 async def accept_consent(consent: ConsentAccept, user = Depends(get_current_user)):
+    if consent.consent_version != CONSENT_VERSION:
+        raise HTTPException(status_code=409, detail=f"Consent version {CONSENT_VERSION} must be accepted")
     consent_doc = {
         'id': str(uuid.uuid4()),
         'user_id': user['id'],
         'age_confirmed': consent.age_confirmed,
         'disclaimer_accepted': True,
-        'consent_version': consent.consent_version,
+        'consent_version': CONSENT_VERSION,
         'accepted_at': datetime.now(timezone.utc).isoformat()
     }
     
@@ -369,232 +546,253 @@ async def accept_consent(consent: ConsentAccept, user = Depends(get_current_user
         upsert=True
     )
     
-    return {'message': 'Consent recorded'}
+    # The reissued token carries the new consent claim; older tokens keep the claim they were issued with
+    token = create_jwt_token(user['id'], user.get('token_version', 0), consent_doc)
+    return {'message': 'Consent recorded', 'token': token}
 
 # First Aid Endpoints
 @api_router.get("/first-aid/topics", response_model=List[FirstAidTopic])
-async def get_first_aid_topics():
-    topics = await db.first_aid_topics.find({}, {'_id': 0}).to_list(100)
-    if not topics:
-        # Seed data
-        default_topics = [
-            {'id': str(uuid.uuid4()), 'title': 'Burns', 'description': 'Treatment for minor and major burns', 'icon': 'flame'},
-            {'id': str(uuid.uuid4()), 'title': 'Bleeding', 'description': 'How to stop and manage bleeding', 'icon': 'droplet'},
-            {'id': str(uuid.uuid4()), 'title': 'Choking', 'description': 'Emergency response for choking', 'icon': 'wind'},
-            {'id': str(uuid.uuid4()), 'title': 'Fractures', 'description': 'Managing broken bones', 'icon': 'bone'},
-            {'id': str(uuid.uuid4()), 'title': 'Poisoning', 'description': 'What to do in poisoning cases', 'icon': 'alert-triangle'},
-        ]
-        await db.first_aid_topics.insert_many(default_topics)
-        topics = default_topics
-    return topics
+async def get_first_aid_topics(request: Request):
+    snapshot = await first_aid_content.ensure_fresh(db)
+    return cached_response(request, snapshot.topics, snapshot.etag)
+
+@api_router.get("/first-aid/bundle")
+async def get_first_aid_bundle(request: Request):
+    """All topics and their steps in one payload, for offline use"""
+    snapshot = await first_aid_content.ensure_fresh(db)
+    return cached_response(request, snapshot.bundle, snapshot.etag)
 
 @api_router.get("/first-aid/{topic_id}", response_model=FirstAidDetail)
-async def get_first_aid_detail(topic_id: str):
-    topic = await db.first_aid_topics.find_one({'id': topic_id}, {'_id': 0})
-    if not topic:
+async def get_first_aid_detail(topic_id: str, request: Request):
+    snapshot = await first_aid_content.ensure_fresh(db)
+    detail = snapshot.details.get(topic_id)
+    if detail is None:
         raise HTTPException(status_code=404, detail="Topic not found")
-    
-    steps = await db.first_aid_steps.find({'topic_id': topic_id}, {'_id': 0}).sort('step_order', 1).to_list(100)
-    
-    # If no steps, create default ones
-    if not steps:
-        default_steps = [
-            {'id': str(uuid.uuid4()), 'topic_id': topic_id, 'step_order': 1, 'instruction': 'Assess the situation and ensure safety for yourself and the person.'},
-            {'id': str(uuid.uuid4()), 'topic_id': topic_id, 'step_order': 2, 'instruction': 'Call emergency services if the situation is severe.'},
-            {'id': str(uuid.uuid4()), 'topic_id': topic_id, 'step_order': 3, 'instruction': 'Follow specific first aid procedures for this condition.'},
-        ]
-        await db.first_aid_steps.insert_many(default_steps)
-        steps = default_steps
-    
-    return FirstAidDetail(
-        id=topic['id'],
-        title=topic['title'],
-        description=topic['description'],
-        steps=[FirstAidStep(**step) for step in steps],
-        emergency_note='If condition worsens or you\'re unsure, seek professional medical help immediately.'
-    )
+    return cached_response(request, detail, snapshot.etag)
 
 # Medicine Endpoints
 @api_router.get("/medicines/search")
-async def search_medicines(query: str):
-    medicines = await db.medicines.find(
-        {'$or': [
-            {'brand_name': {'$regex': query, '$options': 'i'}},
-            {'generic_name': {'$regex': query, '$options': 'i'}}
-        ]},
-        {'_id': 0}
-    ).to_list(20)
-    
-    if not medicines:
-        # Seed some sample data
-        sample_medicines = [
-            {
-                'id': str(uuid.uuid4()),
-                'brand_name': 'Tylenol',
-                'generic_name': 'Acetaminophen',
-                'drug_class': 'Analgesic, Antipyretic'
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'brand_name': 'Advil',
-                'generic_name': 'Ibuprofen',
-                'drug_class': 'NSAID'
-            }
-        ]
-        await db.medicines.insert_many(sample_medicines)
-        return sample_medicines
-    
-    return medicines
+async def search_medicines(query: str, limit: int = SEARCH_PAGE_SIZE, cursor: Optional[str] = None):
+    return await search_medicine_catalog(db, query, limit=limit, cursor=cursor)
 
 @api_router.get("/medicines/{medicine_id}", response_model=MedicineInfo)
 async def get_medicine_info(medicine_id: str):
-    medicine = await db.medicines.find_one({'id': medicine_id}, {'_id': 0})
-    if not medicine:
-        raise HTTPException(status_code=404, detail="Medicine not found")
-    
-    # Fetch related data
-    indications = await db.medicine_indications.find({'medicine_id': medicine_id}, {'_id': 0}).to_list(100)
-    contraindications = await db.medicine_contraindications.find({'medicine_id': medicine_id}, {'_id': 0}).to_list(100)
-    interactions = await db.medicine_interactions.find({'medicine_id': medicine_id}, {'_id': 0}).to_list(100)
-    adverse_effects = await db.medicine_adverse_effects.find({'medicine_id': medicine_id}, {'_id': 0}).to_list(100)
-    cautions = await db.medicine_cautions.find({'medicine_id': medicine_id}, {'_id': 0}).to_list(100)
-    
-    medicine['indications'] = [item['indication'] for item in indications] if indications else ['General pain relief']
-    medicine['contraindications'] = [item['contraindication'] for item in contraindications] if contraindications else ['Known allergy to this medication']
-    medicine['interactions'] = [item['interaction'] for item in interactions] if interactions else ['May interact with other medications']
-    medicine['adverse_effects'] = [item['adverse_effect'] for item in adverse_effects] if adverse_effects else ['Nausea, dizziness (rare)']
-    medicine['cautions'] = [item['caution'] for item in cautions] if cautions else ['Use as directed on package']
-    medicine['standard_adult_dose'] = medicine.get('standard_adult_dose', 'Refer to package instructions (reference only, not personalized)')
+    body = medicine_detail_cache.get(medicine_id)
+    if body is None:
+        medicine = await fetch_medicine_detail(db, medicine_id)
+        if not medicine:
+            raise HTTPException(status_code=404, detail="Medicine not found")
+        # Encoded once per cache fill; hits skip model construction and response validation
+        body = dumps(model_document(MedicineInfo, medicine))
+        medicine_detail_cache.set(medicine_id, body)
+    return json_response(body)
+
+async def match_medicines_in_text(text: str) -> dict:
+    """Search for medicine names in OCR-extracted text"""
+    await medicine_name_index.ensure_fresh(db)
+    ranked = medicine_name_index.match(text, limit=5)
+    if ranked:
+        ids = [medicine_id for medicine_id, _ in ranked]
+        found = await db.medicines.find({'id': {'$in': ids}}, MEDICINE_PROJECTION).to_list(len(ids))
+        by_id = {medicine['id']: medicine for medicine in found}
+        medicines = [by_id[medicine_id] for medicine_id in ids if medicine_id in by_id]
+        if medicines:
+            return {'medicines': medicines, 'extracted_text': text[:200]}
     
-    return MedicineInfo(**medicine)
+    return {'medicines': [], 'extracted_text': text[:200], 'message': 'No medicines identified'}
+
+async def identify_from_image(contents: bytes) -> dict:
+    text = await ocr_pool.extract_text(contents)
+    return await match_medicines_in_text(text)
 
 @api_router.post("/medicines/identify")
 async def identify_medicine(file: UploadFile = File(...), user = Depends(get_current_user)):
+    contents = await read_upload(file)
     try:
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        
-        # OCR
-        text = pytesseract.image_to_string(image)
-        
-        # Search for medicine names in extracted text
-        words = text.split()
-        for word in words:
-            if len(word) > 3:
-                medicines = await db.medicines.find(
-                    {'$or': [
-                        {'brand_name': {'$regex': word, '$options': 'i'}},
-                        {'generic_name': {'$regex': word, '$options': 'i'}}
-                    ]},
-                    {'_id': 0}
-                ).to_list(5)
-                
-                if medicines:
-                    return {'medicines': medicines, 'extracted_text': text[:200]}
-        
-        return {'medicines': [], 'extracted_text': text[:200], 'message': 'No medicines identified'}
-    
+        return await identify_from_image(contents)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Image identification failed: {e}")
         raise HTTPException(status_code=400, detail="Failed to process image")
 
+@api_router.post("/medicines/identify/jobs", status_code=202)
+async def submit_identify_job(file: UploadFile = File(...), user = Depends(get_current_user)):
+    contents = await read_upload(file)
+    job_id = ocr_jobs.submit(user['id'], lambda: identify_from_image(contents))
+    return {'job_id': job_id, 'status': 'pending'}
+
+@api_router.get("/medicines/identify/jobs/{job_id}")
+async def get_identify_job(job_id: str, user = Depends(get_current_user)):
+    job = ocr_jobs.get(job_id, user['id'])
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 # Symptom Check Endpoint
-@api_router.post("/symptoms/check", response_model=SymptomResponse)
-async def check_symptoms(symptom_request: SymptomRequest, user = Depends(get_current_user)):
-    # Check consent
-    consent = await db.user_consent.find_one({'user_id': user['id']}, {'_id': 0})
-    if not consent or not consent.get('age_confirmed'):
+async def require_consent(user: dict, payload: dict):
+    claim = payload.get('consent')
+    if claim is None:
+        # Token issued before consent claims existed
+        claim = consent_claim(await db.user_consent.find_one({'user_id': user['id']}, {'_id': 0}))
+    if not claim['age_confirmed'] or claim['version'] != CONSENT_VERSION:
         raise HTTPException(status_code=403, detail="Consent required")
-    
-    result = await call_ai_for_symptoms(symptom_request.symptoms)
-    
+
+async def record_symptom_check(user: dict, symptoms: List[str], result: dict):
+    """Queue audit and history records; audit_writer batches them into Mongo"""
     # Log audit
+    recorded_at = datetime.now(timezone.utc)
     audit_log = {
         'id': str(uuid.uuid4()),
         'user_id': user['id'],
-        'input_summary': ', '.join(symptom_request.symptoms),
+        'input_summary': ', '.join(symptoms),
         'output_summary': result['summary'],
         'emergency_triggered': result.get('emergency', False),
-        'created_at': datetime.now(timezone.utc).isoformat()
+        'emergency_terms': detect_emergency(symptoms),
+        'created_at': recorded_at.isoformat(),
+        'recorded_at': recorded_at
     }
-    await db.ai_audit_logs.insert_one(audit_log)
+    await audit_writer.enqueue('ai_audit_logs', audit_log)
     
     # Store symptom check
     symptom_check = {
         'id': str(uuid.uuid4()),
         'user_id': user['id'],
-        'symptoms': symptom_request.symptoms,
+        'symptoms': symptoms,
         'risk_level': result['risk_level'],
         'summary': result['summary'],
-        'created_at': datetime.now(timezone.utc).isoformat()
+        'created_at': recorded_at.isoformat(),
+        'recorded_at': recorded_at
     }
-    await db.symptom_checks.insert_one(symptom_check)
+    await audit_writer.enqueue('symptom_checks', symptom_check)
+
+@api_router.post("/symptoms/check", response_model=SymptomResponse)
+async def check_symptoms(symptom_request: SymptomRequest, user = Depends(get_current_user),
+                         payload: dict = Depends(get_token_payload)):
+    await require_consent(user, payload)
+    
+    result = await call_ai_for_symptoms(symptom_request.symptoms)
+    await record_symptom_check(user, symptom_request.symptoms, result)
     
     return SymptomResponse(**result)
 
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Keeps references to audit writes scheduled after a stream ends
+_pending_records = set()
+
+async def stream_symptom_events(symptoms: List[str], user: dict):
+    yield sse_event('status', {'state': 'analyzing'})
+    result = None
+    try:
+        await safety_terms.ensure_fresh(db)
+        if detect_emergency(symptoms):
+            SYMPTOM_ANALYSES.labels('emergency').inc()
+            result = emergency_response()
+        else:
+            normalized = normalize_symptoms(symptoms)
+            key = symptom_cache_key(normalized)
+            cached = await symptom_cache.get(key)
+            parser = SymptomResponseParser(check_line=check_output_compliance)
+            try:
+                start = time.perf_counter()
+                if cached is not None:
+                    events = parser.feed(cached)
+                    for event, data in events:
+                        yield sse_event(event, data)
+                else:
+                    message = symptom_message(list(normalized))
+                    async for chunk in symptom_llm.stream_message(message):
+                        for event, data in parser.feed(chunk):
+                            yield sse_event(event, data)
+                for event, data in parser.finish():
+                    yield sse_event(event, data)
+                result = {**parser.result(), 'emergency': False, 'disclaimer': SYMPTOM_DISCLAIMER}
+                SYMPTOM_ANALYSES.labels('ok').inc()
+                if cached is None:
+                    await symptom_cache.set(key, parser.text, time.perf_counter() - start)
+            except OutputComplianceError as e:
+                logger.error(f"AI call failed: {e}")
+                SYMPTOM_ANALYSES.labels('fallback_compliance').inc()
+                if cached is not None:
+                    await symptom_cache.invalidate(key)
+                result = symptom_fallback()
+            except LlmUnavailableError as e:
+                logger.warning(f"AI unavailable, serving fallback: {e}")
+                SYMPTOM_ANALYSES.labels('fallback_unavailable').inc()
+                result = symptom_fallback()
+            except Exception as e:
+                logger.error(f"AI call failed: {e}")
+                SYMPTOM_ANALYSES.labels('fallback_error').inc()
+                result = symptom_fallback()
+        yield sse_event('result', result)
+    finally:
+        # Scheduled rather than awaited so the audit record survives a client disconnect
+        if result is not None:
+            task = asyncio.create_task(record_symptom_check(user, symptoms, result))
+            _pending_records.add(task)
+            task.add_done_callback(_pending_records.discard)
+
+@api_router.post("/symptoms/check/stream")
+async def check_symptoms_stream(symptom_request: SymptomRequest, user = Depends(get_current_user),
+                                payload: dict = Depends(get_token_payload)):
+    """Server-Sent Events variant of /symptoms/check; sections are sent as they are parsed"""
+    await require_consent(user, payload)
+    return StreamingResponse(
+        stream_symptom_events(symptom_request.symptoms, user),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api_router.get("/symptoms/cache-stats")
+async def get_symptom_cache_stats(user = Depends(require_admin)):
+    return symptom_cache.stats()
+
 # Location Endpoints
+async def find_nearby(collection, grid, lat: float, lng: float, radius_km: float, limit: int, offset: int,
+                      open_now: bool = False, specialty: Optional[str] = None) -> List[dict]:
+    radius_km, limit, offset = clamp_page(radius_km, limit, offset)
+    if GEO_BACKEND == 'memory':
+        await grid.ensure_fresh(collection)
+        return grid.nearest(lat, lng, radius_km, limit, offset, open_now, specialty)
+    if locator_cache.enabled:
+        async def fetch_candidates(center_lat, center_lng, reach_km, count, cell_specialty):
+            return await near_providers(collection, center_lat, center_lng, reach_km, count,
+                                        query=provider_filter(specialty=cell_specialty),
+                                        projection=CANDIDATE_PROJECTION)
+        page = await locator_cache.nearby(collection.name, fetch_candidates, lat, lng, radius_km,
+                                          limit, offset, open_now, specialty)
+        if page is not None:
+            return page
+    return await near_providers(collection, lat, lng, radius_km, limit, offset, provider_filter(open_now, specialty))
+
+def providers_changed(collection, grid):
+    grid.invalidate()
+    locator_cache.invalidate(collection.name)
+
 @api_router.get("/locator/pharmacies")
-async def get_pharmacies(lat: float, lng: float):
-    # For MVP, return sample data. In production, integrate with real location service
-    pharmacies = await db.pharmacies.find({}, {'_id': 0}).to_list(20)
-    
-    if not pharmacies:
-        # Seed sample data
-        sample_pharmacies = [
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'City Pharmacy',
-                'address': '123 Main Street',
-                'latitude': lat + 0.01,
-                'longitude': lng + 0.01,
-                'phone': '+1-555-0100'
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'Health Plus Pharmacy',
-                'address': '456 Oak Avenue',
-                'latitude': lat - 0.01,
-                'longitude': lng - 0.01,
-                'phone': '+1-555-0200'
-            }
-        ]
-        await db.pharmacies.insert_many(sample_pharmacies)
-        pharmacies = sample_pharmacies
-    
-    return pharmacies
+async def get_pharmacies(lat: float, lng: float, radius_km: float = GEO_DEFAULT_RADIUS_KM,
+                         open_now: bool = False, limit: int = 20, offset: int = 0):
+    return await find_nearby(db.pharmacies, pharmacy_grid, lat, lng, radius_km, limit, offset, open_now)
 
 @api_router.get("/locator/doctors")
-async def get_doctors(lat: float, lng: float):
-    doctors = await db.doctors.find({}, {'_id': 0}).to_list(20)
-    
-    if not doctors:
-        # Seed sample data
-        sample_doctors = [
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'Dr. Sarah Johnson',
-                'specialty': 'General Practice',
-                'address': '789 Elm Street',
-                'latitude': lat + 0.02,
-                'longitude': lng + 0.02,
-                'phone': '+1-555-0300'
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'Dr. Michael Chen',
-                'specialty': 'Family Medicine',
-                'address': '321 Pine Road',
-                'latitude': lat - 0.02,
-                'longitude': lng - 0.02,
-                'phone': '+1-555-0400'
-            }
-        ]
-        await db.doctors.insert_many(sample_doctors)
-        doctors = sample_doctors
-    
-    return doctors
+async def get_doctors(lat: float, lng: float, radius_km: float = GEO_DEFAULT_RADIUS_KM,
+                      open_now: bool = False, specialty: Optional[str] = None, limit: int = 20, offset: int = 0):
+    return await find_nearby(db.doctors, doctor_grid, lat, lng, radius_km, limit, offset, open_now, specialty)
+
+@api_router.get("/locator/cache-stats")
+async def get_locator_cache_stats(user = Depends(require_admin)):
+    return locator_cache.stats()
 
 # Feedback Endpoint
+async def record_stored_rollups(collection: str, documents: List[dict]):
+    try:
+        await record_rollups(db, collection, documents)
+    except Exception as e:
+        # The records are stored; the rollup backfill picks up anything missed here
+        logger.error(f"Rollup update for {len(documents)} {collection} records failed: {e}")
+
 @api_router.post("/feedback")
 async def submit_feedback(feedback: FeedbackSubmit):
     feedback_doc = {
@@ -605,11 +803,227 @@ async def submit_feedback(feedback: FeedbackSubmit):
     }
     
     await db.feedback.insert_one(feedback_doc)
+    await record_stored_rollups('feedback', [feedback_doc])
     return {'message': 'Feedback received'}
 
+# Admin Endpoints
+@api_router.get("/admin/analytics/rollups")
+async def get_analytics_rollups(granularity: str = 'day', start: Optional[datetime] = None,
+                                end: Optional[datetime] = None, user = Depends(require_admin)):
+    """Symptom check, emergency and feedback counts per hour or day, from the rollup collection"""
+    return await read_rollups(db, granularity, start, end)
+
+# Metrics Endpoint
+# Read at scrape time from the components that already track these
+metrics_registry.gauge('bcrypt_pending', 'Password hashing jobs running or queued',
+                       function=lambda: password_hasher.pending)
+metrics_registry.gauge('audit_queue_depth', 'Audit and history records waiting to be written',
+                       function=lambda: audit_writer.stats()['queued'])
+metrics_registry.gauge('symptom_cache_hit_ratio', 'Symptom analyses answered from cache',
+                       function=lambda: symptom_cache.stats()['hit_rate'])
+metrics_registry.gauge('medicine_detail_cache_hit_ratio', 'Medicine details answered from cache',
+                       function=lambda: medicine_detail_cache.stats()['hit_rate'])
+metrics_registry.gauge('locator_cache_hit_ratio', 'Locator queries answered from cached cells',
+                       function=lambda: locator_cache.stats()['hit_rate'])
+metrics_registry.gauge('user_cache_hit_ratio', 'Authenticated requests that skipped the user lookup',
+                       function=lambda: user_cache.stats()['hit_rate'])
+metrics_registry.gauge('app_ready', 'Whether startup warmup has finished',
+                       function=lambda: float(app.state.ready))
+metrics_registry.gauge('mongo_pool_max_connections', 'Configured maximum connections per server pool',
+                       function=lambda: MONGO_MAX_POOL_SIZE)
+
+@api_router.get("/metrics", dependencies=[Depends(require_metrics_access)])
+async def get_metrics():
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+# Readiness probe: 503 until warmup has finished, so load balancers hold traffic back
+@api_router.get("/health/ready")
+async def get_readiness(request: Request):
+    if not request.app.state.ready:
+        return ORJSONResponse({'status': 'warming up'}, status_code=503)
+    return {'status': 'ready'}
+
+# Startup and shutdown
+def catalog_loaded(catalog: str):
+    """Drop in-process indexes and caches derived from a reloaded catalog"""
+    if catalog in FIRST_AID_CATALOGS:
+        first_aid_content.invalidate()
+    if catalog == 'medicines':
+        medicine_name_index.invalidate()
+    if catalog == 'medicines' or catalog in DETAIL_COLLECTIONS:
+        medicine_detail_cache.invalidate()
+    elif catalog == 'pharmacies':
+        providers_changed(db.pharmacies, pharmacy_grid)
+    elif catalog == 'doctors':
+        providers_changed(db.doctors, doctor_grid)
+
+async def load_catalogs(index_provisioning: asyncio.Task):
+    # Unique indexes first, so workers loading concurrently upsert into the same records
+    await index_provisioning
+    try:
+        loaded = await load_directory(mongo.database, Path(CATALOG_DIR), only_missing=CATALOG_LOAD == 'missing')
+    except Exception as e:
+        logger.error(f"Catalog load from {CATALOG_DIR} failed: {e}")
+        return
+    for catalog, counts in loaded.items():
+        catalog_loaded(catalog)
+        logger.info(f"Loaded {catalog}: {counts['inserted']} inserted, {counts['updated']} updated")
+
+async def prepare_medicine_search():
+    backfilled = await backfill_search_fields(mongo.database)
+    if backfilled:
+        logger.info(f"Backfilled search fields on {backfilled} medicines")
+
+async def prepare_locator():
+    for name in ('pharmacies', 'doctors'):
+        backfilled = await backfill_locations(mongo.database[name])
+        if backfilled:
+            logger.info(f"Backfilled locations on {backfilled} {name}")
+
+async def wait_for_mongo(max_delay: float = 10.0):
+    delay = 0.5
+    while True:
+        try:
+            await mongo.ping()
+            return
+        except Exception as e:
+            logger.warning(f"MongoDB not reachable yet, retrying in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+async def warm_up(app: FastAPI, catalog_loading: Optional[asyncio.Task]):
+    """Backfill, then load everything the first requests would otherwise load; readiness flips at the end"""
+    start = time.perf_counter()
+    await wait_for_mongo()
+    await prepare_medicine_search()
+    await prepare_locator()
+    # A finished load invalidates the caches below, so preloading before it would be wasted
+    if catalog_loading is not None:
+        await catalog_loading
+    # Each of these would be loaded by the first request needing it, so a failure here is not fatal
+    preloads = {
+        'safety terms': lambda: safety_terms.ensure_fresh(db),
+        'medicine name index': lambda: medicine_name_index.ensure_fresh(db),
+        'first aid content': lambda: first_aid_content.ensure_fresh(db),
+    }
+    if GEO_BACKEND == 'memory':
+        preloads['pharmacy grid'] = lambda: pharmacy_grid.ensure_fresh(db.pharmacies)
+        preloads['doctor grid'] = lambda: doctor_grid.ensure_fresh(db.doctors)
+    if OCR_PREFORK:
+        preloads['OCR workers'] = ocr_pool.warm
+    for name, preload in preloads.items():
+        try:
+            await preload()
+        except Exception as e:
+            logger.error(f"Warmup of {name} failed: {e}")
+    app.state.ready = True
+    logger.info(f"Warmup finished in {time.perf_counter() - start:.2f}s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Opens the MongoDB client and starts background work; shutdown undoes it in reverse.
+
+    Startup returns without waiting on MongoDB, so the worker binds right
+    away; ``warm_up`` runs in the background and /api/health/ready reports
+    when it is done. Index builds, catalog loads and backfills use
+    ``mongo.database``, which reads from the primary whatever the
+    collection routing says.
+    """
+    app.state.ready = False
+    mongo.connect()
+    # Optional second tier for the LLM response cache
+    if SYMPTOM_CACHE_MONGO:
+        symptom_cache.use_collection(db[SYMPTOM_CACHE_COLLECTION])
+    audit_writer.start(db, on_inserted=record_stored_rollups)
+
+    event_loop_monitor = None
+    if METRICS_ENABLED:
+        event_loop_monitor = asyncio.create_task(monitor_event_loop())
+        slow_request_profiler.start()
+
+    # Runs in the background so index builds on large collections don't delay startup
+    index_provisioning = asyncio.create_task(ensure_indexes(mongo.database, COLLECTION_INDEXES))
+    catalog_loading = None
+    if CATALOG_LOAD != 'off':
+        catalog_loading = asyncio.create_task(load_catalogs(index_provisioning))
+    app.state.index_provisioning = index_provisioning
+    app.state.catalog_loading = catalog_loading
+
+    warmup = asyncio.create_task(warm_up(app, catalog_loading))
+
+    medicine_cache_watcher = None
+    if MEDICINE_CACHE_WATCH:
+        medicine_cache_watcher = asyncio.create_task(supervise_detail_watch(db))
+
+    try:
+        yield
+    finally:
+        background = [task for task in (medicine_cache_watcher, warmup, catalog_loading, event_loop_monitor) if task]
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        slow_request_profiler.stop()
+        await audit_writer.stop()
+        mongo.close()
+        password_hasher.shutdown()
+        ocr_pool.shutdown()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
 # Include router
 app.include_router(api_router)
 
+# Rate limits on the expensive routes: LLM calls, OCR and bcrypt
+RATE_LIMIT_SYMPTOMS = parse_limit(os.environ.get('RATE_LIMIT_SYMPTOMS', '10/minute'))
+RATE_LIMIT_IDENTIFY = parse_limit(os.environ.get('RATE_LIMIT_IDENTIFY', '10/minute'))
+RATE_LIMIT_AUTH = parse_limit(os.environ.get('RATE_LIMIT_AUTH', '20/minute'))
+
+RATE_LIMIT_RULES = {
+    route: rule
+    for routes, rule in (
+        ([('POST', '/api/symptoms/check'), ('POST', '/api/symptoms/check/stream')],
+         RATE_LIMIT_SYMPTOMS and Rule('symptoms', RATE_LIMIT_SYMPTOMS)),
+        ([('POST', '/api/medicines/identify'), ('POST', '/api/medicines/identify/jobs')],
+         RATE_LIMIT_IDENTIFY and Rule('identify', RATE_LIMIT_IDENTIFY)),
+        ([('POST', '/api/auth/login'), ('POST', '/api/auth/register')],
+         RATE_LIMIT_AUTH and Rule('auth', RATE_LIMIT_AUTH, key='ip')),
+    )
+    if rule
+    for route in routes
+}
+
+def rate_limit_identity(request: Request) -> Optional[str]:
+    """User id from a valid bearer token, without the database lookup get_current_user does"""
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM]).get('user_id')
+    except jwt.InvalidTokenError:
+        return None
+
+# Innermost, so rate-limited uploads are refused before any of the body is read
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    paths=('/api/medicines/identify', '/api/medicines/identify/jobs'),
+)
+
+# Added before CORS so CORS wraps it and 429s carry CORS headers
+app.add_middleware(
+    RateLimitMiddleware,
+    rules=RATE_LIMIT_RULES,
+    backend=create_backend(db),
+    identify=rate_limit_identity,
+)
+
+# Outside the rate limiter so rejected requests are counted too
+app.add_middleware(
+    MetricsMiddleware,
+    router_app=app,
+    exclude=('/api/metrics', '/api/health/ready'),
+    profiler=slow_request_profiler,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -623,7 +1037,3 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
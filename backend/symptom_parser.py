@@ -0,0 +1,319 @@
+"""Parser for LLM symptom analyses.
+
+The model is asked for a JSON object matching ``RESPONSE_SCHEMA``. The
+parser reads it in a single pass and validates each top-level member as
+soon as it closes, so streamed responses yield sections while the rest is
+still arriving. Output that is not JSON goes through a tolerant fallback:
+older cached answers, models that ignore the format, and truncated or
+malformed objects. That fallback reads section headings, or salvages
+whatever complete fields a broken object still contains.
+"""
+import json
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+FIELDS = ('summary', 'possible_associations', 'risk_level', 'next_steps')
+LIST_FIELDS = ('possible_associations', 'next_steps')
+RISK_LEVELS = {'low': 'Low', 'moderate': 'Moderate', 'medium': 'Moderate', 'high': 'High'}
+DEFAULT_RISK_LEVEL = 'Moderate'
+DEFAULT_SUMMARY = 'These symptoms can have several explanations; a healthcare professional can help put them in context.'
+DEFAULT_ASSOCIATIONS = ['General health concerns that may require professional evaluation']
+DEFAULT_NEXT_STEPS = ['Consider consulting a healthcare professional for personalized advice']
+MAX_ITEMS = 4
+
+RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'summary': {'type': 'string', 'description': 'Brief educational summary, 2-3 sentences'},
+        'possible_associations': {'type': 'array', 'items': {'type': 'string'}, 'minItems': 2, 'maxItems': 4},
+        'risk_level': {'type': 'string', 'enum': ['Low', 'Moderate', 'High']},
+        'next_steps': {'type': 'array', 'items': {'type': 'string'}, 'minItems': 2, 'maxItems': 4},
+    },
+    'required': list(FIELDS),
+}
+
+_RISK = re.compile(r'\b(low|moderate|medium|high)\b', re.IGNORECASE)
+# A whole string (group 1 unset if it is still open) or a structural character
+_JSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*(")?|[{}\[\],]')
+_DECODER = json.JSONDecoder()
+_HEADING = re.compile(
+    r'^[#*_\s]*(?:\d+[.)]\s*)?(summary|possible associations|associations|risk(?: level)?|next steps)'
+    r'[*_\s]*(?::|$)[*_\s]*(.*)$',
+    re.IGNORECASE)
+_LIST_ITEM = re.compile(r'^(?:[-*•]|\d+[.)])\s+(.*)$')
+_HEADING_FIELDS = {
+    'summary': 'summary', 'possible associations': 'possible_associations', 'associations': 'possible_associations',
+    'risk': 'risk_level', 'risk level': 'risk_level', 'next steps': 'next_steps',
+}
+
+
+class OutputComplianceError(Exception):
+    pass
+
+
+def validate_field(name: str, value) -> Optional[object]:
+    """Coerce one model-supplied field to the SymptomResponse shape, or None if unusable"""
+    if name == 'summary':
+        if isinstance(value, str) and value.strip():
+            return ' '.join(value.split())
+    elif name == 'risk_level':
+        match = _RISK.search(value) if isinstance(value, str) else None
+        if match:
+            return RISK_LEVELS[match.group(1).lower()]
+    elif name in LIST_FIELDS:
+        if isinstance(value, str):
+            value = [value]
+        if isinstance(value, list):
+            items = [' '.join(item.split()) for item in value if isinstance(item, str) and item.strip()]
+            if items:
+                return items[:MAX_ITEMS]
+    return None
+
+
+class _JsonMembers:
+    """Incremental scanner yielding each top-level ``key: value`` member of one object"""
+
+    def __init__(self):
+        self.buffer = ''
+        self.started = False
+        self.closed = False
+        self._pos = 0
+        self._depth = 0
+        self._member_start = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, object]]:
+        self.buffer += chunk
+        buffer = self.buffer
+        if not self.started:
+            start = buffer.find('{', self._pos)
+            if start < 0:
+                self._pos = len(buffer)
+                return []
+            # Whole responses (non-streamed or cached) decode in one call
+            try:
+                value, end = _DECODER.raw_decode(buffer, start)
+            except ValueError:
+                pass
+            else:
+                if isinstance(value, dict):
+                    self.started = self.closed = True
+                    self._pos = end
+                    return list(value.items())
+            self.started = True
+            self._depth = 1
+            self._pos = self._member_start = start + 1
+        members = []
+        pos = self._pos
+        while not self.closed:
+            match = _JSON_TOKEN.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            token = match.group()
+            if token[0] == '"':
+                if match.group(1) is None:
+                    # String continues in a later chunk; rescan it from the start
+                    pos = match.start()
+                    break
+                pos = match.end()
+                continue
+            pos = match.end()
+            if token in '{[':
+                self._depth += 1
+            elif token in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    members.extend(self._member(match.start()))
+                    self.closed = True
+            elif self._depth == 1:
+                members.extend(self._member(match.start()))
+                self._member_start = pos
+        self._pos = pos
+        return members
+
+    def _member(self, end: int) -> List[Tuple[str, object]]:
+        text = self.buffer[self._member_start:end].strip()
+        if not text:
+            return []
+        return list(json.loads('{' + text + '}').items())
+
+
+def _salvage(text: str) -> Dict[str, object]:
+    """Complete fields recoverable from truncated or malformed JSON"""
+    fields = {}
+    for name in FIELDS:
+        match = re.search(r'"%s"\s*:\s*' % name, text)
+        if not match:
+            continue
+        rest = text[match.end():]
+        if rest.startswith('['):
+            # Only fully closed strings count; a cut-off last item is dropped
+            value = [json.loads(s) for s in re.findall(r'"(?:[^"\\]|\\.)*"', rest.split(']', 1)[0])]
+        else:
+            string = re.match(r'"(?:[^"\\]|\\.)*"', rest)
+            if not string:
+                continue
+            value = json.loads(string.group())
+        value = validate_field(name, value)
+        if value is not None:
+            fields[name] = value
+    return fields
+
+
+class SymptomResponseParser:
+    """Incremental parser for LLM symptom analyses.
+
+    ``feed`` accepts arbitrary chunks and returns ``(event, data)`` pairs for
+    fields that are complete, so callers can stream them as they arrive;
+    event names are the SymptomResponse field names. ``check_line`` is
+    applied to every model-written string (each line in the fallback format)
+    and a failing one raises ``OutputComplianceError``.
+    """
+
+    def __init__(self, check_line: Optional[Callable[[str], bool]] = None):
+        self.check_line = check_line
+        self.fields: Dict[str, object] = {}
+        # 'json' or 'lines', decided by the first non-blank character
+        self.mode: Optional[str] = None
+        self.fallbacks: List[str] = []
+        self._emitted = set()
+        self._parts: List[str] = []
+        self._json = _JsonMembers()
+        self._json_failed = False
+        self._buffer = ''
+        self._section: Optional[str] = None
+        self._summary_lines: List[str] = []
+        self._items: Dict[str, List[str]] = {name: [] for name in LIST_FIELDS}
+        # Unbulleted lines in list sections, used only when a section has no bullets
+        self._plain: Dict[str, List[str]] = {name: [] for name in LIST_FIELDS}
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+    def _check(self, value: str):
+        if self.check_line is not None and not self.check_line(value):
+            raise OutputComplianceError("AI output failed compliance check")
+
+    def _set(self, name: str, value) -> List[Tuple[str, object]]:
+        for text in (value if isinstance(value, list) else [value]):
+            self._check(text)
+        self.fields[name] = value
+        if name in self._emitted:
+            return []
+        self._emitted.add(name)
+        return [(name, value)]
+
+    def feed(self, chunk: str) -> List[Tuple[str, object]]:
+        self._parts.append(chunk)
+        if self.mode is None:
+            head = self.text.lstrip()
+            if not head:
+                return []
+            self.mode = 'json' if head[0] in '{`' else 'lines'
+            chunk = self.text
+        if self.mode == 'json':
+            return self._feed_json(chunk)
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split('\n')
+        events = []
+        for line in lines:
+            events.extend(self._line(line))
+        return events
+
+    def _feed_json(self, chunk: str) -> List[Tuple[str, object]]:
+        if self._json_failed:
+            self._json.buffer += chunk
+            return []
+        try:
+            members = self._json.feed(chunk)
+        except ValueError:
+            # Malformed member; whatever is recoverable is salvaged in finish()
+            self._json_failed = True
+            return []
+        events = []
+        for name, value in members:
+            value = validate_field(name, value) if name in FIELDS else None
+            if value is not None:
+                events.extend(self._set(name, value))
+        return events
+
+    def finish(self) -> List[Tuple[str, object]]:
+        events = []
+        if self.mode == 'lines':
+            events.extend(self._line(self._buffer))
+            self._buffer = ''
+            events.extend(self._close_section())
+            if not self.fields and '{' in self.text:
+                # Prose preamble before a JSON object
+                self.mode = 'json'
+                events.extend(self._feed_json(self.text))
+        if self.mode == 'json' and not self._json.closed:
+            for name, value in _salvage(self._json.buffer).items():
+                if name not in self.fields:
+                    events.extend(self._set(name, value))
+        return events
+
+    def _close_section(self) -> List[Tuple[str, object]]:
+        section, self._section = self._section, None
+        if section == 'summary' and self._summary_lines:
+            value = validate_field('summary', ' '.join(self._summary_lines))
+        elif section in LIST_FIELDS:
+            value = validate_field(section, self._items[section] or self._plain[section])
+        else:
+            return []
+        if value is None or section in self.fields:
+            return []
+        self.fields[section] = value
+        self._emitted.add(section)
+        return [(section, value)]
+
+    def _line(self, line: str) -> List[Tuple[str, object]]:
+        line = line.strip()
+        if not line:
+            return []
+        self._check(line)
+        heading = _HEADING.match(line)
+        if heading:
+            events = self._close_section()
+            self._section = _HEADING_FIELDS[heading.group(1).lower()]
+            line = heading.group(2).strip()
+            if not line:
+                return events
+        else:
+            events = []
+        if self._section == 'risk_level':
+            value = validate_field('risk_level', line)
+            if value is not None and 'risk_level' not in self.fields:
+                self.fields['risk_level'] = value
+                self._emitted.add('risk_level')
+                events.append(('risk_level', value))
+            return events
+        item = _LIST_ITEM.match(line)
+        if self._section == 'summary' and not item:
+            self._summary_lines.append(line)
+        elif self._section in LIST_FIELDS:
+            (self._items if item else self._plain)[self._section].append(item.group(1) if item else line)
+        return events
+
+    def result(self) -> dict:
+        """Parsed fields, with defaults for anything the model did not supply"""
+        result = {}
+        self.fallbacks = [name for name in FIELDS if name not in self.fields]
+        for name in FIELDS:
+            result[name] = self.fields.get(name)
+        if result['summary'] is None:
+            # Unstructured prose is still a better summary than boilerplate
+            prose = ' '.join(self.text.split())[:200] if self.mode == 'lines' else ''
+            result['summary'] = prose or DEFAULT_SUMMARY
+        result['possible_associations'] = result['possible_associations'] or DEFAULT_ASSOCIATIONS
+        result['risk_level'] = result['risk_level'] or DEFAULT_RISK_LEVEL
+        result['next_steps'] = result['next_steps'] or DEFAULT_NEXT_STEPS
+        return result
+
+
+def parse_symptom_text(response: str) -> dict:
+    parser = SymptomResponseParser()
+    parser.feed(response)
+    parser.finish()
+    return parser.result()
@@ -0,0 +1,212 @@
+"""Word-boundary phrase matching for the emergency and compliance term lists.
+
+Text and terms are normalized the same way (NFKD, combining marks dropped,
+casefolded) and split into ``\\w+`` tokens, so matches always start and end on
+word boundaries in any script that separates words. Terms are compiled into a
+token trie, so the cost of a scan depends on the text length and the longest
+phrase, not on how many terms there are. A trailing ``*`` makes the last word
+a prefix: ``seizure*`` matches "seizure" and "seizures".
+
+Lists can be extended at runtime via the ``safety_terms`` collection:
+    python term_matcher.py load emergency terms.txt
+"""
+import argparse
+import asyncio
+import os
+import re
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+SAFETY_TERMS_CHECK_SECONDS = float(os.environ.get('SAFETY_TERMS_CHECK_SECONDS', '30'))
+SAFETY_TERMS_COLLECTION = 'safety_terms'
+
+ROOT_PREFIX_MEMO_SIZE = 50000
+
+_WORD = re.compile(r'\w+')
+
+
+def normalize_text(text: str) -> str:
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(normalize_text(text))
+
+
+class _Node:
+    __slots__ = ('children', 'term', 'prefixes', 'prefix_lengths')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.term: Optional[str] = None
+        # Last-word prefix -> term, for terms ending in '*'
+        self.prefixes: Dict[str, str] = {}
+        self.prefix_lengths: List[int] = []
+
+
+class TermMatcher:
+    def __init__(self, terms: Iterable[str] = ()):
+        self._root = _Node()
+        self._count = 0
+        # token -> root prefix term (or None); text vocabulary is small, so this stays warm
+        self._root_prefix_memo: Dict[str, Optional[str]] = {}
+        for term in terms:
+            self.add(term)
+
+    def __len__(self):
+        return self._count
+
+    def add(self, term: str):
+        is_prefix = term.rstrip().endswith('*')
+        tokens = tokenize(term)
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens[:-1]:
+            node = node.children.setdefault(token, _Node())
+        if is_prefix:
+            node.prefixes.setdefault(tokens[-1], term)
+            node.prefix_lengths = sorted({len(prefix) for prefix in node.prefixes})
+            self._root_prefix_memo.clear()
+        else:
+            node = node.children.setdefault(tokens[-1], _Node())
+            if node.term is None:
+                node.term = term
+        self._count += 1
+
+    @staticmethod
+    def _prefix_term(node: _Node, token: str) -> Optional[str]:
+        for end in node.prefix_lengths:
+            if end > len(token):
+                break
+            term = node.prefixes.get(token[:end])
+            if term is not None:
+                return term
+        return None
+
+    def _scan(self, text: str, first: bool) -> List[str]:
+        tokens = tokenize(text)
+        found: Dict[str, None] = {}
+        root = self._root
+        memo = self._root_prefix_memo
+        count = len(tokens)
+        for i in range(count):
+            node = root
+            j = i
+            while j < count:
+                token = tokens[j]
+                j += 1
+                if node is root:
+                    if root.prefixes:
+                        if token not in memo:
+                            if len(memo) >= ROOT_PREFIX_MEMO_SIZE:
+                                memo.clear()
+                            memo[token] = self._prefix_term(root, token)
+                        term = memo[token]
+                    else:
+                        term = None
+                elif node.prefixes:
+                    term = self._prefix_term(node, token)
+                else:
+                    term = None
+                if term is not None:
+                    found[term] = None
+                    if first:
+                        return list(found)
+                node = node.children.get(token)
+                if node is None:
+                    break
+                if node.term is not None:
+                    found[node.term] = None
+                    if first:
+                        return list(found)
+        return list(found)
+
+    def find(self, text: str) -> List[str]:
+        """Every term present in ``text``, in order of first occurrence"""
+        return self._scan(text, first=False)
+
+    def search(self, text: str) -> Optional[str]:
+        """The first term found in ``text``, or None"""
+        found = self._scan(text, first=True)
+        return found[0] if found else None
+
+
+class SafetyTerms:
+    """Named matchers built from defaults plus terms stored in Mongo.
+
+    Stored terms extend the built-in lists rather than replace them, so a
+    bad or empty document can never switch a safety check off. Each document
+    carries a ``version`` that ``store_terms`` bumps. Workers poll it and
+    rebuild when it changes.
+    """
+
+    def __init__(self, defaults: Dict[str, List[str]], check_seconds: float = SAFETY_TERMS_CHECK_SECONDS):
+        self.defaults = defaults
+        self.check_seconds = check_seconds
+        self.matchers = {name: TermMatcher(terms) for name, terms in defaults.items()}
+        self._versions: Dict[str, int] = {}
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def __getitem__(self, name: str) -> TermMatcher:
+        return self.matchers[name]
+
+    @property
+    def needs_check(self) -> bool:
+        return self._checked_at is None or time.monotonic() - self._checked_at > self.check_seconds
+
+    async def ensure_fresh(self, db):
+        if not self.needs_check:
+            return
+        async with self._lock:
+            if not self.needs_check:
+                return
+            collection = db[SAFETY_TERMS_COLLECTION]
+            versions = {doc['_id']: doc.get('version', 0)
+                        async for doc in collection.find({'_id': {'$in': list(self.defaults)}}, {'version': 1})}
+            for name, version in versions.items():
+                if self._versions.get(name) != version:
+                    doc = await collection.find_one({'_id': name}) or {}
+                    self.matchers[name] = TermMatcher([*self.defaults[name], *doc.get('terms', [])])
+                    self._versions[name] = version
+            for name in set(self._versions) - set(versions):
+                # Stored list was removed; fall back to the defaults
+                self.matchers[name] = TermMatcher(self.defaults[name])
+                del self._versions[name]
+            self._checked_at = time.monotonic()
+
+
+async def store_terms(db, name: str, terms: List[str]):
+    """Replace the stored extension terms for one list and signal workers to reload"""
+    await db[SAFETY_TERMS_COLLECTION].update_one(
+        {'_id': name}, {'$set': {'terms': terms}, '$inc': {'version': 1}}, upsert=True)
+
+
+async def _main(args):
+    # Deferred so the server's env loading and Mongo settings are reused
+    from server import mongo
+
+    mongo.connect()
+    db = mongo.database
+
+    try:
+        terms = [line.strip() for line in Path(args.path).read_text(encoding='utf-8').splitlines()]
+        terms = [term for term in terms if term and not term.startswith('#')]
+        await store_terms(db, args.name, terms)
+        print(f"{args.name}: stored {len(terms)} terms")
+    finally:
+        mongo.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Store additional safety terms, one per line')
+    parser.add_argument('command', choices=['load'])
+    parser.add_argument('name', choices=['emergency', 'forbidden'])
+    parser.add_argument('path')
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# server.py reads these at import; nothing connects until the app lifespan runs
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'otcwise_test')
+os.environ.setdefault('LLM_PROVIDER', 'fake')
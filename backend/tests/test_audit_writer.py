@@ -0,0 +1,206 @@
+import asyncio
+
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+from audit_writer import DUPLICATE_KEY, BatchWriter
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = {}
+        self.fail = False
+        self.hang = False
+
+    async def insert_many(self, documents, ordered=True):
+        if self.hang:
+            await asyncio.sleep(3600)
+        if self.fail:
+            raise ConnectionError('mongo is down')
+        duplicates = [{'index': i, 'code': DUPLICATE_KEY} for i, document in enumerate(documents)
+                      if document['_id'] in self.documents]
+        for document in documents:
+            self.documents.setdefault(document['_id'], document)
+        if duplicates:
+            raise BulkWriteError({'writeErrors': duplicates})
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        self[name] = collection = FakeCollection()
+        return collection
+
+
+def make_writer(tmp_path, **kwargs):
+    kwargs.setdefault('flush_interval', 0.01)
+    return BatchWriter(spill_path=str(tmp_path / 'state' / 'audit_spill.jsonl'), **kwargs)
+
+
+def spilled_ids(writer):
+    with writer.spill_path.open(encoding='utf-8') as spill:
+        return [json_util.loads(line)['document']['_id'] for line in spill]
+
+
+def test_failed_batches_spill_and_replay_after_recovery(tmp_path):
+    async def scenario():
+        db = FakeDatabase()
+        writer = make_writer(tmp_path)
+        db['ai_audit_logs'].fail = True
+        writer.start(db)
+        for i in range(3):
+            await writer.enqueue('ai_audit_logs', {'n': i})
+        await asyncio.sleep(0.05)
+        assert writer.spilled == 3
+        assert len(spilled_ids(writer)) == 3
+
+        db['ai_audit_logs'].fail = False
+        await writer.enqueue('ai_audit_logs', {'n': 3})
+        await asyncio.sleep(0.05)
+        await writer.stop()
+        return db, writer
+
+    db, writer = asyncio.run(scenario())
+    assert sorted(d['n'] for d in db['ai_audit_logs'].documents.values()) == [0, 1, 2, 3]
+    assert writer.replayed == 3
+    assert not writer.spill_path.exists()
+    assert not writer.spill_path.with_suffix('.replaying').exists()
+
+
+def test_interrupted_replay_is_folded_back_on_start(tmp_path):
+    async def scenario():
+        db = FakeDatabase()
+        writer = make_writer(tmp_path)
+        writer.spill_path.parent.mkdir(parents=True)
+        replaying = writer.spill_path.with_suffix('.replaying')
+        replaying.write_text(json_util.dumps({'collection': 'feedback', 'document': {'_id': 1}}) + '\n')
+        writer.spill_path.write_text(json_util.dumps({'collection': 'feedback', 'document': {'_id': 2}}) + '\n')
+        # Already inserted before the interruption; replaying it again must not fail
+        db['feedback'].documents[1] = {'_id': 1}
+        writer.start(db)
+        await writer.stop()
+        return db, writer, replaying
+
+    db, writer, replaying = asyncio.run(scenario())
+    assert sorted(db['feedback'].documents) == [1, 2]
+    assert writer.replayed == 2
+    assert not writer.spill_path.exists()
+    assert not replaying.exists()
+
+
+def test_corrupt_spill_lines_are_set_aside_and_the_writer_keeps_running(tmp_path):
+    async def scenario():
+        db = FakeDatabase()
+        writer = make_writer(tmp_path)
+        writer.spill_path.parent.mkdir(parents=True)
+        good = json_util.dumps({'collection': 'feedback', 'document': {'_id': 1}})
+        # A torn write at a crash: no closing brace and no newline
+        writer.spill_path.write_text(f'{good}\nnot json\n{good[:-5]}')
+        writer.start(db)
+        await asyncio.sleep(0.05)
+        assert not writer._task.done()
+
+        # A spill after the torn line starts on a line of its own
+        db['feedback'].fail = True
+        await writer.enqueue('feedback', {'_id': 2})
+        await asyncio.sleep(0.05)
+        db['feedback'].fail = False
+        await writer.enqueue('feedback', {'_id': 3})
+        await asyncio.sleep(0.05)
+        await writer.stop()
+        return db, writer
+
+    db, writer = asyncio.run(scenario())
+    assert sorted(db['feedback'].documents) == [1, 2, 3]
+    assert not writer.spill_path.exists()
+    assert writer.spill_path.with_suffix('.corrupt').read_text().splitlines() == [
+        'not json', json_util.dumps({'collection': 'feedback', 'document': {'_id': 1}})[:-5]]
+
+
+def test_stop_spills_the_queue_when_the_drain_task_died(tmp_path):
+    async def scenario():
+        writer = make_writer(tmp_path, queue_size=2, enqueue_timeout=0.01, stop_timeout=0.5)
+        writer.start(FakeDatabase())
+        await asyncio.sleep(0.01)
+        # Stands in for any failure the drain loop does not handle
+        writer._task.cancel()
+        await asyncio.sleep(0.01)
+        for i in range(4):
+            await writer.enqueue('feedback', {'_id': i})
+        await asyncio.wait_for(writer.stop(), timeout=2)
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert sorted(spilled_ids(writer)) == [0, 1, 2, 3]
+
+
+def test_stop_spills_the_batch_in_flight_when_the_drain_overruns(tmp_path):
+    async def scenario():
+        db = FakeDatabase()
+        db['feedback'].hang = True
+        writer = make_writer(tmp_path, stop_timeout=0.1)
+        writer.start(db)
+        for i in range(3):
+            await writer.enqueue('feedback', {'_id': i})
+        await asyncio.sleep(0.05)
+        await writer.enqueue('feedback', {'_id': 3})
+        await asyncio.wait_for(writer.stop(), timeout=2)
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert sorted(spilled_ids(writer)) == [0, 1, 2, 3]
+
+
+def test_cancelled_drain_spills_only_the_groups_not_yet_written(tmp_path):
+    async def scenario():
+        db = FakeDatabase()
+        db['feedback'].hang = True
+        writer = make_writer(tmp_path, stop_timeout=0.1)
+        writer.start(db)
+        await writer.enqueue('ai_audit_logs', {'_id': 'a'})
+        await writer.enqueue('feedback', {'_id': 'f'})
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(writer.stop(), timeout=2)
+        return db, writer
+
+    db, writer = asyncio.run(scenario())
+    assert list(db['ai_audit_logs'].documents) == ['a']
+    assert spilled_ids(writer) == ['f']
+
+
+def test_on_inserted_sees_only_documents_new_to_this_insert(tmp_path):
+    seen = []
+
+    async def on_inserted(collection, documents):
+        seen.append([document['_id'] for document in documents])
+
+    async def scenario():
+        db = FakeDatabase()
+        writer = make_writer(tmp_path)
+        writer.spill_path.parent.mkdir(parents=True)
+        writer.spill_path.write_text(''.join(
+            json_util.dumps({'collection': 'feedback', 'document': {'_id': i}}) + '\n' for i in (1, 2, 3)))
+        # Inserted by an attempt that was interrupted before its spill was cleared
+        db['feedback'].documents[2] = {'_id': 2}
+        writer.start(db, on_inserted=on_inserted)
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert seen == [[1, 3]]
+
+
+def test_a_failing_on_inserted_hook_does_not_spill_stored_documents(tmp_path):
+    async def on_inserted(collection, documents):
+        raise RuntimeError('rollups unavailable')
+
+    async def scenario():
+        db = FakeDatabase()
+        writer = make_writer(tmp_path)
+        writer.start(db, on_inserted=on_inserted)
+        await writer.enqueue('feedback', {'_id': 1})
+        await writer.stop()
+        return db, writer
+
+    db, writer = asyncio.run(scenario())
+    assert list(db['feedback'].documents) == [1]
+    assert writer.spilled == 0
+    assert not writer.spill_path.exists()
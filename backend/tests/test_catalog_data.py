@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from loader import CATALOG_DIR, CATALOGS, catalog_files, read_records
+
+SHIPPED = ['medicines', 'first_aid_topics', 'first_aid_steps', 'pharmacies', 'doctors']
+
+
+def shipped_records(catalog):
+    path = next(path for name, path in catalog_files(Path(CATALOG_DIR)) if name == catalog)
+    spec = CATALOGS[catalog]
+    return [spec.prepare(record) if spec.prepare else record for record in read_records(path, spec.types)]
+
+
+def test_seed_catalogs_ship_and_parse():
+    assert [name for name, _ in catalog_files(Path(CATALOG_DIR))] == SHIPPED
+    for catalog in SHIPPED:
+        records = shipped_records(catalog)
+        keys = [tuple(record[k] for k in CATALOGS[catalog].key) for record in records]
+        assert records and len(set(keys)) == len(keys), catalog
+
+
+def test_seed_steps_belong_to_shipped_topics_in_order():
+    topics = {topic['id'] for topic in shipped_records('first_aid_topics')}
+    steps = {}
+    for step in shipped_records('first_aid_steps'):
+        steps.setdefault(step['topic_id'], []).append(step['step_order'])
+    assert set(steps) == topics
+    assert all(orders == list(range(1, len(orders) + 1)) for orders in steps.values())
+
+
+def test_seed_providers_have_locations_and_opening_hours():
+    for catalog in ('pharmacies', 'doctors'):
+        for provider in shipped_records(catalog):
+            assert provider['location']['coordinates'] == [provider['longitude'], provider['latitude']]
+            assert provider['phone'] and provider['address']
+            assert all(0 <= span['start'] < span['end'] <= 7 * 24 * 60 for span in provider['opening_hours'])
+            if catalog == 'doctors':
+                assert provider['specialty']
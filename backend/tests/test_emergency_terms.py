@@ -0,0 +1,49 @@
+import pytest
+
+from server import detect_emergency
+
+# The keywords and check from before emergency matching moved to whole words
+SUBSTRING_KEYWORDS = [
+    'chest pain', 'difficulty breathing', 'seizure', 'severe bleeding',
+    'loss of consciousness', 'unconscious', 'not breathing', 'choking',
+    'heart attack', 'stroke', 'severe burn', 'poisoning', 'overdose',
+]
+SUFFIXES = ['', 's', 'es', 'ed', 'ing', 'ful', 'ness']
+COMPOUNDS = [
+    'sunstroke', 'ministroke', 'heatstroke', 'mini stroke', 'food poisoning', 'chest pains',
+    'sharp chest pain since morning', 'he overdosed', 'repeated seizures', 'unconsciousness',
+    'Severe Burns on arm', 'HEART ATTACK', 'choking on food', 'loss of consciousness briefly',
+]
+
+
+def substring_emergency(symptoms):
+    text = ' '.join(symptoms).lower()
+    return any(keyword in text for keyword in SUBSTRING_KEYWORDS)
+
+
+CORPUS = [keyword + suffix for keyword in SUBSTRING_KEYWORDS for suffix in SUFFIXES] + COMPOUNDS
+
+
+@pytest.mark.parametrize('phrase', CORPUS)
+def test_matches_everything_the_substring_check_caught(phrase):
+    if substring_emergency([phrase]):
+        assert detect_emergency([phrase]), phrase
+
+
+def test_corpus_exercises_the_substring_check():
+    assert all(substring_emergency([phrase]) for phrase in CORPUS)
+
+
+@pytest.mark.parametrize('phrase', ['chest pains', 'sunstroke', 'ministroke'])
+def test_reported_regressions(phrase):
+    assert detect_emergency([phrase])
+
+
+@pytest.mark.parametrize('phrase', ['headache', 'runny nose', 'stroked the cat gently'])
+def test_word_boundaries_still_apply(phrase):
+    # "stroked" is an accepted over-match of stroke*, kept for safety
+    assert bool(detect_emergency([phrase])) == ('stroke' in phrase)
+
+
+def test_phrase_split_across_symptoms():
+    assert detect_emergency(['chest', 'pain'])
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from geo import GeoGridIndex, haversine_km
+
+CELL = 0.05
+
+
+def provider(i, lat, lng, **fields):
+    return {'id': f"p{i}", 'name': f"Provider {i}", 'latitude': lat, 'longitude': lng, **fields}
+
+
+def brute_force(providers, lat, lng, radius_km, limit, offset=0):
+    ranked = sorted((haversine_km(lat, lng, p['latitude'], p['longitude']), p['id']) for p in providers)
+    return [pid for distance, pid in ranked if distance <= radius_km][offset:offset + limit]
+
+
+def near_edge(rng, base, cells=3):
+    """A coordinate within a few metres of a cell boundary near ``base``"""
+    edge = (round(base / CELL) + rng.randint(-cells, cells)) * CELL
+    return edge + rng.uniform(-0.0002, 0.0002)
+
+
+def test_provider_just_across_a_cell_edge_is_found():
+    grid = GeoGridIndex(cell_degrees=CELL)
+    grid.build([provider(0, 10.03, 0.0501), provider(1, 10.0, 0.08), provider(2, 10.06, 0.02)])
+    assert [p['id'] for p in grid.nearest(10.03, 0.0499, 10, 1)] == ['p0']
+    assert [p['id'] for p in grid.nearest(10.03, 0.0499, 1, 5)] == ['p0']
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_nearest_matches_brute_force(seed):
+    rng = random.Random(seed)
+    center_lat, center_lng = rng.uniform(-60, 60), rng.uniform(-179, 179)
+    providers = []
+    for i in range(300):
+        if i % 3 == 0:
+            lat, lng = near_edge(rng, center_lat), near_edge(rng, center_lng)
+        else:
+            lat, lng = center_lat + rng.uniform(-0.5, 0.5), center_lng + rng.uniform(-0.5, 0.5)
+        providers.append(provider(i, lat, lng))
+    grid = GeoGridIndex(cell_degrees=CELL)
+    grid.build(providers)
+
+    for _ in range(25):
+        if rng.random() < 0.5:
+            lat, lng = near_edge(rng, center_lat), near_edge(rng, center_lng)
+        else:
+            lat, lng = center_lat + rng.uniform(-0.5, 0.5), center_lng + rng.uniform(-0.5, 0.5)
+        radius_km = rng.choice([0.5, 1, 5, 10, 50])
+        limit, offset = rng.choice([1, 3, 10]), rng.choice([0, 0, 2])
+        found = [p['id'] for p in grid.nearest(lat, lng, radius_km, limit, offset)]
+        assert found == brute_force(providers, lat, lng, radius_km, limit, offset)
+
+
+def test_nearest_across_the_antimeridian():
+    grid = GeoGridIndex(cell_degrees=CELL)
+    grid.build([provider(0, 0.0, 179.999), provider(1, 0.0, -179.95), provider(2, 0.0, 179.9)])
+    assert [p['id'] for p in grid.nearest(0.0, -179.999, 20, 3)] == ['p0', 'p1', 'p2']
+
+
+def test_specialty_filter_and_distance():
+    grid = GeoGridIndex(cell_degrees=CELL)
+    grid.build([provider(0, 1.0, 1.0, specialty='Cardiology'), provider(1, 1.0, 1.001, specialty='Dermatology')])
+    found = grid.nearest(1.0, 1.0005, 5, 5, specialty=' cardiology ')
+    assert [p['id'] for p in found] == ['p0']
+    assert found[0]['distance'] == round(haversine_km(1.0, 1.0005, 1.0, 1.0), 3)
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from llm_cache import SymptomResponseCache
+from llm_client import LlmUnavailableError
+
+
+def test_concurrent_callers_share_one_computation():
+    async def scenario():
+        cache = SymptomResponseCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'answer'
+
+        results = await asyncio.gather(*(cache.get_or_compute('key', compute) for _ in range(5)))
+        return results, calls, cache.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == ['answer'] * 5
+    assert len(calls) == 1
+    assert stats['coalesced'] == 4
+
+
+def test_cancelled_leader_gives_waiters_an_unavailable_error():
+    async def scenario():
+        cache = SymptomResponseCache()
+        started = asyncio.Event()
+
+        async def compute():
+            started.set()
+            await asyncio.sleep(10)
+            return 'never'
+
+        leader = asyncio.create_task(cache.get_or_compute('key', compute))
+        await started.wait()
+        follower = asyncio.create_task(cache.get_or_compute('key', compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        with pytest.raises(LlmUnavailableError):
+            await follower
+        # A later caller starts afresh
+        return await cache.get_or_compute('key', _answer)
+
+    assert asyncio.run(scenario()) == 'answer'
+
+
+async def _answer():
+    return 'answer'
+
+
+class FailingCollection:
+    async def find_one(self, query):
+        raise ConnectionError('mongo is down')
+
+    async def replace_one(self, query, document, upsert=False):
+        raise ConnectionError('mongo is down')
+
+    async def delete_one(self, query):
+        raise ConnectionError('mongo is down')
+
+
+def test_mongo_errors_fall_back_to_the_memory_tier():
+    async def scenario():
+        cache = SymptomResponseCache(collection=FailingCollection())
+        assert await cache.get('key') is None
+        await cache.set('key', 'answer', 0.5)
+        assert await cache.get('key') == 'answer'
+        await cache.invalidate('key')
+        return await cache.get('key')
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+from llm_client import CircuitBreaker, CircuitOpenError, ConcurrencyLimitError, LlmClient, LlmUnavailableError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ScriptedChat:
+    """Replies or raises from a shared script, one entry per call"""
+
+    def __init__(self, script, calls):
+        self.script = script
+        self.calls = calls
+
+    async def send_message(self, message):
+        self.calls.append(message)
+        outcome = self.script.pop(0) if self.script else 'ok'
+        if isinstance(outcome, Exception):
+            raise outcome
+        if outcome == 'hang':
+            await asyncio.sleep(3600)
+        return outcome
+
+
+def make_client(script, clock, **kwargs):
+    calls = []
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    kwargs.setdefault('retries', 0)
+    client = LlmClient(lambda: ScriptedChat(script, calls), backoff_base=0, breaker=breaker, **kwargs)
+    return client, breaker, calls
+
+
+def test_breaker_opens_after_consecutive_failures():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success()
+    assert breaker.failures == 0
+
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_lets_one_probe_through_after_the_reset_timeout():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only the probe goes through while it is outstanding
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30, clock=clock)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_lost_probe_is_retried_after_another_reset_timeout():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_client_trips_the_breaker_and_stops_calling_the_provider():
+    clock = Clock()
+    client, breaker, calls = make_client([RuntimeError('boom')] * 3, clock)
+    for _ in range(3):
+        with pytest.raises(LlmUnavailableError):
+            asyncio.run(client.send_message('hi'))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.send_message('hi'))
+    assert len(calls) == 3
+
+    clock.now += 30
+    assert asyncio.run(client.send_message('hi')) == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retries_count_towards_the_breaker():
+    clock = Clock()
+    client, breaker, calls = make_client([RuntimeError('boom')] * 2, clock, retries=2)
+    assert asyncio.run(client.send_message('hi')) == 'ok'
+    assert len(calls) == 3
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+    client, breaker, calls = make_client([RuntimeError('boom')] * 3, clock, retries=2)
+    with pytest.raises(LlmUnavailableError):
+        asyncio.run(client.send_message('hi'))
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_timeouts_are_failures():
+    clock = Clock()
+    client, breaker, _ = make_client(['hang'], clock, timeout=0.01)
+    with pytest.raises(LlmUnavailableError):
+        asyncio.run(client.send_message('hi'))
+    assert breaker.failures == 1
+
+
+def test_queue_timeouts_do_not_trip_the_breaker():
+    clock = Clock()
+    client, breaker, _ = make_client(['hang'], clock, max_concurrency=1, queue_timeout=0.01, timeout=0.2)
+
+    async def scenario():
+        holder = asyncio.create_task(client.send_message('first'))
+        await asyncio.sleep(0)
+        with pytest.raises(ConcurrencyLimitError):
+            await client.send_message('second')
+        holder.cancel()
+        await asyncio.gather(holder, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert breaker.failures == 0
@@ -0,0 +1,63 @@
+import asyncio
+
+from medicine_detail import MedicineDetailCache, supervise_detail_watch
+
+
+class FakeStream:
+    def __init__(self, changes, error):
+        self.changes = changes
+        self.error = error
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for change in self.changes:
+            yield change
+        if self.error:
+            raise self.error
+        await asyncio.sleep(3600)
+
+
+class FakeDatabase:
+    def __init__(self, streams):
+        self.streams = streams
+        self.opened = 0
+
+    def watch(self, pipeline, full_document=None):
+        self.opened += 1
+        return self.streams.pop(0)
+
+
+def test_watcher_is_restarted_after_a_failure_and_clears_the_cache():
+    async def scenario():
+        cache = MedicineDetailCache(ttl=60)
+        cache.set('m1', b'{}')
+        cache.set('m2', b'{}')
+        db = FakeDatabase([
+            FakeStream([{'ns': {'coll': 'medicines'}, 'fullDocument': {'id': 'm1'}}], ConnectionError('stepdown')),
+            FakeStream([], ConnectionError('still down')),
+            FakeStream([], None),
+        ])
+        watcher = asyncio.create_task(supervise_detail_watch(db, cache, initial_delay=0.01, max_delay=0.05))
+        await asyncio.sleep(0.005)
+        # Entries the failed stream could not invalidate are dropped too
+        assert cache.get('m2') is None
+        await asyncio.sleep(0.1)
+        assert db.opened == 3
+        assert not watcher.done()
+
+        # Once the stream is back, entries are kept until a change arrives for them
+        cache.set('m2', b'{}')
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert cache.get('m2') == b'{}'
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from rate_limit import Limit, MemoryBackend, MongoBackend, RateLimitMiddleware, Rule, parse_limit
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def take(backend, key='k', limit=Limit(3, 60)):
+    return asyncio.run(backend.take(key, limit))
+
+
+@pytest.mark.parametrize('spec,expected', [
+    ('10/minute', Limit(10, 60)),
+    ('5/seconds', Limit(5, 1)),
+    ('100/hour', Limit(100, 3600)),
+    ('7', Limit(7, 1)),
+    ('off', None),
+    ('0', None),
+])
+def test_parse_limit(spec, expected):
+    assert parse_limit(spec) == expected
+
+
+def test_bucket_allows_a_burst_then_refills_continuously():
+    clock = Clock()
+    backend = MemoryBackend(clock=clock)
+    assert [take(backend)[0] for _ in range(3)] == [True, True, True]
+
+    allowed, retry_after = take(backend)
+    assert not allowed
+    assert retry_after == pytest.approx(20.0)
+
+    # One token accrues every 20 seconds at 3 per minute
+    clock.now += 10
+    allowed, retry_after = take(backend)
+    assert not allowed
+    assert retry_after == pytest.approx(10.0)
+    clock.now += 10
+    assert take(backend) == (True, 0.0)
+    assert not take(backend)[0]
+
+
+def test_bucket_refills_to_the_limit_and_no_further():
+    clock = Clock()
+    backend = MemoryBackend(clock=clock)
+    for _ in range(3):
+        take(backend)
+    clock.now += 3600
+    assert [take(backend)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_buckets_are_per_key():
+    backend = MemoryBackend(clock=Clock())
+    for _ in range(3):
+        take(backend, 'a')
+    assert not take(backend, 'a')[0]
+    assert take(backend, 'b')[0]
+
+
+class FakeRateLimitCollection:
+    def __init__(self, doc=None):
+        self.doc = doc
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        if self.doc is None:
+            raise ConnectionError('mongo is down')
+        return self.doc
+
+
+def test_mongo_backend_reads_the_updated_bucket():
+    backend = MongoBackend({'rate_limits': FakeRateLimitCollection({'allowed': False, 'tokens': 0.25})})
+    allowed, retry_after = take(backend)
+    assert not allowed
+    assert retry_after == pytest.approx(15.0)
+
+
+def test_mongo_backend_fails_open_when_mongo_is_unreachable():
+    backend = MongoBackend({'rate_limits': FakeRateLimitCollection()})
+    assert take(backend) == (True, 0.0)
+
+
+def make_client(rules, clock, enabled=True, backend=None):
+    async def ok(request):
+        return PlainTextResponse('ok')
+
+    app = Starlette(routes=[Route('/limited', ok, methods=['POST']), Route('/open', ok, methods=['POST'])])
+    app.add_middleware(RateLimitMiddleware, rules=rules, backend=backend or MemoryBackend(clock=clock),
+                       identify=lambda request: request.headers.get('x-user'), enabled=enabled)
+    return TestClient(app)
+
+
+def test_middleware_answers_429_with_retry_after():
+    clock = Clock()
+    client = make_client({('POST', '/limited'): Rule('test', Limit(2, 60))}, clock)
+    assert [client.post('/limited').status_code for _ in range(2)] == [200, 200]
+
+    response = client.post('/limited')
+    assert response.status_code == 429
+    assert response.json() == {'detail': 'Too many requests'}
+    assert response.headers['Retry-After'] == '30'
+
+    clock.now += 29.5
+    assert client.post('/limited').headers['Retry-After'] == '1'
+    clock.now += 0.5
+    assert client.post('/limited').status_code == 200
+
+
+def test_middleware_keys_on_user_or_ip_by_rule():
+    clock = Clock()
+    rules = {('POST', '/limited'): Rule('test', Limit(1, 60))}
+    client = make_client(rules, clock)
+    assert client.post('/limited', headers={'x-user': 'alice'}).status_code == 200
+    assert client.post('/limited', headers={'x-user': 'alice'}).status_code == 429
+    assert client.post('/limited', headers={'x-user': 'bob'}).status_code == 200
+
+    client = make_client({('POST', '/limited'): Rule('test', Limit(1, 60), key='ip')}, clock)
+    assert client.post('/limited', headers={'x-user': 'alice'}).status_code == 200
+    assert client.post('/limited', headers={'x-user': 'bob'}).status_code == 429
+
+
+def test_middleware_passes_unlisted_routes_and_when_disabled():
+    clock = Clock()
+    rules = {('POST', '/limited'): Rule('test', Limit(1, 60))}
+    client = make_client(rules, clock)
+    assert [client.post('/open').status_code for _ in range(3)] == [200, 200, 200]
+
+    client = make_client(rules, clock, enabled=False)
+    assert [client.post('/limited').status_code for _ in range(3)] == [200, 200, 200]
+
+
+def test_middleware_lets_requests_through_when_the_backend_is_down():
+    rules = {('POST', '/limited'): Rule('test', Limit(1, 60))}
+    client = make_client(rules, Clock(), backend=MongoBackend({'rate_limits': FakeRateLimitCollection()}))
+    assert [client.post('/limited').status_code for _ in range(3)] == [200, 200, 200]
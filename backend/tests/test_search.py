@@ -0,0 +1,30 @@
+import pytest
+
+from name_index import medicine_name_index
+from search import fuzzy_candidate_ids
+
+MEDICINES = [
+    {'id': 'm1', 'brand_name': 'Panadol', 'generic_name': 'Paracetamol'},
+    {'id': 'm2', 'brand_name': 'Redoxon', 'generic_name': 'Vitamin C'},
+    {'id': 'm3', 'brand_name': 'Advil', 'generic_name': 'Ibuprofen'},
+]
+
+
+@pytest.fixture(autouse=True)
+def index():
+    medicine_name_index.build(MEDICINES)
+    yield
+    medicine_name_index.invalidate()
+
+
+@pytest.mark.parametrize('query,expected', [
+    ('paracetamol', ['m1']),
+    ('paracetamol-500', ['m1']),
+    ('Paracetamol/500mg', ['m1']),
+    ('vitamin,c', ['m2']),
+    ('vitamn;redoxon', ['m2']),
+    ('ibuprofen (200mg), paracetamol', ['m1', 'm3']),
+    ('500-mg', []),
+])
+def test_fuzzy_candidates_split_on_punctuation(query, expected):
+    assert fuzzy_candidate_ids(query) == expected
@@ -0,0 +1,139 @@
+import json
+
+import pytest
+
+from symptom_parser import (
+    DEFAULT_NEXT_STEPS, DEFAULT_RISK_LEVEL, OutputComplianceError, SymptomResponseParser, parse_symptom_text,
+)
+
+ANALYSIS = {
+    'summary': 'Headache with a runny nose often goes with a common cold.',
+    'possible_associations': ['Common cold', 'Seasonal allergies', 'Sinus congestion'],
+    'risk_level': 'Low',
+    'next_steps': ['Rest and drink fluids', 'See a pharmacist if it lasts more than a week'],
+}
+RESPONSE = json.dumps(ANALYSIS)
+
+
+def stream(text, size, check_line=None):
+    parser = SymptomResponseParser(check_line)
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    events.extend(parser.finish())
+    return parser, events
+
+
+def test_whole_json_response():
+    parser, events = stream(RESPONSE, len(RESPONSE))
+    assert parser.result() == ANALYSIS
+    assert parser.fallbacks == []
+    assert [name for name, _ in events] == list(ANALYSIS)
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 64])
+def test_streamed_json_yields_each_field_once_as_it_closes(size):
+    parser, events = stream(RESPONSE, size)
+    assert parser.result() == ANALYSIS
+    assert dict(events) == ANALYSIS
+    assert len(events) == len(ANALYSIS)
+
+
+def test_field_is_emitted_before_the_rest_arrives():
+    parser = SymptomResponseParser()
+    cut = RESPONSE.index('"possible_associations"')
+    assert parser.feed(RESPONSE[:cut]) == [('summary', ANALYSIS['summary'])]
+
+
+def test_fenced_json_response():
+    assert parse_symptom_text(f"```json\n{RESPONSE}\n```") == ANALYSIS
+
+
+def test_truncated_json_salvages_complete_fields_and_drops_a_cut_off_item():
+    cut = RESPONSE.index('See a pharmacist') + 5
+    parser, _ = stream(RESPONSE[:cut], 16)
+    result = parser.result()
+    assert result['summary'] == ANALYSIS['summary']
+    assert result['possible_associations'] == ANALYSIS['possible_associations']
+    assert result['risk_level'] == 'Low'
+    assert result['next_steps'] == ['Rest and drink fluids']
+    assert parser.fallbacks == []
+
+
+def test_truncated_inside_a_string_falls_back_for_that_field():
+    cut = RESPONSE.index('Headache with') + 8
+    parser, events = stream(RESPONSE[:cut], 5)
+    assert events == []
+    assert parser.result()['risk_level'] == DEFAULT_RISK_LEVEL
+    assert parser.fallbacks == ['summary', 'possible_associations', 'risk_level', 'next_steps']
+
+
+def test_malformed_member_salvages_the_other_fields():
+    broken = RESPONSE.replace('"risk_level": "Low"', '"risk_level": Low')
+    parser, _ = stream(broken, 10)
+    result = parser.result()
+    assert result['summary'] == ANALYSIS['summary']
+    assert result['next_steps'] == ANALYSIS['next_steps']
+    assert result['risk_level'] == DEFAULT_RISK_LEVEL
+    assert parser.fallbacks == ['risk_level']
+
+
+def test_invalid_values_are_coerced_or_dropped():
+    response = json.dumps({
+        'summary': '  spaced   out\n summary ',
+        'possible_associations': 'Only one',
+        'risk_level': 'medium risk',
+        'next_steps': ['', 1, 'a', 'b', 'c', 'd', 'e'],
+        'extra': 'ignored',
+    })
+    assert parse_symptom_text(response) == {
+        'summary': 'spaced out summary',
+        'possible_associations': ['Only one'],
+        'risk_level': 'Moderate',
+        'next_steps': ['a', 'b', 'c', 'd'],
+    }
+
+
+def test_section_headings_fallback():
+    response = (
+        "**Summary:** Likely a mild cold.\n"
+        "Usually clears up on its own.\n"
+        "## Possible Associations\n"
+        "- Common cold\n"
+        "- Allergies\n"
+        "Risk level: Low\n"
+        "Next steps:\n"
+        "1. Rest\n"
+        "2. Fluids"
+    )
+    parser, events = stream(response, 4)
+    assert parser.result() == {
+        'summary': 'Likely a mild cold. Usually clears up on its own.',
+        'possible_associations': ['Common cold', 'Allergies'],
+        'risk_level': 'Low',
+        'next_steps': ['Rest', 'Fluids'],
+    }
+    assert [name for name, _ in events] == ['summary', 'possible_associations', 'risk_level', 'next_steps']
+
+
+def test_prose_before_a_json_object():
+    assert parse_symptom_text(f"Here is the analysis you asked for:\n{RESPONSE}") == ANALYSIS
+
+
+def test_unstructured_prose_becomes_the_summary():
+    parser, _ = stream('Could be many things, hard to say.', 8)
+    result = parser.result()
+    assert result['summary'] == 'Could be many things, hard to say.'
+    assert result['next_steps'] == DEFAULT_NEXT_STEPS
+    # Still reported so callers can tell the model ignored the format
+    assert 'summary' in parser.fallbacks
+
+
+@pytest.mark.parametrize('response', [
+    RESPONSE,
+    RESPONSE[:RESPONSE.index('See a pharmacist') + 5],
+    "Summary: Rest and drink fluids.\nNext steps:\n- See a pharmacist",
+])
+def test_compliance_check_applies_to_every_string(response):
+    with pytest.raises(OutputComplianceError):
+        stream(response, 6, check_line=lambda line: 'pharmacist' not in line and 'fluids' not in line)
@@ -0,0 +1,38 @@
+from locator_cache import LocatorCache
+from ttl_cache import CountingTTLCache
+
+
+def test_counts_hits_and_misses():
+    cache = CountingTTLCache(maxsize=10, ttl=60)
+    assert cache.get('a') is None
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+
+def test_invalidate_one_some_or_all():
+    cache = CountingTTLCache(maxsize=10, ttl=60)
+    for key in [('pharmacies', 1), ('pharmacies', 2), ('doctors', 1)]:
+        cache.set(key, True)
+    cache.invalidate(('pharmacies', 1))
+    assert cache.get(('pharmacies', 1)) is None
+    cache.invalidate_where(lambda key: key[0] == 'pharmacies')
+    assert cache.get(('pharmacies', 2)) is None
+    assert cache.get(('doctors', 1))
+    cache.invalidate()
+    assert cache.stats()['size'] == 0
+
+
+def test_zero_ttl_disables_caching():
+    cache = CountingTTLCache(maxsize=10, ttl=0)
+    assert not cache.enabled
+    cache.set('a', 1)
+    cache.invalidate('a')
+    cache.invalidate_where(lambda key: True)
+    assert cache.get('a') is None
+    assert cache.stats() == {'size': 0, 'hits': 0, 'misses': 1, 'hit_rate': 0.0}
+
+
+def test_locator_stats_include_fallbacks():
+    cache = LocatorCache(ttl=60)
+    assert cache.stats() == {'size': 0, 'hits': 0, 'misses': 0, 'hit_rate': 0.0, 'fallbacks': 0}
@@ -0,0 +1,72 @@
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from ocr import UploadSizeLimitMiddleware, read_upload
+
+LIMIT = 1024
+
+
+def make_client(max_bytes=LIMIT + 512):
+    app = FastAPI()
+    received = []
+
+    @app.post('/upload')
+    async def upload(file: UploadFile = File(...)):
+        received.append(file.size)
+        return {'size': len(await read_upload(file, max_bytes=LIMIT))}
+
+    @app.post('/other')
+    async def other(file: UploadFile = File(...)):
+        return {'size': len(await file.read())}
+
+    app.add_middleware(UploadSizeLimitMiddleware, paths=('/upload',), max_bytes=max_bytes)
+    return TestClient(app), received
+
+
+def multipart(size):
+    boundary = 'boundary'
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="a.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n').encode() + b'x' * size + f'\r\n--{boundary}--\r\n'.encode()
+    return body, {'content-type': f'multipart/form-data; boundary={boundary}'}
+
+
+def test_upload_within_the_limit_is_read():
+    client, received = make_client()
+    response = client.post('/upload', files={'file': ('a.jpg', b'x' * LIMIT, 'image/jpeg')})
+    assert response.status_code == 200
+    assert received == [LIMIT]
+
+
+def test_declared_length_over_the_limit_is_refused_before_the_endpoint():
+    client, received = make_client()
+    response = client.post('/upload', files={'file': ('a.jpg', b'x' * 4096, 'image/jpeg')})
+    assert response.status_code == 413
+    assert response.json() == {'detail': 'Image too large'}
+    assert received == []
+
+
+def test_chunked_body_is_cut_off_once_over_the_limit():
+    client, received = make_client()
+    body, headers = multipart(4096)
+
+    def chunks():
+        for i in range(0, len(body), 256):
+            yield body[i:i + 256]
+
+    response = client.post('/upload', content=chunks(), headers=headers)
+    assert response.status_code == 413
+    assert received == []
+
+
+def test_image_over_the_limit_within_the_form_allowance_is_refused():
+    client, received = make_client()
+    response = client.post('/upload', files={'file': ('a.jpg', b'x' * (LIMIT + 1), 'image/jpeg')})
+    assert response.status_code == 413
+    assert received == [LIMIT + 1]
+
+
+def test_other_paths_are_not_limited():
+    client, _ = make_client()
+    response = client.post('/other', files={'file': ('a.jpg', b'x' * 4096, 'image/jpeg')})
+    assert response.status_code == 200
+    assert response.json() == {'size': 4096}
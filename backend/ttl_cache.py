@@ -0,0 +1,51 @@
+from typing import Any, Callable, Hashable, Optional
+
+from cachetools import TTLCache
+
+
+class CountingTTLCache:
+    """TTL + LRU cache that counts hits and misses; a ttl of 0 disables it.
+
+    Only used from the event loop, so nothing is locked.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.enabled = ttl > 0
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl) if self.enabled else None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._cache.get(key) if self.enabled else None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.enabled:
+            self._cache[key] = value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one entry, or everything when no key is given"""
+        if not self.enabled:
+            return
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        if self.enabled:
+            for key in [k for k in self._cache.keys() if predicate(k)]:
+                self._cache.pop(key, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._cache) if self.enabled else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,24 @@
+import axios from 'axios';
+import { API } from '../App';
+
+const STORAGE_KEY = 'otcwise.firstAidBundle';
+
+// Fetches every first-aid topic and its steps in one request and keeps the
+// last good copy in localStorage so the pages still work offline.
+export async function loadFirstAidBundle() {
+  try {
+    const response = await axios.get(`${API}/first-aid/bundle`);
+    try {
+      localStorage.setItem(STORAGE_KEY, JSON.stringify(response.data));
+    } catch (error) {
+      // Storage full or disabled; the fresh copy is still usable
+    }
+    return response.data;
+  } catch (error) {
+    const stored = localStorage.getItem(STORAGE_KEY);
+    if (stored) {
+      return JSON.parse(stored);
+    }
+    throw error;
+  }
+}
@@ -1,6 +1,6 @@
-import React, { useState } from 'react';
+import React, { useContext, useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { API } from '../App';
+import { AuthContext, API } from '../App';
 import { Button } from '../components/ui/button';
 import { Checkbox } from '../components/ui/checkbox';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '../components/ui/card';
@@ -11,7 +11,26 @@ import axios from 'axios';
 const ConsentPage = () => {
   const [consentAccepted, setConsentAccepted] = useState(false);
   const [loading, setLoading] = useState(false);
+  const [consentVersion, setConsentVersion] = useState(null);
   const navigate = useNavigate();
+  const { login } = useContext(AuthContext);
+
+  useEffect(() => {
+    fetchConsentVersion();
+  }, []);
+
+  const fetchConsentVersion = async () => {
+    try {
+      const token = localStorage.getItem('otcwise_token');
+      const response = await axios.get(`${API}/consent/status`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      // Accept the version the server currently requires, not the one previously accepted
+      setConsentVersion(response.data.current_version);
+    } catch (error) {
+      toast.error('Failed to load consent details');
+    }
+  };
 
   const handleAccept = async () => {
     if (!consentAccepted) {
@@ -22,11 +41,13 @@ const ConsentPage = () => {
     setLoading(true);
     try {
       const token = localStorage.getItem('otcwise_token');
-      await axios.post(
+      const response = await axios.post(
         `${API}/consent/accept`,
-        { age_confirmed: true, consent_version: '1.0' },
+        { age_confirmed: true, consent_version: consentVersion },
         { headers: { Authorization: `Bearer ${token}` } }
       );
+      // The new token carries the consent the symptom checker requires
+      login(response.data.token);
       toast.success('Consent recorded');
       navigate('/symptoms');
     } catch (error) {
@@ -100,7 +121,7 @@ const ConsentPage = () => {
             </Button>
             <Button
               onClick={handleAccept}
-              disabled={!consentAccepted || loading}
+              disabled={!consentAccepted || loading || !consentVersion}
               className="flex-1 rounded-full"
               data-testid="consent-accept-btn"
             >
@@ -1,11 +1,10 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate, Link } from 'react-router-dom';
-import { API } from '../App';
 import { Button } from '../components/ui/button';
 import { Card } from '../components/ui/card';
 import { Heart, AlertCircle, CheckCircle } from 'lucide-react';
 import { toast } from 'sonner';
-import axios from 'axios';
+import { loadFirstAidBundle } from '../lib/firstAid';
 
 const FirstAidDetailPage = () => {
   const { topicId } = useParams();
@@ -19,8 +18,8 @@ const FirstAidDetailPage = () => {
 
   const fetchTopic = async () => {
     try {
-      const response = await axios.get(`${API}/first-aid/${topicId}`);
-      setTopic(response.data);
+      const bundle = await loadFirstAidBundle();
+      setTopic(bundle.details[topicId] || null);
     } catch (error) {
       toast.error('Failed to load topic');
     } finally {
@@ -1,11 +1,10 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate, Link } from 'react-router-dom';
-import { API } from '../App';
 import { Button } from '../components/ui/button';
 import { Card } from '../components/ui/card';
 import { Heart, AlertCircle, Droplet, Wind, Bone } from 'lucide-react';
 import { toast } from 'sonner';
-import axios from 'axios';
+import { loadFirstAidBundle } from '../lib/firstAid';
 
 const FirstAidPage = () => {
   const [topics, setTopics] = useState([]);
@@ -26,8 +25,8 @@ const FirstAidPage = () => {
 
   const fetchTopics = async () => {
     try {
-      const response = await axios.get(`${API}/first-aid/topics`);
-      setTopics(response.data);
+      const bundle = await loadFirstAidBundle();
+      setTopics(bundle.topics);
     } catch (error) {
       toast.error('Failed to load first aid topics');
     } finally {
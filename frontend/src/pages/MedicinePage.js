@@ -23,9 +23,9 @@ const MedicinePage = () => {
 
     setSearching(true);
     try {
-      const response = await axios.get(`${API}/medicines/search?query=${searchQuery}`);
-      setMedicines(response.data);
-      if (response.data.length === 0) {
+      const response = await axios.get(`${API}/medicines/search`, { params: { query: searchQuery } });
+      setMedicines(response.data.results);
+      if (response.data.results.length === 0) {
         toast.info('No medicines found. Try a different search term.');
       }
     } catch (error) {